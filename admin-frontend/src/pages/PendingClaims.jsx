@@ -50,6 +50,7 @@ const PendingClaims = () => {
         reason: reason || undefined,
         message: reason || undefined,
         hold_days: action === 'hold' ? holdDays : undefined,
+        version: selectedClaim.version,
       };
 
       await adminAPI.verifyClaim(selectedClaim.id, payload);
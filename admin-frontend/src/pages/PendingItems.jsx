@@ -54,6 +54,7 @@ const PendingItems = () => {
         notes: notes || undefined,
         reason: notes || undefined,
         message: notes || undefined,
+        version: selectedItem.version,
       });
 
       alert('Item reviewed successfully!');
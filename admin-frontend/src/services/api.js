@@ -5,6 +5,8 @@ const API_URL = "http://localhost:8000/api";
 // Create axios instance
 const api = axios.create({
   baseURL: API_URL,
+  // Send the API's cookies cross-origin (read-your-writes pin after a write)
+  withCredentials: true,
   headers: {
     "Content-Type": "application/json",
   },
@@ -64,11 +66,15 @@ export const adminAPI = {
     const response = await api.post(`/admin/items/${itemId}/verify`, data);
     return response.data;
   },
+  verifyItemsBatch: async (data) => {
+    const response = await api.post("/admin/items/verify-batch", data);
+    return response.data;
+  },
 
   // Claims
-  getPendingClaims: async (skip = 0, limit = 50) => {
+  getPendingClaims: async (skip = 0, limit = 50, sort = "newest") => {
     const response = await api.get(
-      `/admin/claims/pending?skip=${skip}&limit=${limit}`
+      `/admin/claims/pending?skip=${skip}&limit=${limit}&sort=${sort}`
     );
     return response.data;
   },
@@ -76,6 +82,14 @@ export const adminAPI = {
     const response = await api.post(`/admin/claims/${claimId}/verify`, data);
     return response.data;
   },
+  rescoreClaims: async (weights) => {
+    const response = await api.post("/admin/claims/rescore", { weights });
+    return response.data;
+  },
+  decideClaimsBatch: async (decisions) => {
+    const response = await api.post("/admin/claims/decide-batch", { decisions });
+    return response.data;
+  },
 
   // Settings
   getSettings: async () => {
@@ -1,9 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import func, or_
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy import func, select, update, case, literal, literal_column
 from typing import List, Optional
 from datetime import datetime, timedelta
 from pydantic import BaseModel
+import json
+import os
+import secrets
+import time
+import tracemalloc
 
 from database import get_db
 from models import (
@@ -12,10 +18,26 @@ from models import (
 )
 from auth import get_current_admin_user
 from helpers import (
-    create_notification, create_timeline_event, create_audit_log,
-    notify_item_approved, notify_item_rejected, notify_more_info_requested,
-    notify_claim_approved, notify_claim_denied
+    create_audit_log,
+    bulk_create_notifications, bulk_create_timeline_events, bulk_create_audit_logs,
+    item_approved_notification, item_rejected_notification,
+    claim_approved_notification, claim_denied_notification
 )
+from claim_scoring import (
+    WEIGHTS_SETTING_KEY, COMPONENT_COLUMNS, validate_weights, rescore_claims
+)
+from settings_service import (
+    SETTING_SPECS, current_settings, update_setting, reload as reload_settings
+)
+from user_search import search_users
+import review_queue
+from versioning import expect_version, bumped
+import profiling
+import pool_metrics
+import deadlines
+from deadlines import deadline
+from outbox import enqueue
+from item_events import ITEM_VERIFIED, CLAIM_REVIEWED, verification_timeline
 
 router = APIRouter(prefix="/api/admin", tags=["admin"])
 
@@ -26,6 +48,14 @@ class ItemVerificationAction(BaseModel):
     notes: Optional[str] = None
     rejection_reason: Optional[str] = None
     more_info_message: Optional[str] = None
+    version: Optional[int] = None  # the version reviewed (or send If-Match)
+
+
+class BatchItemVerificationAction(BaseModel):
+    item_ids: List[int]
+    action: str  # approve, reject
+    notes: Optional[str] = None
+    rejection_reason: Optional[str] = None
 
 
 class ClaimVerificationAction(BaseModel):
@@ -33,6 +63,22 @@ class ClaimVerificationAction(BaseModel):
     notes: Optional[str] = None
     rejection_reason: Optional[str] = None
     hold_days: Optional[int] = None
+    version: Optional[int] = None  # the version reviewed (or send If-Match)
+
+
+class ClaimDecision(BaseModel):
+    claim_id: int
+    action: str  # approve, deny
+    notes: Optional[str] = None
+    rejection_reason: Optional[str] = None
+
+
+class BatchClaimDecisionAction(BaseModel):
+    decisions: List[ClaimDecision]
+
+
+class ClaimRescoreRequest(BaseModel):
+    weights: Optional[dict] = None  # color, condition, location, date, details
 
 
 class AdminSettingUpdate(BaseModel):
@@ -40,11 +86,22 @@ class AdminSettingUpdate(BaseModel):
     setting_value: str
 
 
+class ProfilingArm(BaseModel):
+    routes: List[str]  # "GET /api/items", as listed by GET /profiling
+    sample_every: int = 0  # also profile every Nth request; 0 = only requests with the header
+    minutes: int = 15
+
+
+class MemoryTracingToggle(BaseModel):
+    enabled: bool
+
+
 # =================
 # ADMIN DASHBOARD
 # =================
 
 @router.get("/dashboard/stats")
+@deadline(10)
 def get_admin_dashboard_stats(
     current_admin: User = Depends(get_current_admin_user),
     db: Session = Depends(get_db)
@@ -109,7 +166,14 @@ def get_admin_dashboard_stats(
 # PENDING ITEMS QUEUE
 # =================
 
+# Only what the queues show, so a page is one statement with narrow joins
+_REPORTER_COLUMNS = (
+    User.id, User.first_name, User.last_name, User.email,
+    User.student_number, User.year_level, User.course,
+)
+
 @router.get("/items/pending")
+@deadline(5)
 def get_pending_items(
     skip: int = 0,
     limit: int = 50,
@@ -117,10 +181,13 @@ def get_pending_items(
     db: Session = Depends(get_db)
 ):
     """Get all pending items for verification"""
-    items = db.query(Item).filter(
+    items = db.query(Item).options(
+        joinedload(Item.reporter).load_only(*_REPORTER_COLUMNS)
+    ).filter(
         Item.verification_status == VerificationStatus.PENDING
     ).order_by(Item.created_at.desc()).offset(skip).limit(limit).all()
 
+    now = datetime.utcnow()
     result = []
     for item in items:
         result.append({
@@ -147,27 +214,40 @@ def get_pending_items(
                 "course": item.reporter.course
             },
             "createdAt": item.created_at,
-            "verificationStatus": item.verification_status.value
+            "verificationStatus": item.verification_status.value,
+            "version": item.version,
+            "lease": review_queue.lease_info(item, now)
         })
 
     return result
 
 
 @router.get("/items/{item_id}/full")
+@deadline(5)
 def get_full_item_details(
     item_id: int,
     current_admin: User = Depends(get_current_admin_user),
     db: Session = Depends(get_db)
 ):
     """Get full unblurred item details (admin only)"""
-    item = db.query(Item).filter(Item.id == item_id).first()
+    item = _load_item_details(db, item_id)
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
 
-    # Get timeline
-    timeline = db.query(ItemTimeline).filter(
-        ItemTimeline.item_id == item_id
-    ).order_by(ItemTimeline.created_at.desc()).all()
+    return _item_details(item)
+
+
+def _load_item_details(db: Session, item_id: int) -> Optional[Item]:
+    """Item with reporter, timeline and timeline performers in two statements"""
+    return db.query(Item).options(
+        joinedload(Item.reporter),
+        selectinload(Item.timeline_events).joinedload(ItemTimeline.performed_by),
+    ).filter(Item.id == item_id).first()
+
+
+def _item_details(item: Item) -> dict:
+    """Full item payload built from an item loaded by _load_item_details"""
+    timeline = sorted(item.timeline_events, key=lambda e: (e.created_at, e.id), reverse=True)
 
     timeline_events = []
     for event in timeline:
@@ -212,6 +292,7 @@ def get_full_item_details(
         "createdAt": item.created_at,
         "verifiedAt": item.verified_at,
         "publishedAt": item.published_at,
+        "version": item.version,
         "timeline": timeline_events
     }
 
@@ -220,13 +301,16 @@ def get_full_item_details(
 def verify_item(
     item_id: int,
     action_data: ItemVerificationAction,
+    if_match: Optional[str] = Header(None),
     current_admin: User = Depends(get_current_admin_user),
     db: Session = Depends(get_db)
 ):
     """Verify an item (approve, reject, or request more info)"""
-    item = db.query(Item).filter(Item.id == item_id).first()
+    item = _load_item_details(db, item_id)
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
+    expect_version(item, if_match, action_data.version)
+    review_queue.check_lease(item, current_admin.id)
 
     if action_data.action == "approve":
         item.verification_status = VerificationStatus.APPROVED
@@ -236,29 +320,6 @@ def verify_item(
         item.published_at = datetime.utcnow()
         item.verified_by_id = current_admin.id
         item.admin_notes = action_data.notes
-
-        # Create timeline event
-        create_timeline_event(
-            db, item.id, "verified",
-            f"Item verified and approved by {current_admin.first_name} {current_admin.last_name}",
-            current_admin.id
-        )
-
-        create_timeline_event(
-            db, item.id, "published",
-            "Item published to dashboard",
-            current_admin.id
-        )
-
-        # Create audit log
-        create_audit_log(
-            db, current_admin.id, "approve_item", "item", item.id,
-            f"Approved item: {item.title}"
-        )
-
-        # Notify reporter
-        notify_item_approved(db, item, current_admin)
-
         message = "Item approved and published"
 
     elif action_data.action == "reject":
@@ -267,46 +328,175 @@ def verify_item(
         item.verified_by_id = current_admin.id
         item.rejection_reason = action_data.rejection_reason
         item.admin_notes = action_data.notes
-
-        create_timeline_event(
-            db, item.id, "rejected",
-            f"Item rejected by {current_admin.first_name} {current_admin.last_name}",
-            current_admin.id
-        )
-
-        create_audit_log(
-            db, current_admin.id, "reject_item", "item", item.id,
-            f"Rejected item: {item.title}. Reason: {action_data.rejection_reason}"
-        )
-
-        notify_item_rejected(db, item, action_data.rejection_reason or "Not specified")
-
         message = "Item rejected"
 
     elif action_data.action == "request_more_info":
         item.verification_status = VerificationStatus.MORE_INFO_REQUESTED
         item.admin_notes = action_data.notes
+        message = "More information requested"
+    else:
+        raise HTTPException(status_code=400, detail="Invalid action")
 
-        create_timeline_event(
-            db, item.id, "more_info_requested",
-            f"More information requested by {current_admin.first_name} {current_admin.last_name}",
-            current_admin.id
-        )
+    # Timeline, audit log and reporter notification are written by the outbox
+    enqueue(
+        db, ITEM_VERIFIED,
+        item_id=item.id, admin_id=current_admin.id, action=action_data.action,
+        rejection_reason=action_data.rejection_reason,
+        more_info_message=action_data.more_info_message,
+    )
+    # Flushed for the version check and the new version, built before the commit expires the loaded state
+    db.flush()
+    details = _item_details(item)
+
+    # The outbox writes this decision's timeline rows later; show them now (newest first)
+    decided_at = datetime.utcnow()
+    details["timeline"] = [
+        {
+            "id": None,
+            "action": row["action"],
+            "description": row["description"],
+            "performedBy": f"{current_admin.first_name} {current_admin.last_name}",
+            "createdAt": decided_at,
+        }
+        for row in reversed(verification_timeline(item_id, current_admin, action_data.action))
+    ] + details["timeline"]
+    db.commit()
 
-        create_audit_log(
-            db, current_admin.id, "request_more_info", "item", item.id,
-            f"Requested more info for: {item.title}"
-        )
+    return {"message": message, "item": details}
 
-        notify_more_info_requested(db, item, action_data.more_info_message or "Please provide additional details")
 
-        message = "More information requested"
-    else:
+MAX_BATCH_SIZE = 1000
+
+
+@router.post("/items/verify-batch")
+def verify_items_batch(
+    action_data: BatchItemVerificationAction,
+    current_admin: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Approve or reject many pending items in one transaction"""
+    if action_data.action not in ("approve", "reject"):
         raise HTTPException(status_code=400, detail="Invalid action")
 
+    item_ids = list(dict.fromkeys(action_data.item_ids))
+    if not item_ids:
+        raise HTTPException(status_code=400, detail="No items given")
+    if len(item_ids) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SIZE} items per batch")
+
+    reviewable = (VerificationStatus.PENDING, VerificationStatus.MORE_INFO_REQUESTED)
+    rows = db.execute(
+        select(
+            Item.id, Item.title, Item.reporter_id, Item.verification_status,
+            Item.lease_owner_id, Item.lease_expires_at,
+        )
+        .where(Item.id.in_(item_ids))
+        .with_for_update()
+    ).all()
+    now = datetime.utcnow()
+    found = {row.id: row for row in rows}
+    leased = {row.id for row in rows if review_queue.leased_by_other(row, current_admin.id, now)}
+    eligible = [
+        found[i] for i in item_ids
+        if i in found and found[i].verification_status in reviewable and i not in leased
+    ]
+    eligible_ids = [row.id for row in eligible]
+
+    admin_name = f"{current_admin.first_name} {current_admin.last_name}"
+    timeline, audit_logs, notifications = [], [], []
+
+    if action_data.action == "approve":
+        values = dict(
+            verification_status=VerificationStatus.APPROVED,
+            status=ItemStatus.FOUND,
+            is_published=True,
+            verified_at=now,
+            published_at=now,
+            verified_by_id=current_admin.id,
+            admin_notes=action_data.notes,
+            lease_owner_id=None,
+            lease_expires_at=None,
+            **bumped(Item),
+        )
+        for row in eligible:
+            timeline.append({
+                "item_id": row.id, "action": "verified",
+                "description": f"Item verified and approved by {admin_name}",
+                "performed_by_id": current_admin.id,
+            })
+            timeline.append({
+                "item_id": row.id, "action": "published",
+                "description": "Item published to dashboard",
+                "performed_by_id": current_admin.id,
+            })
+            audit_logs.append({
+                "admin_id": current_admin.id, "action": "approve_item",
+                "entity_type": "item", "entity_id": row.id,
+                "details": f"Approved item: {row.title}",
+            })
+            notifications.append(item_approved_notification(row))
+        outcome = "approved"
+    else:
+        reason = action_data.rejection_reason
+        values = dict(
+            verification_status=VerificationStatus.REJECTED,
+            verified_at=now,
+            verified_by_id=current_admin.id,
+            rejection_reason=reason,
+            admin_notes=action_data.notes,
+            lease_owner_id=None,
+            lease_expires_at=None,
+            **bumped(Item),
+        )
+        for row in eligible:
+            timeline.append({
+                "item_id": row.id, "action": "rejected",
+                "description": f"Item rejected by {admin_name}",
+                "performed_by_id": current_admin.id,
+            })
+            audit_logs.append({
+                "admin_id": current_admin.id, "action": "reject_item",
+                "entity_type": "item", "entity_id": row.id,
+                "details": f"Rejected item: {row.title}. Reason: {reason}",
+            })
+            notifications.append(item_rejected_notification(row, reason or "Not specified"))
+        outcome = "rejected"
+
+    if eligible_ids:
+        db.execute(
+            update(Item)
+            .where(Item.id.in_(eligible_ids), Item.verification_status.in_(reviewable))
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        bulk_create_timeline_events(db, timeline)
+        bulk_create_audit_logs(db, audit_logs)
+        bulk_create_notifications(db, notifications)
+
     db.commit()
 
-    return {"message": message, "item": get_full_item_details(item_id, current_admin, db)}
+    results = []
+    for item_id in item_ids:
+        if item_id not in found:
+            results.append({"itemId": item_id, "result": "not_found"})
+        elif found[item_id].verification_status not in reviewable:
+            results.append({
+                "itemId": item_id, "result": "skipped",
+                "detail": f"Item is already {found[item_id].verification_status.value}"
+            })
+        elif item_id in leased:
+            results.append({
+                "itemId": item_id, "result": "skipped",
+                "detail": "Another admin is reviewing this item"
+            })
+        else:
+            results.append({"itemId": item_id, "result": outcome})
+
+    return {
+        "message": f"{len(eligible_ids)} item(s) {outcome}",
+        "processed": len(eligible_ids),
+        "results": results
+    }
 
 
 # =================
@@ -314,57 +504,87 @@ def verify_item(
 # =================
 
 @router.get("/claims/pending")
+@deadline(5)
 def get_pending_claims(
     skip: int = 0,
     limit: int = 50,
+    sort: str = "newest",  # newest, score
     current_admin: User = Depends(get_current_admin_user),
     db: Session = Depends(get_db)
 ):
     """Get all pending claims for verification"""
-    claims = db.query(Claim).filter(
+    query = _claims_for_review(db).filter(
         Claim.status == ClaimStatus.PENDING
-    ).order_by(Claim.created_at.desc()).offset(skip).limit(limit).all()
+    )
 
-    result = []
-    for claim in claims:
-        result.append({
-            "id": claim.id,
-            "verificationDetails": claim.verification_details,
-            "claimedColor": claim.claimed_color,
-            "claimedCondition": claim.claimed_condition,
-            "claimedLocation": claim.claimed_location,
-            "claimedDate": claim.claimed_date,
-            "status": claim.status.value,
-            "item": {
-                "id": claim.item.id,
-                "title": claim.item.title,
-                "description": claim.item.description,
-                "color": claim.item.color,
-                "condition": claim.item.condition,
-                "location": claim.item.location,
-                "date": claim.item.date,
-                "imageUrl": claim.item.image_url,
-                "referenceNumber": claim.item.reference_number
-            },
-            "claimant": {
-                "id": claim.claimant.id,
-                "name": f"{claim.claimant.first_name} {claim.claimant.last_name}",
-                "email": claim.claimant.email,
-                "studentNumber": claim.claimant.student_number,
-                "yearLevel": claim.claimant.year_level,
-                "course": claim.claimant.course,
-                "phone": claim.claimant.phone
-            },
-            "createdAt": claim.created_at
-        })
+    if sort == "score":
+        query = query.order_by(Claim.match_score.desc().nulls_last(), Claim.created_at.desc())
+    elif sort == "newest":
+        query = query.order_by(Claim.created_at.desc())
+    else:
+        raise HTTPException(status_code=400, detail="Invalid sort")
 
-    return result
+    claims = query.offset(skip).limit(limit).all()
+
+    now = datetime.utcnow()
+    return [_claim_for_review(claim, now) for claim in claims]
+
+
+def _claims_for_review(db: Session):
+    """Claims with the item and claimant columns the review payload shows, in one statement"""
+    return db.query(Claim).options(
+        joinedload(Claim.item).load_only(
+            Item.id, Item.title, Item.description, Item.color, Item.condition,
+            Item.location, Item.date, Item.image_url, Item.reference_number,
+        ),
+        joinedload(Claim.claimant).load_only(*_REPORTER_COLUMNS, User.phone),
+    )
+
+
+def _claim_for_review(claim: Claim, now: datetime) -> dict:
+    return {
+        "id": claim.id,
+        "verificationDetails": claim.verification_details,
+        "claimedColor": claim.claimed_color,
+        "claimedCondition": claim.claimed_condition,
+        "claimedLocation": claim.claimed_location,
+        "claimedDate": claim.claimed_date,
+        "matchScore": claim.match_score,
+        "scoreBreakdown": {
+            key: getattr(claim, column.key) for key, column in COMPONENT_COLUMNS.items()
+        },
+        "status": claim.status.value,
+        "item": {
+            "id": claim.item.id,
+            "title": claim.item.title,
+            "description": claim.item.description,
+            "color": claim.item.color,
+            "condition": claim.item.condition,
+            "location": claim.item.location,
+            "date": claim.item.date,
+            "imageUrl": claim.item.image_url,
+            "referenceNumber": claim.item.reference_number
+        },
+        "claimant": {
+            "id": claim.claimant.id,
+            "name": f"{claim.claimant.first_name} {claim.claimant.last_name}",
+            "email": claim.claimant.email,
+            "studentNumber": claim.claimant.student_number,
+            "yearLevel": claim.claimant.year_level,
+            "course": claim.claimant.course,
+            "phone": claim.claimant.phone
+        },
+        "createdAt": claim.created_at,
+        "version": claim.version,
+        "lease": review_queue.lease_info(claim, now)
+    }
 
 
 @router.post("/claims/{claim_id}/verify")
 def verify_claim(
     claim_id: int,
     action_data: ClaimVerificationAction,
+    if_match: Optional[str] = Header(None),
     current_admin: User = Depends(get_current_admin_user),
     db: Session = Depends(get_db)
 ):
@@ -372,9 +592,19 @@ def verify_claim(
     claim = db.query(Claim).filter(Claim.id == claim_id).first()
     if not claim:
         raise HTTPException(status_code=404, detail="Claim not found")
+    expect_version(claim, if_match, action_data.version)
+    review_queue.check_lease(claim, current_admin.id)
 
-    item = claim.item
+    # Lock the item so two admins cannot approve different claims for it
+    item = db.query(Item).filter(
+        Item.id == claim.item_id
+    ).with_for_update().populate_existing().first()
 
+    refusal = _claim_decision_refusal(claim, item, action_data.action)
+    if refusal is not None:
+        raise HTTPException(status_code=409, detail=refusal[1])
+
+    competing = None
     if action_data.action == "approve":
         claim.status = ClaimStatus.APPROVED
         claim.reviewed_at = datetime.utcnow()
@@ -384,20 +614,15 @@ def verify_claim(
         item.status = ItemStatus.READY_FOR_RELEASE
         item.claimed_by_id = claim.claimant_id
 
-        create_timeline_event(
-            db, item.id, "claimed",
-            f"Claim approved by {current_admin.first_name} {current_admin.last_name}",
-            current_admin.id
-        )
-
-        create_audit_log(
-            db, current_admin.id, "approve_claim", "claim", claim.id,
-            f"Approved claim for item: {item.title}"
+        competing = {"timeline": [], "audit_logs": [], "notifications": []}
+        denied = _deny_competing_claims(
+            db, {item.id: item}, {item.id: claim.id}, current_admin, claim.reviewed_at,
+            competing["timeline"], competing["audit_logs"], competing["notifications"]
         )
 
-        notify_claim_approved(db, item, claim.claimant_id)
-
         message = "Claim approved - item ready for release"
+        if denied:
+            message += f" ({len(denied)} competing claim(s) denied)"
 
     elif action_data.action == "deny":
         claim.status = ClaimStatus.REJECTED
@@ -405,64 +630,396 @@ def verify_claim(
         claim.reviewed_by_id = current_admin.id
         claim.rejection_reason = action_data.rejection_reason
         claim.admin_notes = action_data.notes
-
-        create_timeline_event(
-            db, item.id, "claim_denied",
-            f"Claim denied by {current_admin.first_name} {current_admin.last_name}",
-            current_admin.id
-        )
-
-        create_audit_log(
-            db, current_admin.id, "deny_claim", "claim", claim.id,
-            f"Denied claim for item: {item.title}"
-        )
-
-        notify_claim_denied(db, item, claim.claimant_id, action_data.rejection_reason or "Not specified")
-
         message = "Claim denied"
 
     elif action_data.action == "request_more_info":
         claim.status = ClaimStatus.MORE_INFO_NEEDED
         claim.admin_notes = action_data.notes
-
-        create_notification(
-            db, claim.claimant_id, "more_info_requested",
-            "More Information Needed",
-            f"We need more information about your claim for '{item.title}'. {action_data.notes}",
-            item.id
-        )
-
-        create_audit_log(
-            db, current_admin.id, "request_claim_info", "claim", claim.id,
-            f"Requested more info for claim on: {item.title}"
-        )
-
         message = "More information requested from claimant"
 
     elif action_data.action == "hold":
-        hold_days = action_data.hold_days or 7
+        hold_days = action_data.hold_days or current_settings().hold_period_days
         item.status = ItemStatus.ON_HOLD
         item.hold_until = datetime.utcnow() + timedelta(days=hold_days)
         item.hold_days = hold_days
+        message = f"Item placed on hold for {hold_days} days"
+    else:
+        raise HTTPException(status_code=400, detail="Invalid action")
+
+    # Timeline, audit log and notifications are written by the outbox
+    enqueue(
+        db, CLAIM_REVIEWED,
+        claim_id=claim.id, item_id=item.id, claimant_id=claim.claimant_id,
+        admin_id=current_admin.id, action=action_data.action,
+        rejection_reason=action_data.rejection_reason, notes=action_data.notes,
+        hold_days=item.hold_days if action_data.action == "hold" else None,
+        competing=competing,
+    )
+    db.flush()
+    version = claim.version
+    db.commit()
+
+    return {"message": message, "version": version}
+
+
+REVIEWABLE_CLAIM_STATUSES = (ClaimStatus.PENDING, ClaimStatus.MORE_INFO_NEEDED)
+
+CLAIMABLE_ITEM_STATUSES = (ItemStatus.FOUND, ItemStatus.ON_HOLD)
+
+COMPETING_CLAIM_REASON = "Another claim for this item was approved"
+
 
-        create_timeline_event(
-            db, item.id, "on_hold",
-            f"Item placed on hold for {hold_days} days by {current_admin.first_name} {current_admin.last_name}",
-            current_admin.id
+def _claim_decision_refusal(claim, item, action: str) -> Optional[tuple]:
+    """
+    Why a claim cannot be decided right now, as (result, detail), or None
+
+    Shared by verify_claim and decide_claims_batch so both endpoints apply the
+    same rules. claim and item may be ORM objects or rows with their status
+    (and the item's claimed_by_id).
+    """
+    if claim.status not in REVIEWABLE_CLAIM_STATUSES:
+        return "skipped", f"Claim is already {claim.status.value}"
+    if action == "approve":
+        if item.claimed_by_id is not None:
+            return "conflict", "Another claim for this item was already approved"
+        if item.status not in CLAIMABLE_ITEM_STATUSES:
+            return "skipped", f"Item is {item.status.value}"
+    return None
+
+
+@router.get("/claims/score-weights")
+def get_claim_score_weights(
+    current_admin: User = Depends(get_current_admin_user)
+):
+    """Get the weights used to compute claim match scores"""
+    return current_settings().claim_score_weights
+
+
+@router.post("/claims/rescore")
+def rescore_pending_claims(
+    rescore_data: ClaimRescoreRequest,
+    current_admin: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Optionally change the score weights, then re-score the open claims backlog"""
+    if rescore_data.weights is not None:
+        try:
+            weights = validate_weights(rescore_data.weights)
+            update_setting(db, WEIGHTS_SETTING_KEY, json.dumps(weights), current_admin.id)
+        except (ValueError, TypeError) as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    else:
+        weights = current_settings().claim_score_weights
+
+    rescored = rescore_claims(db, weights, REVIEWABLE_CLAIM_STATUSES)
+
+    create_audit_log(
+        db, current_admin.id, "rescore_claims", "settings", 0,
+        f"Re-scored {rescored} claims with weights {json.dumps(weights)}"
+    )
+
+    db.commit()
+    if rescore_data.weights is not None:
+        reload_settings(db)
+
+    return {"message": f"{rescored} claim(s) re-scored", "rescored": rescored, "weights": weights}
+
+
+def _deny_competing_claims(db, items, winners, admin, now, timeline, audit_logs, notifications):
+    """
+    Deny every other open claim on items whose claim was just approved
+
+    items maps item id -> row with id/title, winners maps item id -> approved
+    claim id. Timeline/audit/notification rows are appended to the given lists
+    for the caller to bulk insert. Returns the denied claim ids.
+    """
+    if not winners:
+        return []
+
+    competing = db.execute(
+        select(Claim.id, Claim.item_id, Claim.claimant_id)
+        .where(
+            Claim.item_id.in_(list(winners)),
+            Claim.id.not_in(list(winners.values())),
+            Claim.status.in_(REVIEWABLE_CLAIM_STATUSES)
         )
+        .with_for_update()
+    ).all()
+    if not competing:
+        return []
+
+    denied_ids = [row.id for row in competing]
+    db.execute(
+        update(Claim)
+        .where(Claim.id.in_(denied_ids))
+        .values(
+            status=ClaimStatus.REJECTED,
+            reviewed_at=now,
+            reviewed_by_id=admin.id,
+            rejection_reason=COMPETING_CLAIM_REASON,
+            **bumped(Claim),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+    for row in competing:
+        item = items[row.item_id]
+        timeline.append({
+            "item_id": item.id, "action": "claim_denied",
+            "description": "Competing claim denied automatically after another claim was approved",
+            "performed_by_id": admin.id,
+        })
+        audit_logs.append({
+            "admin_id": admin.id, "action": "deny_claim",
+            "entity_type": "claim", "entity_id": row.id,
+            "details": f"Denied competing claim for item: {item.title}",
+        })
+        notifications.append(claim_denied_notification(item, row.claimant_id, COMPETING_CLAIM_REASON))
+
+    return denied_ids
 
-        create_audit_log(
-            db, current_admin.id, "place_on_hold", "item", item.id,
-            f"Placed item on hold for {hold_days} days: {item.title}"
+
+@router.post("/claims/decide-batch")
+def decide_claims_batch(
+    action_data: BatchClaimDecisionAction,
+    current_admin: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Approve or deny many claims in one transaction
+
+    Approving a claim denies every other open claim on the same item. Items are
+    locked for the whole transaction, and an item can only ever be given to one
+    claimant, so concurrent batches cannot approve two claims for one item.
+    """
+    decisions = {}
+    duplicates = []
+    for decision in action_data.decisions:
+        if decision.action not in ("approve", "deny"):
+            raise HTTPException(status_code=400, detail=f"Invalid action for claim {decision.claim_id}")
+        if decision.claim_id in decisions and decision.claim_id not in duplicates:
+            duplicates.append(decision.claim_id)
+        decisions[decision.claim_id] = decision
+    if duplicates:
+        # Letting the last entry win would silently drop an earlier decision
+        raise HTTPException(
+            status_code=400,
+            detail=f"More than one decision for claims: {', '.join(map(str, duplicates))}"
         )
+    if not decisions:
+        raise HTTPException(status_code=400, detail="No claims given")
+    if len(decisions) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SIZE} claims per batch")
+
+    claim_item_ids = db.execute(
+        select(Claim.item_id).where(Claim.id.in_(list(decisions)))
+    ).scalars().all()
+
+    # Lock items first, in id order, then their claims
+    items = {
+        row.id: row for row in db.execute(
+            select(Item.id, Item.title, Item.status, Item.claimed_by_id)
+            .where(Item.id.in_(set(claim_item_ids)))
+            .order_by(Item.id)
+            .with_for_update()
+        ).all()
+    }
+    claims = {
+        row.id: row for row in db.execute(
+            select(
+                Claim.id, Claim.item_id, Claim.claimant_id, Claim.status,
+                Claim.lease_owner_id, Claim.lease_expires_at,
+            )
+            .where(Claim.id.in_(list(decisions)))
+            .with_for_update()
+        ).all()
+    }
 
-        message = f"Item placed on hold for {hold_days} days"
-    else:
-        raise HTTPException(status_code=400, detail="Invalid action")
+    now = datetime.utcnow()
+    admin_name = f"{current_admin.first_name} {current_admin.last_name}"
+    results = {}
+    winners = {}
+    denials = []
+
+    for claim_id, decision in decisions.items():
+        claim = claims.get(claim_id)
+        refusal = _claim_decision_refusal(claim, items[claim.item_id], decision.action) if claim else None
+        if claim is None:
+            results[claim_id] = {"claimId": claim_id, "result": "not_found"}
+        elif refusal is not None:
+            results[claim_id] = {"claimId": claim_id, "result": refusal[0], "detail": refusal[1]}
+        elif review_queue.leased_by_other(claim, current_admin.id, now):
+            results[claim_id] = {
+                "claimId": claim_id, "result": "skipped",
+                "detail": "Another admin is reviewing this claim"
+            }
+        elif decision.action == "deny":
+            denials.append(claim)
+            results[claim_id] = {"claimId": claim_id, "result": "denied"}
+        elif claim.item_id in winners:
+            results[claim_id] = {
+                "claimId": claim_id, "result": "conflict",
+                "detail": "Another claim for this item was already approved"
+            }
+        else:
+            winners[claim.item_id] = claim_id
+            results[claim_id] = {"claimId": claim_id, "result": "approved"}
+
+    timeline, audit_logs, notifications = [], [], []
+
+    if winners:
+        approved_ids = list(winners.values())
+        claimant_by_item = {item_id: claims[claim_id].claimant_id for item_id, claim_id in winners.items()}
+
+        given = db.execute(
+            update(Item)
+            .where(Item.id.in_(list(winners)), Item.claimed_by_id.is_(None))
+            .values(
+                status=ItemStatus.READY_FOR_RELEASE,
+                claimed_by_id=case(claimant_by_item, value=Item.id),
+                **bumped(Item),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        if given.rowcount != len(winners):
+            db.rollback()
+            raise HTTPException(status_code=409, detail="Items changed during the batch, please retry")
+
+        db.execute(
+            update(Claim)
+            .where(Claim.id.in_(approved_ids))
+            .values(
+                status=ClaimStatus.APPROVED,
+                reviewed_at=now,
+                reviewed_by_id=current_admin.id,
+                admin_notes=case({cid: decisions[cid].notes for cid in approved_ids}, value=Claim.id),
+                lease_owner_id=None,
+                lease_expires_at=None,
+                **bumped(Claim),
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+        for item_id, claim_id in winners.items():
+            item = items[item_id]
+            timeline.append({
+                "item_id": item_id, "action": "claimed",
+                "description": f"Claim approved by {admin_name}",
+                "performed_by_id": current_admin.id,
+            })
+            audit_logs.append({
+                "admin_id": current_admin.id, "action": "approve_claim",
+                "entity_type": "claim", "entity_id": claim_id,
+                "details": f"Approved claim for item: {item.title}",
+            })
+            notifications.append(claim_approved_notification(item, claimant_by_item[item_id]))
+
+    if denials:
+        denied_ids = [claim.id for claim in denials]
+        db.execute(
+            update(Claim)
+            .where(Claim.id.in_(denied_ids))
+            .values(
+                status=ClaimStatus.REJECTED,
+                reviewed_at=now,
+                reviewed_by_id=current_admin.id,
+                rejection_reason=case({cid: decisions[cid].rejection_reason for cid in denied_ids}, value=Claim.id),
+                admin_notes=case({cid: decisions[cid].notes for cid in denied_ids}, value=Claim.id),
+                lease_owner_id=None,
+                lease_expires_at=None,
+                **bumped(Claim),
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+        for claim in denials:
+            item = items[claim.item_id]
+            timeline.append({
+                "item_id": item.id, "action": "claim_denied",
+                "description": f"Claim denied by {admin_name}",
+                "performed_by_id": current_admin.id,
+            })
+            audit_logs.append({
+                "admin_id": current_admin.id, "action": "deny_claim",
+                "entity_type": "claim", "entity_id": claim.id,
+                "details": f"Denied claim for item: {item.title}",
+            })
+            notifications.append(claim_denied_notification(
+                item, claim.claimant_id, decisions[claim.id].rejection_reason or "Not specified"
+            ))
+
+    auto_denied = _deny_competing_claims(
+        db, items, winners, current_admin, now, timeline, audit_logs, notifications
+    )
+    for claim_id in auto_denied:
+        if claim_id in results:
+            results[claim_id] = {
+                "claimId": claim_id, "result": "denied",
+                "detail": COMPETING_CLAIM_REASON
+            }
+
+    bulk_create_timeline_events(db, timeline)
+    bulk_create_audit_logs(db, audit_logs)
+    bulk_create_notifications(db, notifications)
 
     db.commit()
 
-    return {"message": message}
+    return {
+        "message": f"{len(winners)} claim(s) approved, {len(denials) + len(auto_denied)} denied",
+        "approved": len(winners),
+        "denied": len(denials),
+        "autoDenied": auto_denied,
+        "results": list(results.values())
+    }
+
+
+# =================
+# REVIEW QUEUE
+# =================
+
+@router.post("/queue/{kind}/next")
+def lease_next_task(
+    kind: str,
+    current_admin: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Lease the highest-priority pending item or claim nobody else is reviewing (kind: items, claims)"""
+    leased = review_queue.lease(db, kind, current_admin.id)
+    if leased is None:
+        return {"kind": kind, "task": None}
+    task_id, expires_at = leased
+
+    if kind == "items":
+        item = _load_item_details(db, task_id)
+        task = _item_details(item) if item else None
+    else:
+        claim = _claims_for_review(db).filter(Claim.id == task_id).first()
+        task = _claim_for_review(claim, datetime.utcnow()) if claim else None
+    return {"kind": kind, "leaseExpiresAt": expires_at, "task": task}
+
+
+@router.post("/queue/{kind}/{task_id}/renew")
+def renew_task_lease(
+    kind: str,
+    task_id: int,
+    current_admin: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Keep reviewing a leased task for another lease period"""
+    return {"leaseExpiresAt": review_queue.renew(db, kind, task_id, current_admin.id)}
+
+
+@router.delete("/queue/{kind}/{task_id}/lease")
+def release_task_lease(
+    kind: str,
+    task_id: int,
+    current_admin: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Put a leased task back in the queue without deciding it"""
+    if not review_queue.release(db, kind, task_id, current_admin.id):
+        raise HTTPException(status_code=404, detail="You are not reviewing this task")
+    return {"message": "Task returned to the queue"}
 
 
 # =================
@@ -470,6 +1027,7 @@ def verify_claim(
 # =================
 
 @router.get("/notifications")
+@deadline(5)
 def get_all_notifications(
     user_id: Optional[int] = None,
     skip: int = 0,
@@ -478,7 +1036,11 @@ def get_all_notifications(
     db: Session = Depends(get_db)
 ):
     """Get notifications (optionally filter by user_id)"""
-    query = db.query(Notification)
+    query = db.query(
+        Notification.id, Notification.type, Notification.title, Notification.message,
+        Notification.is_read, Notification.link, Notification.created_at,
+        User.id.label("user_id"), User.first_name, User.last_name,
+    ).join(Notification.user)
 
     if user_id:
         query = query.filter(Notification.user_id == user_id)
@@ -496,8 +1058,8 @@ def get_all_notifications(
         "link": n.link,
         "createdAt": n.created_at,
         "user": {
-            "id": n.user.id,
-            "name": f"{n.user.first_name} {n.user.last_name}"
+            "id": n.user_id,
+            "name": f"{n.first_name} {n.last_name}"
         }
     } for n in notifications]
 
@@ -507,6 +1069,7 @@ def get_all_notifications(
 # =================
 
 @router.get("/audit-logs")
+@deadline(5)
 def get_audit_logs(
     skip: int = 0,
     limit: int = 100,
@@ -515,7 +1078,11 @@ def get_audit_logs(
     db: Session = Depends(get_db)
 ):
     """Get audit logs"""
-    query = db.query(AuditLog)
+    query = db.query(
+        AuditLog.id, AuditLog.action, AuditLog.entity_type, AuditLog.entity_id,
+        AuditLog.details, AuditLog.created_at,
+        User.id.label("admin_id"), User.first_name, User.last_name,
+    ).join(AuditLog.admin)
 
     if action:
         query = query.filter(AuditLog.action == action)
@@ -529,47 +1096,119 @@ def get_audit_logs(
         "entityId": log.entity_id,
         "details": log.details,
         "admin": {
-            "id": log.admin.id,
-            "name": f"{log.admin.first_name} {log.admin.last_name}"
+            "id": log.admin_id,
+            "name": f"{log.first_name} {log.last_name}"
         },
         "createdAt": log.created_at
     } for log in logs]
 
 
 # =================
-# ADMIN SETTINGS
+# EXPORTS
 # =================
 
-@router.get("/settings")
-def get_admin_settings(
+@router.get("/export/audit-logs")
+def export_audit_logs(
+    format: str = "csv",
+    action: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
     current_admin: User = Depends(get_current_admin_user),
     db: Session = Depends(get_db)
 ):
-    """Get all admin settings"""
-    settings = db.query(AdminSettings).all()
+    """Stream audit logs as CSV or NDJSON"""
+    from exports import export_response, audit_log_export_query  # rarely used, imported on demand
 
-    # Create default settings if none exist
-    if not settings:
-        defaults = [
-            {"setting_key": "hold_period_days", "setting_value": "7", "description": "Default hold period in days"},
-            {"setting_key": "blur_level", "setting_value": "medium", "description": "Blur level for published items"},
-            {"setting_key": "admin_email", "setting_value": "admin@school.edu", "description": "Admin contact email"},
-        ]
+    response = export_response(
+        audit_log_export_query(action, start_date, end_date), format, "audit-logs"
+    )
 
-        for default in defaults:
-            setting = AdminSettings(**default, updated_by_id=current_admin.id)
-            db.add(setting)
+    create_audit_log(
+        db, current_admin.id, "export_data", "audit_log", 0,
+        f"Exported audit logs ({format}) action={action} from={start_date} to={end_date}"
+    )
 
-        db.commit()
-        settings = db.query(AdminSettings).all()
+    return response
 
-    return [{
-        "id": s.id,
-        "settingKey": s.setting_key,
-        "settingValue": s.setting_value,
-        "description": s.description,
-        "updatedAt": s.updated_at
-    } for s in settings]
+
+@router.get("/export/items")
+def export_items(
+    format: str = "csv",
+    status: Optional[str] = None,
+    verification_status: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    current_admin: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Stream items as CSV or NDJSON"""
+    from exports import export_response, item_export_query, parse_filter
+
+    response = export_response(
+        item_export_query(
+            parse_filter(ItemStatus, status, "status"),
+            parse_filter(VerificationStatus, verification_status, "verification_status"),
+            start_date, end_date
+        ), format, "items"
+    )
+
+    create_audit_log(
+        db, current_admin.id, "export_data", "item", 0,
+        f"Exported items ({format}) status={status} from={start_date} to={end_date}"
+    )
+
+    return response
+
+
+@router.get("/export/claims")
+def export_claims(
+    format: str = "csv",
+    status: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    current_admin: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Stream claims as CSV or NDJSON"""
+    from exports import export_response, claim_export_query, parse_filter
+
+    response = export_response(
+        claim_export_query(parse_filter(ClaimStatus, status, "status"), start_date, end_date), format, "claims"
+    )
+
+    create_audit_log(
+        db, current_admin.id, "export_data", "claim", 0,
+        f"Exported claims ({format}) status={status} from={start_date} to={end_date}"
+    )
+
+    return response
+
+
+# =================
+# ADMIN SETTINGS
+# =================
+
+@router.get("/settings")
+def get_admin_settings(
+    current_admin: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Get all admin settings (known settings without a row show their default)"""
+    rows = {s.setting_key: s for s in db.query(AdminSettings).all()}
+
+    result = []
+    for key, spec in SETTING_SPECS.items():
+        if spec.internal:
+            continue
+        s = rows.get(key)
+        result.append({
+            "id": s.id if s else None,
+            "settingKey": key,
+            "settingValue": s.setting_value if s else spec.default,
+            "description": (s.description if s else None) or spec.description,
+            "updatedAt": s.updated_at if s else None
+        })
+    return result
 
 
 @router.put("/settings")
@@ -579,36 +1218,267 @@ def update_admin_setting(
     db: Session = Depends(get_db)
 ):
     """Update an admin setting"""
-    setting = db.query(AdminSettings).filter(
-        AdminSettings.setting_key == setting_data.setting_key
-    ).first()
-
-    if not setting:
-        setting = AdminSettings(
-            setting_key=setting_data.setting_key,
-            setting_value=setting_data.setting_value,
-            updated_by_id=current_admin.id
-        )
-        db.add(setting)
-    else:
-        setting.setting_value = setting_data.setting_value
-        setting.updated_by_id = current_admin.id
+    spec = SETTING_SPECS.get(setting_data.setting_key)
+    if spec is not None and spec.internal:
+        raise HTTPException(status_code=400, detail=f"{setting_data.setting_key} cannot be set here")
+    try:
+        setting = update_setting(db, setting_data.setting_key, setting_data.setting_value, current_admin.id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     create_audit_log(
         db, current_admin.id, "update_settings", "settings", setting.id,
         f"Updated setting: {setting_data.setting_key} = {setting_data.setting_value}"
     )
 
-    db.commit()
+    reload_settings(db)
 
-    return {"message": "Setting updated successfully"}
+    return {"message": "Setting updated successfully", "version": current_settings().version}
+
+
+# =================
+# PROFILING
+# =================
+
+def _save_profiling(db: Session, admin: User, config: dict, details: str):
+    """Store the profiling setting; every worker applies it on its next settings reload"""
+    setting = update_setting(db, "profiling", json.dumps(config), admin.id)
+    create_audit_log(db, admin.id, "update_profiling", "settings", setting.id, details)
+    reload_settings(db)
+
+
+def _stats_key(key: str) -> str:
+    if key not in ("lineno", "filename", "traceback"):
+        raise HTTPException(status_code=400, detail="key must be lineno, filename or traceback")
+    return key
+
+
+@router.get("/profiling")
+def get_profiling_status(
+    request: Request,
+    current_admin: User = Depends(get_current_admin_user)
+):
+    """Profiling setting, what this worker has armed, and the stored profiles"""
+    config = current_settings().profiling
+    return {
+        "pid": os.getpid(),
+        "cpu": config.get("cpu"),
+        "armedRoutes": profiling.armed_routes(),
+        "memoryTracing": tracemalloc.is_tracing(),
+        "routes": sorted(profiling.routes(request.app)),
+        "files": profiling.list_files(),
+    }
+
+
+@router.post("/profiling/cpu")
+def arm_cpu_profiling(
+    arm: ProfilingArm,
+    request: Request,
+    current_admin: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Arm routes for sampled CPU profiling in every worker"""
+    unknown = set(arm.routes) - set(profiling.routes(request.app))
+    if not arm.routes or unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown routes: {', '.join(sorted(unknown)) or 'none given'}")
+    if not 1 <= arm.minutes <= profiling.MAX_ARM_MINUTES:
+        raise HTTPException(status_code=400, detail=f"minutes must be between 1 and {profiling.MAX_ARM_MINUTES}")
+    if arm.sample_every < 0:
+        raise HTTPException(status_code=400, detail="sample_every must not be negative")
+
+    token = secrets.token_urlsafe(16)
+    expires_at = time.time() + arm.minutes * 60
+    config = dict(current_settings().profiling)
+    config["cpu"] = {
+        "routes": sorted(set(arm.routes)), "sample_every": arm.sample_every,
+        "token": token, "expires_at": expires_at,
+    }
+    _save_profiling(
+        db, current_admin, config,
+        f"Armed CPU profiling for {arm.minutes} min: {', '.join(arm.routes)} (every {arm.sample_every or '-'})"
+    )
+
+    return {
+        "header": profiling.PROFILE_HEADER,
+        "token": token,
+        "routes": config["cpu"]["routes"],
+        "expiresAt": datetime.utcfromtimestamp(expires_at),
+    }
+
+
+@router.delete("/profiling/cpu")
+def disarm_cpu_profiling(
+    current_admin: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Stop CPU profiling in every worker"""
+    config = dict(current_settings().profiling)
+    config.pop("cpu", None)
+    _save_profiling(db, current_admin, config, "Disarmed CPU profiling")
+    return {"message": "CPU profiling disarmed"}
+
+
+@router.put("/profiling/memory")
+def toggle_memory_tracing(
+    toggle: MemoryTracingToggle,
+    current_admin: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Start or stop tracemalloc in every worker"""
+    config = dict(current_settings().profiling)
+    config["memory"] = toggle.enabled
+    _save_profiling(
+        db, current_admin, config, f"{'Started' if toggle.enabled else 'Stopped'} memory tracing"
+    )
+    return {"memoryTracing": toggle.enabled}
+
+
+@router.post("/profiling/memory/snapshot")
+def take_memory_snapshot(
+    key: str = "lineno",
+    limit: int = 25,
+    current_admin: User = Depends(get_current_admin_user)
+):
+    """Dump this worker's allocations and show what grew since its last snapshot"""
+    try:
+        return profiling.memory_snapshot(_stats_key(key), limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/profiling/memory/diff")
+def diff_memory_snapshots(
+    base: str,
+    current: str,
+    key: str = "lineno",
+    limit: int = 25,
+    current_admin: User = Depends(get_current_admin_user)
+):
+    """What grew between two stored snapshots"""
+    try:
+        return profiling.memory_diff(base, current, _stats_key(key), limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@router.get("/profiling/files/{name}")
+def download_profile(
+    name: str,
+    current_admin: User = Depends(get_current_admin_user)
+):
+    """Download a stored CPU profile (folded stacks) or memory snapshot"""
+    try:
+        path = profiling.file_path(name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    media_type = "text/plain" if name.endswith(".folded") else "application/octet-stream"
+    return FileResponse(path, media_type=media_type, filename=name)
+
+
+# =================
+# STARTUP
+# =================
+
+@router.get("/startup-report")
+def get_startup_report(
+    current_admin: User = Depends(get_current_admin_user)
+):
+    """Import/init time per startup phase for the worker serving this request"""
+    from startup import report
+    return report.as_dict()
+
+
+@router.get("/pools")
+def get_pool_metrics(
+    current_admin: User = Depends(get_current_admin_user)
+):
+    """Connection pool gauges, counters and checkout waits for the worker serving this request"""
+    return {"pid": os.getpid(), "pools": pool_metrics.snapshot()}
+
+
+@router.get("/deadlines")
+def get_deadline_metrics(
+    request: Request,
+    current_admin: User = Depends(get_current_admin_user)
+):
+    """Latency budget, requests, overruns and durations per budgeted route, for the serving worker"""
+    stats = deadlines.stats()
+    routes = {}
+    for route in request.app.routes:
+        name = getattr(getattr(route, "endpoint", None), "__name__", None)
+        if name in stats:
+            for method in sorted(route.methods):
+                routes[f"{method} {route.path}"] = stats[name]
+    return {"pid": os.getpid(), "routes": routes}
 
 
 # =================
 # USER MANAGEMENT
 # =================
 
+def _activity_aggregates(user_ids):
+    """
+    Grouped per-user activity subqueries, restricted to user_ids (a select of ids)
+
+    Returns (reported, claims, claimed) subqueries keyed by user_id, meant to
+    be outer-joined onto users so a whole page costs one statement.
+    """
+    reported = select(
+        Item.reporter_id.label("user_id"),
+        func.count(Item.id).label("items_reported"),
+        func.max(Item.created_at).label("last_item_at")
+    ).where(Item.reporter_id.in_(user_ids)).group_by(Item.reporter_id).subquery()
+
+    claims = select(
+        Claim.claimant_id.label("user_id"),
+        func.count(Claim.id).label("claims_made"),
+        func.max(Claim.created_at).label("last_claim_at")
+    ).where(Claim.claimant_id.in_(user_ids)).group_by(Claim.claimant_id).subquery()
+
+    claimed = select(
+        Item.claimed_by_id.label("user_id"),
+        func.count(Item.id).label("items_claimed")
+    ).where(Item.claimed_by_id.in_(user_ids)).group_by(Item.claimed_by_id).subquery()
+
+    return reported, claims, claimed
+
+
+def _activity_query(db, page):
+    """Users in page (subquery with user_id, rank) with their activity aggregates"""
+    reported, claims, claimed = _activity_aggregates(select(page.c.user_id))
+    return db.query(
+        User,
+        func.coalesce(reported.c.items_reported, 0),
+        func.coalesce(claims.c.claims_made, 0),
+        func.coalesce(claimed.c.items_claimed, 0),
+        reported.c.last_item_at,
+        claims.c.last_claim_at
+    ).join(
+        page, page.c.user_id == User.id
+    ).outerjoin(
+        reported, reported.c.user_id == User.id
+    ).outerjoin(
+        claims, claims.c.user_id == User.id
+    ).outerjoin(
+        claimed, claimed.c.user_id == User.id
+    )
+
+
+def _activity(items_reported, claims_made, items_claimed, last_item_at, last_claim_at):
+    return {
+        "itemsReported": items_reported,
+        "claimsMade": claims_made,
+        "itemsClaimed": items_claimed,
+        "lastActivityAt": max(filter(None, (last_item_at, last_claim_at)), default=None)
+    }
+
+
 @router.get("/users")
+@deadline(5)
 def get_all_users(
     skip: int = 0,
     limit: int = 100,
@@ -616,20 +1486,26 @@ def get_all_users(
     current_admin: User = Depends(get_current_admin_user),
     db: Session = Depends(get_db)
 ):
-    """Get all users"""
-    query = db.query(User)
+    """Get all users with their activity (search is ranked and typo-tolerant, best match first)"""
+    search = search.strip() if search else None
+    ranked = search_users(db, search) if search else None
 
-    if search:
-        query = query.filter(
-            or_(
-                User.email.ilike(f"%{search}%"),
-                User.first_name.ilike(f"%{search}%"),
-                User.last_name.ilike(f"%{search}%"),
-                User.student_number.ilike(f"%{search}%")
-            )
+    if ranked is not None:
+        page = select(User.id.label("user_id"), ranked.c.rank.label("rank")).join(
+            ranked, ranked.c.user_id == User.id
         )
+    elif search:
+        return []
+    else:
+        page = select(User.id.label("user_id"), literal(0).label("rank"))
 
-    users = query.order_by(User.created_at.desc()).offset(skip).limit(limit).all()
+    page = page.order_by(
+        literal_column("rank").desc(), User.created_at.desc()
+    ).offset(skip).limit(limit).subquery()
+
+    rows = _activity_query(db, page).order_by(
+        page.c.rank.desc(), User.created_at.desc()
+    ).all()
 
     return [{
         "id": u.id,
@@ -642,28 +1518,22 @@ def get_all_users(
         "phone": u.phone,
         "role": u.role.value,
         "isActive": u.is_active,
-        "createdAt": u.created_at
-    } for u in users]
+        "createdAt": u.created_at,
+        "activity": _activity(*activity)
+    } for u, *activity in rows]
 
 
 @router.get("/users/{user_id}/activity")
+@deadline(5)
 def get_user_activity(
     user_id: int,
     current_admin: User = Depends(get_current_admin_user),
     db: Session = Depends(get_db)
 ):
     """Get user activity (items reported, claims made, etc.)"""
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
+    page = select(User.id.label("user_id"), literal(0).label("rank")).where(User.id == user_id).subquery()
+    row = _activity_query(db, page).first()
+    if not row:
         raise HTTPException(status_code=404, detail="User not found")
 
-    items_reported = db.query(Item).filter(Item.reporter_id == user_id).count()
-    claims_made = db.query(Claim).filter(Claim.claimant_id == user_id).count()
-    items_claimed = db.query(Item).filter(Item.claimed_by_id == user_id).count()
-
-    return {
-        "userId": user_id,
-        "itemsReported": items_reported,
-        "claimsMade": claims_made,
-        "itemsClaimed": items_claimed
-    }
+    return {"userId": user_id, **_activity(*row[1:])}
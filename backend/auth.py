@@ -62,6 +62,8 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     user = db.query(User).filter(User.email == email).first()
     if user is None:
         raise credentials_exception
+    # Lets replicas.py pin this user's reads to the primary after they write
+    db.info["auth_token"] = token
     return user
 
 
@@ -0,0 +1,144 @@
+"""
+Concurrent read/write benchmark for the SQLite modes
+
+Runs the same mixed workload against a fresh database file once per
+SQLITE_MODE (each in its own process, since the mode is fixed at import)
+and reports reads/second, writes/second and failed operations:
+
+    python bench_sqlite.py --readers 8 --writers 4 --duration 10
+
+Writers do what the routes do: read an item, update it and add a
+notification in one transaction. Readers list published items and count
+unread notifications.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+
+def run_child(args):
+    from sqlalchemy import func
+    from database import engine, SessionLocal, Base, SQLITE_MODE
+    from models import User, Item, Notification, ItemStatus, UserRole
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    user = User(
+        email="bench@school.edu", hashed_password="x", first_name="Bench",
+        last_name="User", role=UserRole.STUDENT
+    )
+    db.add(user)
+    db.flush()
+    db.add_all([
+        Item(
+            title=f"Item {i}", description="Benchmark item", category="Other",
+            location="Library", date=datetime.utcnow(), status=ItemStatus.FOUND, is_published=True,
+            reporter_id=user.id
+        )
+        for i in range(args.items)
+    ])
+    db.commit()
+    user_id = user.id
+    db.close()
+
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    errors = {}
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + args.duration
+
+    def record(kind, error=None):
+        with lock:
+            counts[kind] += 1
+            if error is not None:
+                message = str(error).splitlines()[0][:80]
+                errors[message] = errors.get(message, 0) + 1
+
+    def reader():
+        while time.perf_counter() < stop_at:
+            db = SessionLocal()
+            try:
+                db.query(Item).filter(Item.is_published == True).order_by(
+                    Item.created_at.desc()
+                ).limit(20).all()
+                db.query(func.count(Notification.id)).filter(
+                    Notification.user_id == user_id, Notification.is_read == False
+                ).scalar()
+                record("reads")
+            except Exception as e:
+                record("errors", e)
+            finally:
+                db.close()
+
+    def writer():
+        while time.perf_counter() < stop_at:
+            db = SessionLocal()
+            try:
+                item = db.query(Item).filter(Item.id == random.randint(1, args.items)).first()
+                item.description = f"Updated {time.time()}"
+                db.add(Notification(
+                    user_id=user_id, title="Benchmark", message=item.title, type="item_found"
+                ))
+                db.commit()
+                record("writes")
+            except Exception as e:
+                db.rollback()
+                record("errors", e)
+            finally:
+                db.close()
+
+    threads = [threading.Thread(target=reader) for _ in range(args.readers)]
+    threads += [threading.Thread(target=writer) for _ in range(args.writers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    print(json.dumps({"mode": SQLITE_MODE, **counts, "errorTypes": errors}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", default=["basic", "tuned"])
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return run_child(args)
+
+    print(f"{'mode':<8}{'reads/s':>10}{'writes/s':>10}{'errors':>8}")
+    for mode in args.modes:
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(
+                os.environ,
+                SQLITE_MODE=mode,
+                DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+            )
+            out = subprocess.run(
+                [sys.executable, __file__, "--child"] + sys.argv[1:],
+                env=env, capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+            )
+        if out.returncode != 0:
+            print(f"{mode:<8} failed:\n{out.stderr}")
+            continue
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        print(
+            f"{mode:<8}{result['reads'] / args.duration:>10.0f}"
+            f"{result['writes'] / args.duration:>10.0f}{result['errors']:>8}"
+        )
+        for message, count in result["errorTypes"].items():
+            print(f"    {count} x {message}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Throughput benchmark across worker counts
+
+Starts serve.py with each worker count, drives it with concurrent
+keep-alive clients for a fixed time and reports requests/second and
+latency percentiles:
+
+    python bench_workers.py --workers 1 2 4 --path /api/stats --duration 10
+
+Run it against a database that has data (python init_db.py plus some
+items) and with the same DATABASE_URL the server will use.
+"""
+import argparse
+import http.client
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+
+def wait_until_up(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/")
+            conn.getresponse().read()
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def client(port, path, stop_at, latencies, errors):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    while time.perf_counter() < stop_at:
+        start = time.perf_counter()
+        try:
+            conn.request("GET", path)
+            response = conn.getresponse()
+            response.read()
+            if response.status >= 400:
+                errors.append(response.status)
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(type(e).__name__)
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - start)
+    conn.close()
+
+
+def run(workers, args):
+    port = args.port
+    server = subprocess.Popen(
+        [sys.executable, "serve.py", "--workers", str(workers), "--port", str(port),
+         "--threads", str(args.threads)],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        if not wait_until_up(port):
+            raise RuntimeError(f"server with {workers} worker(s) did not start")
+
+        # Warm every worker before measuring
+        warm_latencies, warm_errors = [], []
+        client(port, args.path, time.perf_counter() + 1, warm_latencies, warm_errors)
+
+        latencies, errors = [], []
+        stop_at = time.perf_counter() + args.duration
+        threads = [
+            threading.Thread(target=client, args=(port, args.path, stop_at, latencies, errors))
+            for _ in range(args.concurrency)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        server.terminate()
+        server.wait(timeout=60)
+
+    latencies.sort()
+    pct = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else float("nan")
+    return {
+        "workers": workers,
+        "rps": len(latencies) / args.duration,
+        "p50": pct(0.50),
+        "p99": pct(0.99),
+        "mean": statistics.fmean(latencies) * 1000 if latencies else float("nan"),
+        "errors": len(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--threads", type=int, default=40)
+    parser.add_argument("--path", default="/api/stats")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    print(f"GET {args.path}, {args.concurrency} clients, {args.duration}s per run")
+    print(f"{'workers':>8} {'req/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'mean ms':>8} {'errors':>7}")
+    for workers in args.workers:
+        r = run(workers, args)
+        print(f"{r['workers']:>8} {r['rps']:>10.1f} {r['p50']:>8.1f} {r['p99']:>8.1f} {r['mean']:>8.1f} {r['errors']:>7}")
+
+
+if __name__ == "__main__":
+    main()
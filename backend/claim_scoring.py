@@ -0,0 +1,189 @@
+"""
+Evidence scoring for claims
+
+Each claim gets a 0-1 score per piece of evidence (color, condition,
+location, date, free-text details) compared against the item's real values.
+The components are stored on the claim, so the weighted match_score can be
+recomputed for the whole backlog with a single UPDATE when the weights change.
+"""
+import re
+from datetime import datetime
+from difflib import SequenceMatcher
+from typing import Dict, Optional
+
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.orm import Session
+
+from models import Claim, Item
+
+# Admin setting holding the weights as JSON (see settings_service.py)
+WEIGHTS_SETTING_KEY = "claim_score_weights"
+
+DEFAULT_WEIGHTS = {
+    "color": 0.2,
+    "condition": 0.1,
+    "location": 0.25,
+    "date": 0.2,
+    "details": 0.25,
+}
+
+# Column holding each component score on Claim
+COMPONENT_COLUMNS = {
+    "color": Claim.score_color,
+    "condition": Claim.score_condition,
+    "location": Claim.score_location,
+    "date": Claim.score_date,
+    "details": Claim.score_details,
+}
+
+# A claimed date this many days away from the item's date scores 0
+DATE_WINDOW_DAYS = 14
+
+RESCORE_BATCH_SIZE = 500
+
+_STOPWORDS = {
+    "a", "an", "and", "the", "it", "is", "was", "my", "i", "of", "in", "on",
+    "at", "to", "with", "for", "has", "have", "this", "that", "its", "me",
+}
+
+_DATE_FORMATS = ("%Y-%m-%d", "%m/%d/%Y", "%d/%m/%Y", "%Y/%m/%d", "%B %d, %Y", "%b %d, %Y")
+
+
+def normalize(text: Optional[str]) -> str:
+    """Lowercase, drop punctuation and collapse whitespace"""
+    if not text:
+        return ""
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", text.lower()).split())
+
+
+def _tokens(text: Optional[str]) -> set:
+    return {t for t in normalize(text).split() if t not in _STOPWORDS and len(t) > 1}
+
+
+def string_similarity(claimed: Optional[str], actual: Optional[str]) -> float:
+    """Similarity of two short values, tolerant of typos and extra words"""
+    a, b = normalize(claimed), normalize(actual)
+    if not a or not b:
+        return 0.0
+    if a == b:
+        return 1.0
+
+    ratio = SequenceMatcher(None, a, b).ratio()
+
+    # "dark blue" vs "blue": every word of the shorter value appears in the longer
+    ta, tb = set(a.split()), set(b.split())
+    containment = len(ta & tb) / min(len(ta), len(tb))
+
+    return max(ratio, containment)
+
+
+def parse_claimed_date(value: Optional[str]) -> Optional[datetime]:
+    """Parse the free-form date string a claimant entered"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).replace(tzinfo=None)
+    except ValueError:
+        pass
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def date_score(claimed: Optional[str], actual: Optional[datetime]) -> float:
+    """1.0 for the same day, falling linearly to 0 at DATE_WINDOW_DAYS apart"""
+    claimed_date = parse_claimed_date(claimed)
+    if claimed_date is None or actual is None:
+        return 0.0
+    days = abs((claimed_date.date() - actual.date()).days)
+    return max(0.0, 1.0 - days / DATE_WINDOW_DAYS)
+
+
+def details_overlap(details: Optional[str], item: Item) -> float:
+    """Share of the item's descriptive words that the claimant mentioned"""
+    claimed = _tokens(details)
+    actual = _tokens(" ".join(filter(None, [item.title, item.description, item.color, item.location])))
+    if not claimed or not actual:
+        return 0.0
+    return len(claimed & actual) / min(len(claimed), len(actual))
+
+
+def score_components(claim: Claim, item: Item) -> Dict[str, float]:
+    """Compute every evidence component for a claim"""
+    return {
+        "color": string_similarity(claim.claimed_color, item.color),
+        "condition": string_similarity(claim.claimed_condition, item.condition),
+        "location": string_similarity(claim.claimed_location, item.location),
+        "date": date_score(claim.claimed_date, item.date),
+        "details": details_overlap(claim.verification_details, item),
+    }
+
+
+def combine(components: Dict[str, float], weights: Dict[str, float]) -> float:
+    """Weighted average of the components, as a 0-100 score"""
+    total = sum(weights.values())
+    if total <= 0:
+        return 0.0
+    return round(100 * sum(weights[k] * components[k] for k in weights) / total, 2)
+
+
+def validate_weights(weights: Dict[str, float]) -> Dict[str, float]:
+    """Fill in missing weights from the defaults and reject bad ones"""
+    unknown = set(weights) - set(DEFAULT_WEIGHTS)
+    if unknown:
+        raise ValueError(f"Unknown score weights: {', '.join(sorted(unknown))}")
+    merged = {k: float(v) for k, v in {**DEFAULT_WEIGHTS, **weights}.items()}
+    if any(w < 0 for w in merged.values()):
+        raise ValueError("Score weights must not be negative")
+    if sum(merged.values()) <= 0:
+        raise ValueError("At least one score weight must be positive")
+    return merged
+
+
+def apply_score(claim: Claim, item: Item, weights: Dict[str, float]):
+    """Store the components and the weighted match score on a claim"""
+    components = score_components(claim, item)
+    for key, value in components.items():
+        setattr(claim, COMPONENT_COLUMNS[key].key, value)
+    claim.match_score = combine(components, weights)
+
+
+_claims = Claim.__table__
+_backfill = update(_claims).where(_claims.c.id == bindparam("claim_id")).values({
+    COMPONENT_COLUMNS[k].key: bindparam(f"new_{k}") for k in COMPONENT_COLUMNS
+})
+
+
+def rescore_claims(db: Session, weights: Dict[str, float], statuses=None) -> int:
+    """
+    Recompute match_score for every claim (optionally only some statuses)
+
+    Claims whose components were never computed are backfilled first, in
+    batches. The weighted score itself is one set-based UPDATE.
+    Does not commit.
+    """
+    missing = select(Claim, Item).join(Item, Claim.item_id == Item.id).where(Claim.score_color.is_(None))
+    if statuses:
+        missing = missing.where(Claim.status.in_(statuses))
+
+    while True:
+        rows = db.execute(missing.limit(RESCORE_BATCH_SIZE)).all()
+        if not rows:
+            break
+        # A table UPDATE keyed on id: an ORM update by primary key would bump the version (see versioning.py)
+        db.execute(_backfill, [
+            {"claim_id": claim.id, **{f"new_{k}": v for k, v in score_components(claim, item).items()}}
+            for claim, item in rows
+        ])
+
+    total = sum(weights.values())
+    score = sum(weights[k] * COMPONENT_COLUMNS[k] for k in weights) * (100.0 / total)
+
+    stmt = update(Claim).values(match_score=score).execution_options(synchronize_session=False)
+    if statuses:
+        stmt = stmt.where(Claim.status.in_(statuses))
+    return db.execute(stmt).rowcount
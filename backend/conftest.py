@@ -0,0 +1,58 @@
+"""
+Shared test setup
+
+The app's engine is built from DATABASE_URL when database.py is first
+imported, and several tests drop and recreate its tables. So the URL is
+forced to an in-memory SQLite database before anything imports the app,
+whatever the shell or .env says, and the db fixture refuses any other
+engine. Run from backend/:
+
+    cd backend && python -m pytest test_exports.py test_result_cache.py ...
+"""
+import os
+
+os.environ["DATABASE_URL"] = "sqlite://"
+
+from types import SimpleNamespace
+
+import pytest
+
+from database import Base, SessionLocal, engine
+from models import User, UserRole
+
+
+@pytest.fixture
+def db():
+    """A session on the app's database, with empty tables"""
+    # Route hooks (result cache, facet index, outbox) are registered on SessionLocal
+    if engine.url.get_backend_name() != "sqlite" or engine.url.database not in (None, "", ":memory:"):
+        pytest.exit(f"Refusing to drop the tables of {engine.url!r}; tests need an in-memory database", 2)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    yield session
+    session.close()
+    Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture
+def make_user():
+    """Build a User with the required columns filled in; n keeps email and student number unique"""
+    def make(n, role=UserRole.STUDENT, first_name="Stu", last_name="Dent"):
+        prefix = "A" if role == UserRole.ADMIN else "S"
+        return User(email=f"{prefix.lower()}{n}@school.edu", hashed_password="x", first_name=first_name,
+                    last_name=last_name, student_number=f"{prefix}-{n}", role=role, year_level=1, course="IT")
+    return make
+
+
+@pytest.fixture
+def users(db, make_user):
+    """An admin, a reporter and a claimant, flushed into db"""
+    people = SimpleNamespace(
+        admin=make_user(1, UserRole.ADMIN, "Ada", "Admin"),
+        reporter=make_user(1, first_name="Rep", last_name="Orter"),
+        claimant=make_user(2, first_name="Cla", last_name="Imant"),
+    )
+    db.add_all(vars(people).values())
+    db.flush()
+    return people
@@ -1,9 +1,16 @@
 from sqlalchemy import create_engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
+import time
 from dotenv import load_dotenv
 
+from sqlite_tuning import RoutingSession, create_sqlite_engines, is_file_database
+from pool_metrics import instrument
+import deadlines
+
 load_dotenv()
 
 # Database URL - using SQLite for development, can switch to PostgreSQL for production
@@ -12,19 +19,103 @@ SQLALCHEMY_DATABASE_URL = os.getenv(
     "sqlite:///./lost_and_found.db"
 )
 
-# Create engine
-if SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
+# Process model (see serve.py): worker processes x sync-route threads per worker
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "40"))  # anyio's default
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", "100"))  # server max_connections budget
+DB_RESERVED_CONNECTIONS = int(os.getenv("DB_RESERVED_CONNECTIONS", "5"))  # admin/migrations/psql
+
+
+def pool_limits(workers: int, threads: int, max_connections: int, reserved: int = 0):
+    """
+    Split a max-connections budget across worker processes
+
+    Each worker never needs more steady connections than it has threads
+    running sync routes; whatever is left of its share becomes overflow for
+    bursts (background threads, streaming exports).
+    Returns (pool_size, max_overflow).
+    """
+    per_worker = max(1, (max_connections - reserved) // max(1, workers))
+    pool_size = min(threads, per_worker)
+    return pool_size, per_worker - pool_size
+
+
+POOL_SIZE, MAX_OVERFLOW = pool_limits(
+    WEB_CONCURRENCY, THREADPOOL_SIZE, DB_MAX_CONNECTIONS, DB_RESERVED_CONNECTIONS
+)
+
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+
+class TimedQueuePool(QueuePool):
+    """
+    QueuePool keeping a moving average of how long checkouts wait
+
+    With pool_metrics.instrument() every wait also goes into its histogram.
+    """
+
+    wait_avg = 0.0
+    waited_at = 0.0
+    metrics = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            if self.metrics is not None:
+                self.metrics.timeouts += 1
+            raise
+        finally:
+            now = time.perf_counter()
+            self.wait_avg += 0.2 * ((now - start) - self.wait_avg)
+            self.waited_at = now
+            if self.metrics is not None:
+                self.metrics.checkout_wait.observe(now - start)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+    def recent_wait(self, window: float = 5.0) -> float:
+        """Average checkout wait in seconds, or 0 if nothing checked out lately"""
+        return self.wait_avg if time.perf_counter() - self.waited_at < window else 0.0
+
+
+# SQLite: "tuned" (WAL, pragmas, separate read/write pools, one writer) or "basic"
+SQLITE_MODE = os.getenv(
+    "SQLITE_MODE", "tuned" if is_file_database(SQLALCHEMY_DATABASE_URL) else "basic"
+)
+
+# Create engine. read_engine is the same engine unless SQLite runs in tuned mode.
+routing = None
+if SQLALCHEMY_DATABASE_URL.startswith("sqlite") and SQLITE_MODE == "tuned":
+    engine, read_engine = create_sqlite_engines(
+        SQLALCHEMY_DATABASE_URL,
+        read_pool_size=min(THREADPOOL_SIZE, 8),
+        read_max_overflow=max(0, THREADPOOL_SIZE - 8),
+        pool_timeout=DB_POOL_TIMEOUT,
+        poolclass=TimedQueuePool,
+    )
+    routing = {"write_engine": engine, "read_engine": read_engine}
+elif SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
     engine = create_engine(
         SQLALCHEMY_DATABASE_URL,
-        connect_args={"check_same_thread": False}
+        connect_args={"check_same_thread": False},
+        # In-memory databases keep SQLAlchemy's single-connection pool
+        **({"poolclass": TimedQueuePool} if is_file_database(SQLALCHEMY_DATABASE_URL) else {})
     )
+    read_engine = engine
 else:
     # PostgreSQL with connection pooling and timeout settings
     engine = create_engine(
         SQLALCHEMY_DATABASE_URL,
         pool_pre_ping=True,  # Enable connection health checks
-        pool_size=10,  # Maximum connections in the pool
-        max_overflow=20,  # Allow additional connections
+        pool_size=POOL_SIZE,  # Steady connections per worker process
+        max_overflow=MAX_OVERFLOW,  # Rest of this worker's share of the budget
+        pool_timeout=DB_POOL_TIMEOUT,
+        poolclass=TimedQueuePool,
         pool_recycle=3600,  # Recycle connections after 1 hour
         connect_args={
             "connect_timeout": 10,  # Connection timeout in seconds
@@ -34,9 +125,32 @@ else:
             "keepalives_count": 5,
         }
     )
+    read_engine = engine
+
+
+instrument(engine, "primary")
+deadlines.install(engine)
+if read_engine is not engine:
+    instrument(read_engine, "read")
+    deadlines.install(read_engine)
+
+
+# In tuned SQLite mode the writer pool has one connection: writes queueing on it
+# is how they are serialized, not a sign of overload
+SERIALIZED_WRITER = routing is not None
+
+
+def pool_wait_seconds() -> float:
+    """Recent average wait for a pooled connection, across this process's pools (but the serialized writer)"""
+    pools = {read_engine.pool} if SERIALIZED_WRITER else {engine.pool, read_engine.pool}
+    return max((p.recent_wait() for p in pools if isinstance(p, TimedQueuePool)), default=0.0)
+
 
 # Create session
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+if routing is not None:
+    SessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, **routing)
+else:
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 # Base class for models
 Base = declarative_base()
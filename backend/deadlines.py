@@ -0,0 +1,210 @@
+"""
+Per-request deadlines
+
+@deadline(seconds) gives a route a latency budget. While it runs, every
+statement it sends is bounded by what is left of the budget:
+
+- PostgreSQL: SET LOCAL statement_timeout before each statement, so the
+  server cancels a query that would overrun.
+- SQLite: a progress handler interrupts the statement once the deadline
+  has passed.
+
+Once the deadline has passed, later statements are refused before they
+reach the database, and async routes are cancelled. The client gets 503
+instead of holding a pooled connection for the rest of a pathological
+query. Each budgeted route counts its requests, overruns and durations
+(/api/admin/deadlines).
+
+Budgets are set next to the routes in main.py and admin_routes.py.
+DEADLINES_ENABLED=false turns them all off.
+"""
+import asyncio
+import functools
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+import anyio
+from fastapi import HTTPException, status
+from sqlalchemy import event
+from sqlalchemy.exc import DBAPIError
+
+from pool_metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+DEADLINES_ENABLED = os.getenv("DEADLINES_ENABLED", "true").lower() == "true"
+# SQLite VM instructions between deadline checks
+SQLITE_PROGRESS_STEPS = int(os.getenv("SQLITE_PROGRESS_STEPS", "10000"))
+
+# Route durations, in milliseconds
+DURATION_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+# time.monotonic() after which the current request's remaining work is abandoned
+_expires_at: ContextVar[Optional[float]] = ContextVar("deadline_expires_at", default=None)
+
+
+class DeadlineExceeded(HTTPException):
+    def __init__(self):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="The request took too long, please try again shortly",
+            headers={"Retry-After": "1"},
+        )
+
+
+class RouteStats:
+    def __init__(self, route: str, budget: float):
+        self.route = route
+        self.budget = budget
+        self.requests = 0
+        self.exceeded = 0
+        self.durations = Histogram(DURATION_BUCKETS_MS)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, exceeded: bool):
+        with self._lock:
+            self.requests += 1
+            self.exceeded += exceeded
+        self.durations.observe(seconds)
+
+    def as_dict(self) -> dict:
+        return {
+            "budgetMs": round(self.budget * 1000),
+            "requests": self.requests,
+            "exceeded": self.exceeded,
+            "duration": self.durations.as_dict(),
+        }
+
+
+_stats: Dict[str, RouteStats] = {}
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current request's deadline (None without one)"""
+    expires_at = _expires_at.get()
+    return None if expires_at is None else expires_at - time.monotonic()
+
+
+def check():
+    """Raise DeadlineExceeded if the current request is out of time"""
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded()
+
+
+@contextmanager
+def bounded(seconds: float):
+    """Bound the statements run inside the block, for work outside a route"""
+    token = _expires_at.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _expires_at.reset(token)
+
+
+def _finish(stats: RouteStats, start: float, error: Optional[BaseException]):
+    exceeded = isinstance(error, DeadlineExceeded)
+    stats.record(time.monotonic() - start, exceeded)
+    if exceeded:
+        logger.warning("%s exceeded its %.1fs deadline", stats.route, stats.budget)
+
+
+def _translate(e: BaseException) -> BaseException:
+    """The database cancelled or interrupted a statement because the deadline passed"""
+    if isinstance(e, DBAPIError) and (remaining() or 0) <= 0:
+        return DeadlineExceeded()
+    return e
+
+
+def deadline(seconds: float):
+    """
+    Give a route a latency budget of `seconds`
+
+    Goes directly below the route decorator. Statements the route runs are
+    cut short when the budget runs out, and the request gets 503.
+    """
+    def decorator(func):
+        if not DEADLINES_ENABLED:
+            return func
+        route = func.__name__
+        stats = _stats.setdefault(route, RouteStats(route, seconds))
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                start = time.monotonic()
+                token = _expires_at.set(start + seconds)
+                error = None
+                try:
+                    with anyio.fail_after(seconds):
+                        return await func(*args, **kwargs)
+                except TimeoutError:
+                    error = DeadlineExceeded()
+                    raise error
+                except Exception as e:
+                    error = _translate(e)
+                    if error is e:
+                        raise
+                    raise error from e
+                finally:
+                    _expires_at.reset(token)
+                    _finish(stats, start, error)
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                start = time.monotonic()
+                token = _expires_at.set(start + seconds)
+                error = None
+                try:
+                    return func(*args, **kwargs)
+                except Exception as e:
+                    error = _translate(e)
+                    if error is e:
+                        raise
+                    raise error from e
+                finally:
+                    _expires_at.reset(token)
+                    _finish(stats, start, error)
+
+        wrapper.deadline = seconds
+        return wrapper
+    return decorator
+
+
+def _sqlite_progress() -> int:
+    # Runs on the thread executing the statement, so it sees that request's deadline
+    expires_at = _expires_at.get()
+    return int(expires_at is not None and time.monotonic() > expires_at)
+
+
+def install(engine):
+    """Bound the statements engine runs by the current request's deadline"""
+    if not DEADLINES_ENABLED:
+        return
+    postgres = engine.dialect.name == "postgresql"
+
+    if engine.dialect.name == "sqlite":
+        @event.listens_for(engine, "connect")
+        def _progress_handler(dbapi_connection, connection_record):
+            dbapi_connection.set_progress_handler(_sqlite_progress, SQLITE_PROGRESS_STEPS)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _bound_statement(conn, cursor, statement, parameters, context, executemany):
+        left = remaining()
+        if left is None:
+            return
+        if left <= 0:
+            raise DeadlineExceeded()
+        if postgres:
+            # Scoped to the transaction, so the pooled connection goes back unbounded
+            cursor.execute("SET LOCAL statement_timeout = %s", (max(1, int(left * 1000)),))
+
+
+def stats() -> dict:
+    """Budget, requests, overruns and durations per budgeted route"""
+    return {route: route_stats.as_dict() for route, route_stats in _stats.items()}
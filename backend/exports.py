@@ -0,0 +1,228 @@
+"""
+Streaming CSV / NDJSON exports for admins
+
+Rows are read with yield_per (server-side cursor on PostgreSQL) and written
+out one batch at a time, so an export of any size runs in constant memory and
+the first bytes are sent as soon as the first batch is fetched.
+"""
+import csv
+import enum
+import io
+import json
+from datetime import datetime
+from typing import Iterator, List, Optional
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+
+from database import SessionLocal
+from models import AuditLog, Item, Claim, User, ItemStatus, ClaimStatus, VerificationStatus
+
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def parse_filter(enum_cls, value: Optional[str], name: str):
+    """
+    The enum member for a status filter, or 400
+
+    Checked in the route: once the StreamingResponse has started, an error
+    can only cut the download short.
+    """
+    if not value:
+        return None
+    try:
+        return enum_cls(value.lower())
+    except ValueError:
+        allowed = ", ".join(member.value for member in enum_cls)
+        raise HTTPException(status_code=400, detail=f"Invalid {name}, expected one of: {allowed}")
+
+
+def _full_name(user):
+    return user.first_name + " " + user.last_name
+
+
+def audit_log_export_query(
+    action: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+):
+    """Audit logs joined with the admin's name"""
+    admin = aliased(User)
+    stmt = select(
+        AuditLog.id.label("id"),
+        AuditLog.action.label("action"),
+        AuditLog.entity_type.label("entityType"),
+        AuditLog.entity_id.label("entityId"),
+        AuditLog.details.label("details"),
+        AuditLog.admin_id.label("adminId"),
+        _full_name(admin).label("adminName"),
+        AuditLog.created_at.label("createdAt"),
+    ).join(admin, AuditLog.admin_id == admin.id)
+
+    if action:
+        stmt = stmt.where(AuditLog.action == action)
+    if start_date:
+        stmt = stmt.where(AuditLog.created_at >= start_date)
+    if end_date:
+        stmt = stmt.where(AuditLog.created_at < end_date)
+
+    return stmt.order_by(AuditLog.id)
+
+
+def item_export_query(
+    status: Optional[ItemStatus] = None,
+    verification_status: Optional[VerificationStatus] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+):
+    """Items joined with reporter and verifying admin names"""
+    reporter = aliased(User)
+    verifier = aliased(User)
+    stmt = select(
+        Item.id.label("id"),
+        Item.reference_number.label("referenceNumber"),
+        Item.title.label("title"),
+        Item.category.label("category"),
+        Item.color.label("color"),
+        Item.condition.label("condition"),
+        Item.location.label("location"),
+        Item.date.label("date"),
+        Item.status.label("status"),
+        Item.verification_status.label("verificationStatus"),
+        Item.is_urgent.label("isUrgent"),
+        Item.is_published.label("isPublished"),
+        Item.reporter_id.label("reporterId"),
+        _full_name(reporter).label("reporterName"),
+        reporter.email.label("reporterEmail"),
+        _full_name(verifier).label("verifiedBy"),
+        Item.created_at.label("createdAt"),
+        Item.verified_at.label("verifiedAt"),
+        Item.published_at.label("publishedAt"),
+        Item.returned_at.label("returnedAt"),
+    ).join(
+        reporter, Item.reporter_id == reporter.id
+    ).outerjoin(
+        verifier, Item.verified_by_id == verifier.id
+    )
+
+    if status:
+        stmt = stmt.where(Item.status == status)
+    if verification_status:
+        stmt = stmt.where(Item.verification_status == verification_status)
+    if start_date:
+        stmt = stmt.where(Item.created_at >= start_date)
+    if end_date:
+        stmt = stmt.where(Item.created_at < end_date)
+
+    return stmt.order_by(Item.id)
+
+
+def claim_export_query(
+    status: Optional[ClaimStatus] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+):
+    """Claims joined with item summary, claimant and reviewer names"""
+    claimant = aliased(User)
+    reviewer = aliased(User)
+    stmt = select(
+        Claim.id.label("id"),
+        Claim.item_id.label("itemId"),
+        Item.reference_number.label("itemReferenceNumber"),
+        Item.title.label("itemTitle"),
+        Claim.status.label("status"),
+        Claim.claimant_id.label("claimantId"),
+        _full_name(claimant).label("claimantName"),
+        claimant.email.label("claimantEmail"),
+        Claim.claimed_color.label("claimedColor"),
+        Claim.claimed_condition.label("claimedCondition"),
+        Claim.claimed_location.label("claimedLocation"),
+        Claim.claimed_date.label("claimedDate"),
+        Claim.rejection_reason.label("rejectionReason"),
+        _full_name(reviewer).label("reviewedBy"),
+        Claim.created_at.label("createdAt"),
+        Claim.reviewed_at.label("reviewedAt"),
+    ).join(
+        Item, Claim.item_id == Item.id
+    ).join(
+        claimant, Claim.claimant_id == claimant.id
+    ).outerjoin(
+        reviewer, Claim.reviewed_by_id == reviewer.id
+    )
+
+    if status:
+        stmt = stmt.where(Claim.status == status)
+    if start_date:
+        stmt = stmt.where(Claim.created_at >= start_date)
+    if end_date:
+        stmt = stmt.where(Claim.created_at < end_date)
+
+    return stmt.order_by(Claim.id)
+
+
+def _plain(value):
+    """Convert a column value to something csv/json can write"""
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _csv_chunk(rows) -> str:
+    out = io.StringIO()
+    writer = csv.writer(out)
+    for row in rows:
+        writer.writerow(["" if v is None else _plain(v) for v in row])
+    return out.getvalue()
+
+
+def _ndjson_chunk(columns: List[str], rows) -> str:
+    return "".join(
+        json.dumps(dict(zip(columns, (_plain(v) for v in row)))) + "\n"
+        for row in rows
+    )
+
+
+def stream_export(stmt, fmt: str) -> Iterator[str]:
+    """
+    Yield the export one batch at a time
+
+    Uses its own session: the request's session is closed before a
+    StreamingResponse body is sent.
+    """
+    db = SessionLocal()
+    try:
+        result = db.execute(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        columns = list(result.keys())
+
+        if fmt == "csv":
+            yield _csv_chunk([columns])
+
+        for batch in result.partitions():
+            if fmt == "csv":
+                yield _csv_chunk(batch)
+            else:
+                yield _ndjson_chunk(columns, batch)
+    finally:
+        db.close()
+
+
+def export_response(stmt, fmt: str, name: str) -> StreamingResponse:
+    """Wrap an export query in a StreamingResponse download"""
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Invalid export format")
+
+    filename = f"{name}-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.{fmt}"
+    return StreamingResponse(
+        stream_export(stmt, fmt),
+        media_type=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
@@ -0,0 +1,318 @@
+"""
+In-memory facet index of published items
+
+Columns are kept per slot in compact arrays (item id, created_at, day of
+the item's date, and integer codes for category, status and location).
+Every facet value, and every day, also has a bitmap: a Python int with bit
+`slot` set for each item that has the value. Filtering is AND/OR over those
+ints, facet counts are int.bit_count(), and a page of results is read off
+the highest set bits, since slots are kept in created_at order. None of
+that touches the database.
+
+The index loads all published items on first use, then applies rows whose
+updated_at moved since the last sync (at most every FACET_SYNC_SECONDS, or
+straight after this process commits an item change). A full rebuild every
+FACET_REBUILD_SECONDS compacts it and catches anything a sync missed.
+"""
+import logging
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, object_session
+
+from database import SessionLocal
+from models import Item
+
+logger = logging.getLogger(__name__)
+
+FACET_SYNC_SECONDS = float(os.getenv("FACET_SYNC_SECONDS", "2"))
+FACET_REBUILD_SECONDS = float(os.getenv("FACET_REBUILD_SECONDS", "900"))
+# Re-read rows updated this long before the watermark, for transactions that
+# committed after a later one was already synced
+FACET_SYNC_OVERLAP = timedelta(seconds=float(os.getenv("FACET_SYNC_OVERLAP_SECONDS", "30")))
+
+FACETS = ("category", "status", "location")
+
+
+def _bitmap(slots, size: int) -> int:
+    """Build a bitmap from slot numbers in O(size) rather than one shift per slot"""
+    buffer = bytearray((size + 7) // 8)
+    for slot in slots:
+        buffer[slot >> 3] |= 1 << (slot & 7)
+    return int.from_bytes(buffer, "little")
+
+
+def _top_slots(bitmap: int, skip: int, limit: int) -> List[int]:
+    """Slots of the highest set bits, skipping the first `skip`"""
+    slots = []
+    while bitmap and len(slots) < skip + limit:
+        slot = bitmap.bit_length() - 1
+        slots.append(slot)
+        bitmap ^= 1 << slot
+    return slots[skip:]
+
+
+class _Row:
+    __slots__ = ("id", "created", "day", "values")
+
+    def __init__(self, item_id, created, day, values):
+        self.id = item_id
+        self.created = created
+        self.day = day
+        self.values = values
+
+
+class FacetIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self.loaded = False
+        self.dirty = False
+        self.synced_at = 0.0
+        self.rebuilt_at = 0.0
+        self.watermark: Optional[datetime] = None
+        self._load([])
+
+    # =================
+    # STORAGE
+    # =================
+
+    def _load(self, rows: List[_Row]):
+        """Replace the contents with rows (any order); slots follow created_at"""
+        rows = sorted(rows, key=lambda r: (r.created, r.id))
+        size = len(rows)
+        self.values: Dict[str, List[str]] = {f: [] for f in FACETS}
+        self.code_of: Dict[str, Dict[str, int]] = {f: {} for f in FACETS}
+        self.slot_ids = array("q", (r.id for r in rows))
+        self.created = array("d", (r.created for r in rows))
+        self.days = array("l", (r.day for r in rows))
+        self.codes = {f: array("l", (self._code(f, r.values[f]) for r in rows)) for f in FACETS}
+        self.slot_of = {r.id: slot for slot, r in enumerate(rows)}
+
+        members = {f: defaultdict(list) for f in FACETS}
+        day_members = defaultdict(list)
+        for slot in range(size):
+            for f in FACETS:
+                members[f][self.codes[f][slot]].append(slot)
+            day_members[self.days[slot]].append(slot)
+        self.bitmaps = {f: {code: _bitmap(s, size) for code, s in members[f].items()} for f in FACETS}
+        self.by_day = {day: _bitmap(s, size) for day, s in day_members.items()}
+        self.sorted_days = sorted(self.by_day)
+        self.live = (1 << size) - 1
+        self.in_order = True
+
+    def _code(self, facet: str, value: str) -> int:
+        code = self.code_of[facet].get(value)
+        if code is None:
+            code = len(self.values[facet])
+            self.values[facet].append(value)
+            self.code_of[facet][value] = code
+        return code
+
+    def _clear(self, slot: int):
+        mask = ~(1 << slot)
+        self.live &= mask
+        for f in FACETS:
+            code = self.codes[f][slot]
+            self.bitmaps[f][code] &= mask
+        self.by_day[self.days[slot]] &= mask
+
+    def _set(self, slot: int, row: _Row):
+        bit = 1 << slot
+        self.live |= bit
+        for f in FACETS:
+            code = self._code(f, row.values[f])
+            self.codes[f][slot] = code
+            self.bitmaps[f][code] = self.bitmaps[f].get(code, 0) | bit
+        if row.day not in self.by_day:
+            self.sorted_days.insert(bisect_left(self.sorted_days, row.day), row.day)
+        self.by_day[row.day] = self.by_day.get(row.day, 0) | bit
+        self.days[slot] = row.day
+        self.created[slot] = row.created
+
+    def _upsert(self, row: _Row):
+        slot = self.slot_of.get(row.id)
+        if slot is not None:
+            self._clear(slot)
+        else:
+            slot = len(self.slot_ids)
+            if slot and row.created < self.created[slot - 1]:
+                self.in_order = False
+            self.slot_ids.append(row.id)
+            self.created.append(row.created)
+            self.days.append(row.day)
+            for f in FACETS:
+                self.codes[f].append(0)
+            self.slot_of[row.id] = slot
+        self._set(slot, row)
+
+    def _remove(self, item_id: int):
+        slot = self.slot_of.pop(item_id, None)
+        if slot is not None:
+            self._clear(slot)
+
+    def _compact(self):
+        """Re-sort into created_at order and drop the slots of removed items"""
+        self._load([
+            _Row(self.slot_ids[slot], self.created[slot], self.days[slot],
+                 {f: self.values[f][self.codes[f][slot]] for f in FACETS})
+            for slot in self.slot_of.values()
+        ])
+
+    # =================
+    # QUERIES
+    # =================
+
+    def _date_bitmap(self, date_from: Optional[date], date_to: Optional[date]) -> int:
+        lo = bisect_left(self.sorted_days, date_from.toordinal()) if date_from else 0
+        hi = bisect_right(self.sorted_days, date_to.toordinal()) if date_to else len(self.sorted_days)
+        bitmap = 0
+        for day in self.sorted_days[lo:hi]:
+            bitmap |= self.by_day[day]
+        return bitmap
+
+    def _match(self, filters: dict, skip_facet: Optional[str] = None) -> int:
+        bitmap = self.live
+        for f in FACETS:
+            value = filters.get(f)
+            if value is None or f == skip_facet:
+                continue
+            code = self.code_of[f].get(value)
+            bitmap &= self.bitmaps[f].get(code, 0) if code is not None else 0
+        if filters.get("date_from") or filters.get("date_to"):
+            bitmap &= self._date_bitmap(filters.get("date_from"), filters.get("date_to"))
+        return bitmap
+
+    def search(self, filters: dict, skip: int, limit: int) -> Tuple[int, List[int]]:
+        """(total matches, item ids of the requested page, newest first)"""
+        with self._lock:
+            if not self.in_order:
+                self._compact()
+            bitmap = self._match(filters)
+            return bitmap.bit_count(), [self.slot_ids[s] for s in _top_slots(bitmap, skip, limit)]
+
+    def facet_counts(self, filters: dict) -> dict:
+        """
+        Count of matching items per value of each facet
+
+        Each facet is counted with the other facets' filters applied but not
+        its own, so the counts show what choosing another value would give.
+        """
+        with self._lock:
+            result = {"total": self._match(filters).bit_count()}
+            for f in FACETS:
+                base = self._match(filters, skip_facet=f)
+                counts = {}
+                for code, bitmap in self.bitmaps[f].items():
+                    count = (base & bitmap).bit_count()
+                    if count:
+                        counts[self.values[f][code]] = count
+                # The chosen value is always listed, even when nothing (or nothing any more) has it
+                if filters.get(f) is not None:
+                    counts.setdefault(filters[f], 0)
+                result[f] = sorted(
+                    ({"value": value, "count": count} for value, count in counts.items()),
+                    key=lambda c: (-c["count"], c["value"])
+                )
+            return result
+
+    # =================
+    # SYNC
+    # =================
+
+    def refresh(self, force: bool = False):
+        """Bring the index up to date if it is due, or now with force (blocks only for the first load)"""
+        now = time.monotonic()
+        full = not self.loaded or now - self.rebuilt_at > FACET_REBUILD_SECONDS
+        if not full and not force and not self.dirty and now - self.synced_at < FACET_SYNC_SECONDS:
+            return
+        if not self._sync_lock.acquire(blocking=not self.loaded):
+            return  # Another thread is syncing; serve what we have
+        try:
+            self.dirty = False
+            db = SessionLocal()
+            try:
+                self._sync(db, full)
+            finally:
+                db.close()
+            self.synced_at = now
+            if full:
+                self.rebuilt_at = now
+                self.loaded = True
+        except Exception:
+            self.dirty = True
+            if not self.loaded:
+                raise
+            logger.exception("Facet index sync failed")
+        finally:
+            self._sync_lock.release()
+
+    def _sync(self, db: Session, full: bool):
+        query = select(
+            Item.id, Item.category, Item.status, Item.location, Item.date,
+            Item.created_at, Item.updated_at, Item.is_published
+        )
+        if full:
+            query = query.where(Item.is_published == True)
+        else:
+            query = query.where(Item.updated_at >= self.watermark - FACET_SYNC_OVERLAP)
+
+        rows, watermark = [], self.watermark
+        for r in db.execute(query):
+            if r.updated_at and (watermark is None or r.updated_at > watermark):
+                watermark = r.updated_at
+            rows.append((r.is_published, _Row(
+                r.id,
+                r.created_at.timestamp() if r.created_at else 0.0,
+                r.date.toordinal(),
+                {"category": r.category, "status": r.status.value, "location": r.location},
+            )))
+
+        with self._lock:
+            if full:
+                self._load([row for published, row in rows])
+            else:
+                for published, row in rows:
+                    if published:
+                        self._upsert(row)
+                    else:
+                        self._remove(row.id)
+            self.watermark = watermark or datetime.utcnow()
+
+
+index = FacetIndex()
+
+
+# Sync straight after this process commits a change to an item
+@event.listens_for(Item, "after_insert")
+@event.listens_for(Item, "after_update")
+def _item_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info["items_changed"] = True
+
+
+@event.listens_for(SessionLocal, "do_orm_execute")
+def _bulk_item_update(orm_execute_state):
+    if orm_execute_state.is_update and any(
+        m.class_ is Item for m in orm_execute_state.all_mappers
+    ):
+        orm_execute_state.session.info["items_changed"] = True
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _mark_dirty(session):
+    if session.info.pop("items_changed", False):
+        index.dirty = True
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _forget_changes(session):
+    session.info.pop("items_changed", None)
@@ -0,0 +1,127 @@
+"""
+Liveness and readiness probes
+
+/health/live answers from the event loop without touching the database:
+the process is up and serving. /health/ready says whether this worker can
+serve requests right now. It is not ready while its pool is exhausted and
+checkouts have been waiting more than READY_MAX_POOL_WAIT_MS (not counting
+the one-connection writer of tuned SQLite, busy whenever a write is), or when
+SELECT 1 fails or takes longer than READY_TIMEOUT_SECONDS. The check runs
+on its own thread (the request threadpool may be the thing that is stuck)
+and its result is reused for READY_CACHE_SECONDS, so load balancers can
+poll it often.
+"""
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, status
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+
+from database import engine, read_engine, SERIALIZED_WRITER, TimedQueuePool
+from pool_metrics import gauges
+import stale_reads
+
+logger = logging.getLogger(__name__)
+
+READY_CACHE_SECONDS = float(os.getenv("READY_CACHE_SECONDS", "2"))
+READY_TIMEOUT_SECONDS = float(os.getenv("READY_TIMEOUT_SECONDS", "3"))
+READY_MAX_POOL_WAIT_MS = float(os.getenv("READY_MAX_POOL_WAIT_MS", "1000"))
+
+router = APIRouter(tags=["health"])
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="health-check")
+_last: Optional[dict] = None
+_last_at = 0.0
+_running: Optional[Future] = None
+
+
+def check() -> dict:
+    """Run the readiness checks (blocking)"""
+    reasons = []
+    pools = {}
+    for name, pool_engine in {"primary": engine, "read": read_engine}.items():
+        if name == "read" and pool_engine is engine:
+            continue
+        pool = pool_engine.pool
+        wait_ms = pool.recent_wait() * 1000 if isinstance(pool, TimedQueuePool) else 0.0
+        occupancy = gauges(pool)
+        pools[name] = {**occupancy, "recentWaitMs": round(wait_ms, 1)}
+        serialized = SERIALIZED_WRITER and pool_engine is engine
+        if occupancy.get("exhausted") and wait_ms > READY_MAX_POOL_WAIT_MS and not serialized:
+            reasons.append(f"{name} pool exhausted, checkouts waiting {wait_ms:.0f} ms")
+
+    database = None
+    if not reasons:
+        start = time.perf_counter()
+        try:
+            with read_engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            database = {"latencyMs": round((time.perf_counter() - start) * 1000, 1)}
+        except Exception as e:
+            reasons.append(f"database unreachable: {str(e).splitlines()[0]}")
+
+    return {
+        "status": "not_ready" if reasons else "ready",
+        "reasons": reasons,
+        "database": database,
+        "pools": pools,
+        "staleReads": stale_reads.breaker_state(),
+        "checkedAt": datetime.utcnow(),
+    }
+
+
+async def readiness() -> dict:
+    """The cached readiness result, re-checked once it is READY_CACHE_SECONDS old"""
+    global _last, _last_at, _running
+    if _last is not None and time.monotonic() - _last_at < READY_CACHE_SECONDS:
+        return _last
+
+    # Concurrent probes share one check; a check still stuck from before is waited on again
+    if _running is None:
+        _running = _executor.submit(check)
+    running = _running
+    try:
+        result = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(running)), READY_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        result = {
+            "status": "not_ready",
+            "reasons": [f"readiness check took longer than {READY_TIMEOUT_SECONDS:g}s"],
+            "database": None,
+            "pools": {},
+            "checkedAt": datetime.utcnow(),
+        }
+    except Exception as e:
+        logger.exception("Readiness check failed")
+        result = {
+            "status": "not_ready", "reasons": [str(e)], "database": None, "pools": {},
+            "checkedAt": datetime.utcnow(),
+        }
+    if running.done() and _running is running:
+        _running = None
+
+    if result["status"] != "ready" and (_last is None or _last["status"] == "ready"):
+        logger.warning("Worker %d not ready: %s", os.getpid(), "; ".join(result["reasons"]))
+    _last, _last_at = result, time.monotonic()
+    return result
+
+
+@router.get("/health/live")
+async def live():
+    """The process is up and its event loop is responding"""
+    return {"status": "alive"}
+
+
+@router.get("/health/ready")
+async def ready():
+    """Whether this worker can serve requests (503 when it cannot)"""
+    result = await readiness()
+    return JSONResponse(
+        content={**result, "checkedAt": result["checkedAt"].isoformat()},
+        status_code=status.HTTP_200_OK if result["status"] == "ready" else status.HTTP_503_SERVICE_UNAVAILABLE,
+    )
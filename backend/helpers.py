@@ -1,7 +1,9 @@
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 from datetime import datetime
 from models import Notification, ItemTimeline, AuditLog, User, Item
-from typing import Optional
+from typing import List, Optional
+import result_cache
 
 
 def create_notification(
@@ -85,79 +87,179 @@ def create_audit_log(
     return log
 
 
+def bulk_create_notifications(db: Session, notifications: List[dict]):
+    """
+    Insert many notifications in one statement
+
+    Each dict takes the same fields as create_notification. Does not commit,
+    so the rows land in the caller's transaction.
+    """
+    if not notifications:
+        return
+    db.execute(insert(Notification), [
+        {
+            "user_id": n["user_id"],
+            "type": n["notification_type"],
+            "title": n["title"],
+            "message": n["message"],
+            "item_id": n.get("item_id"),
+            "link": n.get("link"),
+        }
+        for n in notifications
+    ])
+
+
+def bulk_create_timeline_events(db: Session, events: List[dict]):
+    """Insert many timeline events in one statement (caller commits)"""
+    if not events:
+        return
+    db.execute(insert(ItemTimeline), [
+        {
+            "item_id": e["item_id"],
+            "action": e["action"],
+            "description": e["description"],
+            "performed_by_id": e.get("performed_by_id"),
+        }
+        for e in events
+    ])
+
+
+def bulk_create_audit_logs(db: Session, logs: List[dict]):
+    """Insert many audit log entries in one statement (caller commits)"""
+    if not logs:
+        return
+    db.execute(insert(AuditLog), [
+        {
+            "admin_id": log["admin_id"],
+            "action": log["action"],
+            "entity_type": log["entity_type"],
+            "entity_id": log["entity_id"],
+            "details": log.get("details"),
+        }
+        for log in logs
+    ])
+
+
+def item_approved_notification(item: Item) -> dict:
+    """Notification fields telling the reporter their found item was approved"""
+    return {
+        "user_id": item.reporter_id,
+        "notification_type": "found_approved",
+        "title": "Found Item Approved",
+        "message": f"Your found item '{item.title}' has been approved and published.",
+        "item_id": item.id,
+        "link": f"/items/{item.id}",
+    }
+
+
+def item_rejected_notification(item: Item, reason: str) -> dict:
+    """Notification fields telling the reporter their found item was rejected"""
+    return {
+        "user_id": item.reporter_id,
+        "notification_type": "item_rejected",
+        "title": "Found Item Rejected",
+        "message": f"Your found item '{item.title}' was rejected. Reason: {reason}",
+        "item_id": item.id,
+    }
+
+
 def notify_item_approved(db: Session, item: Item, admin: User):
     """Notify reporter that their found item was approved"""
-    create_notification(
-        db=db,
-        user_id=item.reporter_id,
-        notification_type="found_approved",
-        title="Found Item Approved",
-        message=f"Your found item '{item.title}' has been approved and published.",
-        item_id=item.id,
-        link=f"/items/{item.id}"
-    )
+    create_notification(db=db, **item_approved_notification(item))
 
 
 def notify_item_rejected(db: Session, item: Item, reason: str):
     """Notify reporter that their found item was rejected"""
-    create_notification(
-        db=db,
-        user_id=item.reporter_id,
-        notification_type="item_rejected",
-        title="Found Item Rejected",
-        message=f"Your found item '{item.title}' was rejected. Reason: {reason}",
-        item_id=item.id
-    )
+    create_notification(db=db, **item_rejected_notification(item, reason))
+
+
+def more_info_requested_notification(item: Item, message: str) -> dict:
+    """Notification fields asking the reporter for more information"""
+    return {
+        "user_id": item.reporter_id,
+        "notification_type": "more_info_requested",
+        "title": "More Information Needed",
+        "message": f"For '{item.title}': {message}",
+        "item_id": item.id,
+        "link": f"/items/{item.id}",
+    }
 
 
 def notify_more_info_requested(db: Session, item: Item, message: str):
     """Notify reporter that more information is requested"""
-    create_notification(
-        db=db,
-        user_id=item.reporter_id,
-        notification_type="more_info_requested",
-        title="More Information Needed",
-        message=f"For '{item.title}': {message}",
-        item_id=item.id,
-        link=f"/items/{item.id}"
-    )
+    create_notification(db=db, **more_info_requested_notification(item, message))
+
+
+def claim_submitted_notification(item: Item) -> dict:
+    """Notification fields telling the reporter someone claimed their item"""
+    return {
+        "user_id": item.reporter_id,
+        "notification_type": "claim_submitted",
+        "title": "Claim Submitted",
+        "message": f"Someone has submitted a claim for '{item.title}'.",
+        "item_id": item.id,
+    }
+
+
+def new_claim_admin_notification(item: Item, admin_id: int, claim_id: int) -> dict:
+    """Notification fields telling an admin a claim is waiting for review"""
+    return {
+        "user_id": admin_id,
+        "notification_type": "new_claim",
+        "title": "New Claim Submitted",
+        "message": f"A claim has been submitted for '{item.title}' (Ref: {item.reference_number})",
+        "item_id": item.id,
+        "link": f"/admin/claims/{claim_id}",
+    }
 
 
 def notify_claim_submitted(db: Session, item: Item, claimant: User):
     """Notify item reporter that someone claimed their item"""
-    create_notification(
-        db=db,
-        user_id=item.reporter_id,
-        notification_type="claim_submitted",
-        title="Claim Submitted",
-        message=f"Someone has submitted a claim for '{item.title}'.",
-        item_id=item.id
-    )
+    create_notification(db=db, **claim_submitted_notification(item))
+
+
+def claim_approved_notification(item: Item, claimant_id: int) -> dict:
+    """Notification fields telling a claimant their claim was approved"""
+    return {
+        "user_id": claimant_id,
+        "notification_type": "claim_approved",
+        "title": "Claim Approved",
+        "message": f"Your claim for '{item.title}' has been approved! Item is ready for release.",
+        "item_id": item.id,
+        "link": f"/items/{item.id}",
+    }
+
+
+def claim_denied_notification(item: Item, claimant_id: int, reason: str) -> dict:
+    """Notification fields telling a claimant their claim was denied"""
+    return {
+        "user_id": claimant_id,
+        "notification_type": "claim_denied",
+        "title": "Claim Denied",
+        "message": f"Your claim for '{item.title}' was denied. Reason: {reason}",
+        "item_id": item.id,
+    }
+
+
+def claim_more_info_notification(item: Item, claimant_id: int, notes: Optional[str]) -> dict:
+    """Notification fields asking a claimant for more information"""
+    return {
+        "user_id": claimant_id,
+        "notification_type": "more_info_requested",
+        "title": "More Information Needed",
+        "message": f"We need more information about your claim for '{item.title}'. {notes}",
+        "item_id": item.id,
+    }
 
 
 def notify_claim_approved(db: Session, item: Item, claimant_id: int):
     """Notify claimant that their claim was approved"""
-    create_notification(
-        db=db,
-        user_id=claimant_id,
-        notification_type="claim_approved",
-        title="Claim Approved",
-        message=f"Your claim for '{item.title}' has been approved! Item is ready for release.",
-        item_id=item.id,
-        link=f"/items/{item.id}"
-    )
+    create_notification(db=db, **claim_approved_notification(item, claimant_id))
 
 
 def notify_claim_denied(db: Session, item: Item, claimant_id: int, reason: str):
     """Notify claimant that their claim was denied"""
-    create_notification(
-        db=db,
-        user_id=claimant_id,
-        notification_type="claim_denied",
-        title="Claim Denied",
-        message=f"Your claim for '{item.title}' was denied. Reason: {reason}",
-        item_id=item.id
-    )
+    create_notification(db=db, **claim_denied_notification(item, claimant_id, reason))
 
 
 def notify_lost_item_matched(db: Session, lost_item: Item, found_item: Item):
@@ -199,4 +301,5 @@ def mark_all_notifications_as_read(db: Session, user_id: int):
         Notification.user_id == user_id,
         Notification.is_read == False
     ).update({"is_read": True})
+    result_cache.touch(db, [result_cache.user_tag(user_id)])
     db.commit()
@@ -0,0 +1,303 @@
+"""
+Idempotency-Key support for retried POSTs
+
+A route decorated with @idempotent(...) that receives an Idempotency-Key
+header runs at most once per (user, key). The first request stores a
+pending row in idempotency_keys, runs, and saves its status code and body
+(successes and 4xx errors). Replays return the stored response with an
+"Idempotent-Replayed: true" header. Reusing a key with a different request
+body is a 422.
+
+The route's own transaction marks the row committed_at as it commits, so the
+key is recorded exactly when the route's writes are. On a 5xx or crash
+before that the row is removed and the client can retry. Once the route has
+committed it never runs again for the key: if its response could not be
+stored, retries get a 409.
+
+Duplicates that arrive while the first request is still running wait for
+it: in this process on an Event, across workers by polling the row. A
+pending row older than IDEMPOTENCY_PENDING_TIMEOUT is taken over unless it
+was committed. Recently completed keys are kept in an LRU so most replays
+skip the database. The response is stored through the route's session:
+with tuned SQLite that session may hold the single writer connection.
+"""
+import functools
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from sqlalchemy import delete, event, update
+from sqlalchemy.exc import IntegrityError
+
+from database import SessionLocal
+from models import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+IDEMPOTENCY_TTL_HOURS = float(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+IDEMPOTENCY_PENDING_TIMEOUT = float(os.getenv("IDEMPOTENCY_PENDING_TIMEOUT", "60"))
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+IDEMPOTENCY_POLL_SECONDS = 0.1
+MAX_KEY_LENGTH = 255
+
+
+def _key_reused():
+    return HTTPException(
+        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        detail="Idempotency-Key was already used for a different request"
+    )
+
+
+class StoredResponse:
+    def __init__(self, fingerprint: str, status_code: int, body: str):
+        self.fingerprint = fingerprint
+        self.status_code = status_code
+        self.body = body
+
+    def replay(self, fingerprint: str) -> JSONResponse:
+        if fingerprint != self.fingerprint:
+            raise _key_reused()
+        return JSONResponse(
+            content=json.loads(self.body),
+            status_code=self.status_code,
+            headers={"Idempotent-Replayed": "true"}
+        )
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+_last_purge = 0.0
+
+
+def _cached(cache_key) -> Optional[StoredResponse]:
+    with _cache_lock:
+        stored = _cache.get(cache_key)
+        if stored is not None:
+            _cache.move_to_end(cache_key)
+        return stored
+
+
+def _remember(cache_key, stored: StoredResponse):
+    with _cache_lock:
+        _cache[cache_key] = stored
+        _cache.move_to_end(cache_key)
+        while len(_cache) > IDEMPOTENCY_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def fingerprint(route: str, kwargs: dict) -> str:
+    """Hash of the route and its request parameters (path params and body models)"""
+    params = {
+        name: value.model_dump(mode="json") if isinstance(value, BaseModel) else value
+        for name, value in kwargs.items()
+        if isinstance(value, (BaseModel, int, str, float, bool))
+    }
+    payload = json.dumps({"route": route, "params": params}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _purge_expired():
+    """Delete keys past their TTL, at most once an hour per process"""
+    global _last_purge
+    now = time.monotonic()
+    if now - _last_purge < 3600:
+        return
+    _last_purge = now
+    db = SessionLocal()
+    try:
+        cutoff = datetime.utcnow() - timedelta(hours=IDEMPOTENCY_TTL_HOURS)
+        db.execute(delete(IdempotencyKey).where(IdempotencyKey.created_at < cutoff))
+        db.commit()
+    except Exception:
+        db.rollback()
+        logger.exception("Could not purge expired idempotency keys")
+    finally:
+        db.close()
+
+
+def _claim(user_id: int, key: str, route: str, fp: str) -> Optional[StoredResponse]:
+    """
+    Insert the pending row for this key
+
+    Returns None when this request now owns the key, or the stored response
+    once whoever owns it has finished.
+    """
+    deadline = time.monotonic() + IDEMPOTENCY_PENDING_TIMEOUT
+    while True:
+        db = SessionLocal()
+        try:
+            db.add(IdempotencyKey(user_id=user_id, key=key, route=route, fingerprint=fp))
+            try:
+                db.commit()
+                return None
+            except IntegrityError:
+                db.rollback()
+
+            row = db.query(IdempotencyKey).filter(
+                IdempotencyKey.user_id == user_id, IdempotencyKey.key == key
+            ).first()
+            if row is None:
+                continue  # Removed after a failure; try to take it
+            if row.status_code is not None:
+                return StoredResponse(row.fingerprint, row.status_code, row.response_body)
+            if row.fingerprint != fp:
+                raise _key_reused()
+
+            if row.created_at < datetime.utcnow() - timedelta(seconds=IDEMPOTENCY_PENDING_TIMEOUT):
+                if row.committed_at is not None:
+                    # The owner's writes went through but its response was lost; running again would repeat them
+                    raise HTTPException(
+                        status_code=status.HTTP_409_CONFLICT,
+                        detail="A request with this Idempotency-Key was already processed"
+                    )
+                # The owner died mid-request; take over if nobody else did first
+                taken = db.execute(
+                    update(IdempotencyKey).where(
+                        IdempotencyKey.id == row.id,
+                        IdempotencyKey.created_at == row.created_at,
+                        IdempotencyKey.status_code.is_(None),
+                        IdempotencyKey.committed_at.is_(None),
+                    ).values(created_at=datetime.utcnow())
+                )
+                db.commit()
+                if taken.rowcount == 1:
+                    return None
+        finally:
+            db.close()
+
+        if time.monotonic() > deadline:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="A request with this Idempotency-Key is still being processed"
+            )
+        time.sleep(IDEMPOTENCY_POLL_SECONDS)
+
+
+def _key_row(user_id: int, key: str):
+    return (IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+
+
+def _committed_with(db, user_id: int, key: str):
+    """before_commit hook marking the key committed in the route's own transaction"""
+    def mark_committed(session):
+        session.execute(
+            update(IdempotencyKey).where(*_key_row(user_id, key), IdempotencyKey.committed_at.is_(None))
+            .values(committed_at=datetime.utcnow())
+        )
+    event.listen(db, "before_commit", mark_committed)
+    return mark_committed
+
+
+def _complete(db, user_id: int, key: str, status_code: int, body: str):
+    # Anything the route left uncommitted would have been discarded with its session
+    db.rollback()
+    db.execute(
+        update(IdempotencyKey).where(*_key_row(user_id, key))
+        .values(status_code=status_code, response_body=body, completed_at=datetime.utcnow())
+    )
+    db.commit()
+
+
+def _release(db, user_id: int, key: str):
+    """Let the client retry, unless the route already committed"""
+    db.rollback()
+    db.execute(delete(IdempotencyKey).where(*_key_row(user_id, key), IdempotencyKey.committed_at.is_(None)))
+    db.commit()
+
+
+def _run_once(route, func, kwargs, user_id, key, fp):
+    stored = _claim(user_id, key, route, fp)
+    if stored is not None:
+        return stored, None
+
+    db = kwargs["db"]
+    hook = _committed_with(db, user_id, key)
+    try:
+        result = func(**kwargs)
+        body = json.dumps(jsonable_encoder(result))
+    except HTTPException as e:
+        event.remove(db, "before_commit", hook)
+        if e.status_code >= 500:
+            _release(db, user_id, key)
+            raise
+        stored = StoredResponse(fp, e.status_code, json.dumps({"detail": jsonable_encoder(e.detail)}))
+        _complete(db, user_id, key, stored.status_code, stored.body)
+        return stored, e
+    except BaseException:
+        event.remove(db, "before_commit", hook)
+        _release(db, user_id, key)
+        raise
+
+    event.remove(db, "before_commit", hook)
+    stored = StoredResponse(fp, status.HTTP_200_OK, body)
+    _complete(db, user_id, key, stored.status_code, stored.body)
+    return stored, result
+
+
+def idempotent(route: str):
+    """
+    Make a POST route honour the Idempotency-Key header
+
+    The route must take `idempotency_key` (the header), `current_user` and
+    `db` parameters.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(**kwargs):
+            key = kwargs.get("idempotency_key")
+            if not key:
+                return func(**kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Idempotency-Key must be at most {MAX_KEY_LENGTH} characters"
+                )
+
+            user_id = kwargs["current_user"].id
+            fp = fingerprint(route, {k: v for k, v in kwargs.items() if k not in ("idempotency_key", "current_user", "db")})
+            cache_key = (user_id, key)
+
+            stored = _cached(cache_key)
+            if stored is not None:
+                return stored.replay(fp)
+
+            # Coalesce duplicates within this process on the first one's Event
+            with _in_flight_lock:
+                running = _in_flight.get(cache_key)
+                if running is None:
+                    _in_flight[cache_key] = threading.Event()
+            if running is not None:
+                running.wait(IDEMPOTENCY_PENDING_TIMEOUT)
+                stored = _cached(cache_key)
+                if stored is not None:
+                    return stored.replay(fp)
+                return wrapper(**kwargs)
+
+            try:
+                _purge_expired()
+                stored, outcome = _run_once(route, func, kwargs, user_id, key, fp)
+                _remember(cache_key, stored)
+            finally:
+                with _in_flight_lock:
+                    _in_flight.pop(cache_key).set()
+
+            if outcome is None:
+                return stored.replay(fp)
+            if isinstance(outcome, HTTPException):
+                raise outcome
+            return outcome
+        return wrapper
+    return decorator
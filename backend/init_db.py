@@ -2,18 +2,21 @@
 Initialize the database with all tables and create an admin user
 """
 from database import engine, SessionLocal, Base
-from models import User, UserRole, AdminSettings
+from models import User, UserRole
 from auth import get_password_hash
+from user_search import ensure_search_index
+from settings_service import ensure_defaults
 
 # Import all models to ensure they're registered with Base
 from models import (
-    User, Item, Claim, Notification, ItemTimeline, AuditLog, AdminSettings
+    User, Item, Claim, Notification, ItemTimeline, AuditLog, AdminSettings, SettingsState, UserSearchGram
 )
 
 def init_database():
     """Create all tables"""
     print("Creating database tables...")
     Base.metadata.create_all(bind=engine)
+    ensure_search_index(engine)
     print("✓ Database tables created successfully!")
 
 def create_admin_user():
@@ -57,35 +60,7 @@ def create_default_settings():
     """Create default admin settings"""
     db = SessionLocal()
     try:
-        # Check if settings exist
-        existing = db.query(AdminSettings).first()
-        if existing:
-            print("✓ Admin settings already exist")
-            return
-
-        # Create default settings
-        defaults = [
-            AdminSettings(
-                setting_key="hold_period_days",
-                setting_value="7",
-                description="Default hold period in days for items"
-            ),
-            AdminSettings(
-                setting_key="blur_level",
-                setting_value="medium",
-                description="Blur level for published found items (low/medium/high)"
-            ),
-            AdminSettings(
-                setting_key="admin_email",
-                setting_value="admin@school.edu",
-                description="Admin contact email for notifications"
-            ),
-        ]
-
-        for setting in defaults:
-            db.add(setting)
-
-        db.commit()
+        ensure_defaults(db)
         print("✓ Default admin settings created successfully!")
 
     except Exception as e:
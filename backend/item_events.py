@@ -0,0 +1,178 @@
+"""
+Outbox handlers for the item and claim lifecycle
+
+Each route enqueues one event with what it decided; the handlers here
+write the timeline rows, audit logs and notifications that follow from it.
+"""
+from sqlalchemy.orm import Session
+
+from models import Item, User, UserRole
+from helpers import (
+    bulk_create_notifications,
+    bulk_create_timeline_events,
+    bulk_create_audit_logs,
+    item_approved_notification,
+    item_rejected_notification,
+    more_info_requested_notification,
+    claim_submitted_notification,
+    new_claim_admin_notification,
+    claim_approved_notification,
+    claim_denied_notification,
+    claim_more_info_notification,
+)
+from outbox import register_handler
+
+ITEM_REPORTED = "item.reported"
+ITEM_MARKED_FOUND = "item.marked_found"
+ITEM_VERIFIED = "item.verified"
+CLAIM_SUBMITTED = "claim.submitted"
+CLAIM_REVIEWED = "claim.reviewed"
+
+
+def _name(user: User) -> str:
+    return f"{user.first_name} {user.last_name}"
+
+
+def _timeline(item_id: int, action: str, description: str, performed_by_id: int) -> dict:
+    return {"item_id": item_id, "action": action, "description": description, "performed_by_id": performed_by_id}
+
+
+def _audit(admin_id: int, action: str, entity_type: str, entity_id: int, details: str) -> dict:
+    return {"admin_id": admin_id, "action": action, "entity_type": entity_type, "entity_id": entity_id, "details": details}
+
+
+def _write(db: Session, timeline=(), audit_logs=(), notifications=()):
+    bulk_create_timeline_events(db, list(timeline))
+    bulk_create_audit_logs(db, list(audit_logs))
+    bulk_create_notifications(db, list(notifications))
+
+
+@register_handler(ITEM_REPORTED)
+def item_reported(db: Session, payload: dict):
+    user = db.get(User, payload["user_id"])
+    _write(db, timeline=[
+        _timeline(payload["item_id"], "reported", f"Item reported by {_name(user)}", user.id)
+    ])
+
+
+@register_handler(ITEM_MARKED_FOUND)
+def item_marked_found(db: Session, payload: dict):
+    user = db.get(User, payload["user_id"])
+    _write(db, timeline=[
+        _timeline(payload["item_id"], "found", f"Item marked as found by {_name(user)}", user.id)
+    ])
+
+
+def verification_timeline(item_id: int, admin: User, action: str) -> list:
+    """Timeline rows an item verification adds (verify_item also returns them before they are written)"""
+    if action == "approve":
+        return [
+            _timeline(item_id, "verified", f"Item verified and approved by {_name(admin)}", admin.id),
+            _timeline(item_id, "published", "Item published to dashboard", admin.id),
+        ]
+    if action == "reject":
+        return [_timeline(item_id, "rejected", f"Item rejected by {_name(admin)}", admin.id)]
+    if action == "request_more_info":
+        return [_timeline(item_id, "more_info_requested", f"More information requested by {_name(admin)}", admin.id)]
+    return []
+
+
+@register_handler(ITEM_VERIFIED)
+def item_verified(db: Session, payload: dict):
+    item = db.get(Item, payload["item_id"])
+    admin = db.get(User, payload["admin_id"])
+    action = payload["action"]
+    timeline = verification_timeline(item.id, admin, action)
+
+    if action == "approve":
+        _write(
+            db,
+            timeline=timeline,
+            audit_logs=[_audit(admin.id, "approve_item", "item", item.id, f"Approved item: {item.title}")],
+            notifications=[item_approved_notification(item)],
+        )
+    elif action == "reject":
+        _write(
+            db,
+            timeline=timeline,
+            audit_logs=[_audit(
+                admin.id, "reject_item", "item", item.id,
+                f"Rejected item: {item.title}. Reason: {payload['rejection_reason']}"
+            )],
+            notifications=[item_rejected_notification(item, payload["rejection_reason"] or "Not specified")],
+        )
+    elif action == "request_more_info":
+        _write(
+            db,
+            timeline=timeline,
+            audit_logs=[_audit(admin.id, "request_more_info", "item", item.id, f"Requested more info for: {item.title}")],
+            notifications=[more_info_requested_notification(
+                item, payload["more_info_message"] or "Please provide additional details"
+            )],
+        )
+
+
+@register_handler(CLAIM_SUBMITTED)
+def claim_submitted(db: Session, payload: dict):
+    item = db.get(Item, payload["item_id"])
+    claimant = db.get(User, payload["claimant_id"])
+    admin_ids = db.query(User.id).filter(User.role == UserRole.ADMIN).all()
+    _write(
+        db,
+        timeline=[_timeline(item.id, "claim_submitted", f"Claim submitted by {_name(claimant)}", claimant.id)],
+        notifications=[claim_submitted_notification(item)] + [
+            new_claim_admin_notification(item, admin_id, payload["claim_id"]) for (admin_id,) in admin_ids
+        ],
+    )
+
+
+@register_handler(CLAIM_REVIEWED)
+def claim_reviewed(db: Session, payload: dict):
+    item = db.get(Item, payload["item_id"])
+    admin = db.get(User, payload["admin_id"])
+    claim_id = payload["claim_id"]
+    action = payload["action"]
+
+    if action == "approve":
+        # Rows for competing claims that were denied in the same transaction
+        competing = payload.get("competing") or {}
+        _write(
+            db,
+            timeline=competing.get("timeline", []) + [
+                _timeline(item.id, "claimed", f"Claim approved by {_name(admin)}", admin.id)
+            ],
+            audit_logs=competing.get("audit_logs", []) + [
+                _audit(admin.id, "approve_claim", "claim", claim_id, f"Approved claim for item: {item.title}")
+            ],
+            notifications=competing.get("notifications", []) + [
+                claim_approved_notification(item, payload["claimant_id"])
+            ],
+        )
+    elif action == "deny":
+        _write(
+            db,
+            timeline=[_timeline(item.id, "claim_denied", f"Claim denied by {_name(admin)}", admin.id)],
+            audit_logs=[_audit(admin.id, "deny_claim", "claim", claim_id, f"Denied claim for item: {item.title}")],
+            notifications=[claim_denied_notification(
+                item, payload["claimant_id"], payload["rejection_reason"] or "Not specified"
+            )],
+        )
+    elif action == "request_more_info":
+        _write(
+            db,
+            audit_logs=[_audit(
+                admin.id, "request_claim_info", "claim", claim_id, f"Requested more info for claim on: {item.title}"
+            )],
+            notifications=[claim_more_info_notification(item, payload["claimant_id"], payload["notes"])],
+        )
+    elif action == "hold":
+        hold_days = payload["hold_days"]
+        _write(
+            db,
+            timeline=[_timeline(
+                item.id, "on_hold", f"Item placed on hold for {hold_days} days by {_name(admin)}", admin.id
+            )],
+            audit_logs=[_audit(
+                admin.id, "place_on_hold", "item", item.id, f"Placed item on hold for {hold_days} days: {item.title}"
+            )],
+        )
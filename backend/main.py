@@ -1,24 +1,47 @@
-from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File
+from startup import report as startup_report, warm_up, FirstRequestTimer
+from fastapi import FastAPI, Depends, Header, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import func
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm.exc import StaleDataError
 from typing import List, Optional
-from datetime import datetime, timedelta
+from datetime import date, datetime
 from pydantic import BaseModel, EmailStr
+import logging
 import uuid
-import shutil
-import os
+from anyio import to_thread
 
-from database import engine, get_db, Base
-from models import User, Item, Claim, Notification, UserRole, ItemStatus, ClaimStatus, VerificationStatus
+startup_report.mark("import framework")
+
+from database import read_engine, get_db, SessionLocal, THREADPOOL_SIZE, POOL_SIZE
+from models import User, Item, Claim, Notification, ItemStatus, ClaimStatus, VerificationStatus
 from auth import (
     get_password_hash,
     verify_password,
     create_access_token,
     get_current_active_user,
 )
-from helpers import create_timeline_event, get_unread_notifications, mark_notification_as_read, mark_all_notifications_as_read
+from helpers import get_unread_notifications, mark_notification_as_read, mark_all_notifications_as_read
+from claim_scoring import apply_score
+from replicas import get_read_db, wants_primary, ReadYourWritesMiddleware
+from rate_limit import rate_limit, rate_limit_anonymous, LoadSheddingMiddleware
+from idempotency import idempotent, IDEMPOTENCY_HEADER
+from deadlines import deadline
+from outbox import enqueue, start_dispatcher, stop_dispatcher
+from item_events import ITEM_REPORTED, ITEM_MARKED_FOUND, CLAIM_SUBMITTED
+from facet_index import index as facet_index
+import result_cache
+import stale_reads
+import versioning
+from settings_service import current_settings, start_watcher, stop_watcher
+import profiling
 import admin_routes
+import health
+
+startup_report.mark("import app modules")
+
+logger = logging.getLogger(__name__)
 
 # Initialize FastAPI app
 # Note: Tables will be created on first database access (lazy creation)
@@ -28,6 +51,12 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# A write based on a stale read of a versioned row (see versioning.py)
+app.add_exception_handler(StaleDataError, versioning.stale_data_response)
+
+# Added before CORS so that 503s from shedding still carry CORS headers
+app.add_middleware(LoadSheddingMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -37,8 +66,53 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(FirstRequestTimer)
+app.add_middleware(ReadYourWritesMiddleware)
+
 # Include routers
 app.include_router(admin_routes.router)
+app.include_router(health.router)
+
+
+@app.on_event("startup")
+async def configure_threadpool():
+    # Sync routes run in anyio's threadpool; its size is what pool_limits() plans for
+    to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+
+
+@app.on_event("startup")
+def load_settings():
+    with startup_report.phase("load settings"):
+        start_watcher()
+    # Applies any profiling arm now and on every settings reload
+    profiling.install(app)
+
+
+@app.on_event("startup")
+def start_outbox_dispatcher():
+    start_dispatcher()
+
+
+@app.on_event("startup")
+def warm_up_worker():
+    try:
+        warm_up(read_engine, SessionLocal, POOL_SIZE)
+        with startup_report.phase("load facet index"):
+            facet_index.refresh()
+    except Exception:
+        # A cold worker is still a working worker
+        logger.exception("Warm-up failed")
+    startup_report.ready()
+
+
+@app.on_event("shutdown")
+def stop_settings_watcher():
+    stop_watcher()
+
+
+@app.on_event("shutdown")
+def stop_outbox_dispatcher():
+    stop_dispatcher()
 
 
 # Pydantic schemas
@@ -103,6 +177,7 @@ class ItemResponse(BaseModel):
     referenceNumber: str
     reporter: UserResponse
     createdAt: datetime
+    version: Optional[int] = None  # send back as If-Match when changing the item
 
     class Config:
         from_attributes = True
@@ -117,6 +192,9 @@ class ClaimCreate(BaseModel):
     date: Optional[str] = None
 
 
+startup_report.mark("app setup")
+
+
 # Routes
 
 @app.get("/")
@@ -124,7 +202,7 @@ def read_root():
     return {"message": "Lost and Found System API", "status": "running"}
 
 
-@app.post("/api/auth/register", response_model=Token)
+@app.post("/api/auth/register", response_model=Token, dependencies=[Depends(rate_limit_anonymous("register"))])
 def register(user_data: UserCreate, db: Session = Depends(get_db)):
     # Check if user already exists
     existing_user = db.query(User).filter(
@@ -221,9 +299,11 @@ def get_current_user_info(current_user: User = Depends(get_current_active_user))
     )
 
 
-@app.post("/api/items", response_model=ItemResponse)
+@app.post("/api/items", response_model=ItemResponse, dependencies=[Depends(rate_limit("create_item"))])
+@idempotent("create_item")
 def create_item(
     item_data: ItemCreate,
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER),
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
@@ -259,16 +339,11 @@ def create_item(
     )
 
     db.add(new_item)
+    db.flush()
+    enqueue(db, ITEM_REPORTED, item_id=new_item.id, user_id=current_user.id)
     db.commit()
     db.refresh(new_item)
 
-    # Create timeline event
-    create_timeline_event(
-        db, new_item.id, "reported",
-        f"Item reported by {current_user.first_name} {current_user.last_name}",
-        current_user.id
-    )
-
     return ItemResponse(
         id=new_item.id,
         title=new_item.title,
@@ -294,26 +369,51 @@ def create_item(
             role=current_user.role.value,
         ),
         createdAt=new_item.created_at,
+        version=new_item.version,
     )
 
 
+def _browse_filters(status, category, location, date_from, date_to) -> dict:
+    return {
+        "status": status, "category": category, "location": location,
+        "date_from": date_from, "date_to": date_to,
+    }
+
+
 @app.get("/api/items", response_model=List[ItemResponse])
+@deadline(5)
 def get_items(
+    request: Request,
     status: Optional[str] = None,
     category: Optional[str] = None,
+    location: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
-    # Only show published/approved items to public
-    query = db.query(Item).filter(Item.is_published == True)
+    filters = _browse_filters(status, category, location, date_from, date_to)
+    return stale_reads.serve(
+        result_cache.list_key(filters, skip, limit),
+        lambda session: _list_items(session, filters, skip, limit),
+        db,
+        tags=result_cache.list_tags(filters),
+        bypass=wants_primary(request),
+    )
 
-    if status:
-        query = query.filter(Item.status == status)
-    if category:
-        query = query.filter(Item.category == category)
 
-    items = query.order_by(Item.created_at.desc()).offset(skip).limit(limit).all()
+def _list_items(db: Session, filters: dict, skip: int, limit: int) -> List[ItemResponse]:
+    # Only published/approved items are in the index, so only those are shown to the public.
+    # This worker's own commits mark it dirty, so refresh() syncs them before the rebuild;
+    # other workers' writes show up within FACET_SYNC_SECONDS.
+    facet_index.refresh()
+    _, item_ids = facet_index.search(filters, skip, limit)
+    by_id = {
+        item.id: item
+        for item in db.query(Item).options(joinedload(Item.reporter)).filter(Item.id.in_(item_ids))
+    }
+    items = [by_id[item_id] for item_id in item_ids if item_id in by_id]
 
     return [
         ItemResponse(
@@ -341,13 +441,38 @@ def get_items(
                 role=item.reporter.role.value,
             ),
             createdAt=item.created_at,
+            version=item.version,
         )
         for item in items
     ]
 
 
+@app.get("/api/items/facets")
+def get_item_facets(
+    status: Optional[str] = None,
+    category: Optional[str] = None,
+    location: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+):
+    """Matching item count and per-value counts for the browse filters"""
+    facet_index.refresh()
+    return facet_index.facet_counts(_browse_filters(status, category, location, date_from, date_to))
+
+
 @app.get("/api/items/{item_id}", response_model=ItemResponse)
-def get_item(item_id: int, db: Session = Depends(get_db)):
+@deadline(3)
+def get_item(item_id: int, request: Request, db: Session = Depends(get_read_db)):
+    return stale_reads.serve(
+        result_cache.item_key(item_id),
+        lambda session: _item_detail(session, item_id),
+        db,
+        tags=[result_cache.item_tag(item_id), result_cache.ALL_ITEMS],
+        bypass=wants_primary(request),
+    )
+
+
+def _item_detail(db: Session, item_id: int) -> ItemResponse:
     item = db.query(Item).filter(Item.id == item_id).first()
 
     if not item:
@@ -381,12 +506,14 @@ def get_item(item_id: int, db: Session = Depends(get_db)):
             role=item.reporter.role.value,
         ),
         createdAt=item.created_at,
+        version=item.version,
     )
 
 
 @app.post("/api/items/{item_id}/mark-found")
 def mark_item_found(
     item_id: int,
+    if_match: Optional[str] = Header(None),
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
@@ -397,6 +524,7 @@ def mark_item_found(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Item not found"
         )
+    versioning.expect_version(item, if_match)
 
     if item.status != ItemStatus.LOST:
         raise HTTPException(
@@ -406,16 +534,21 @@ def mark_item_found(
 
     # Update item status to FOUND
     item.status = ItemStatus.FOUND
+    enqueue(db, ITEM_MARKED_FOUND, item_id=item.id, user_id=current_user.id)
 
+    db.flush()
+    version = item.version
     db.commit()
 
-    return {"message": "Item marked as found successfully"}
+    return {"message": "Item marked as found successfully", "version": version}
 
 
-@app.post("/api/items/{item_id}/claim")
+@app.post("/api/items/{item_id}/claim", dependencies=[Depends(rate_limit("claim_item"))])
+@idempotent("claim_item")
 def claim_item(
     item_id: int,
     claim_data: ClaimCreate,
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER),
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
@@ -444,45 +577,24 @@ def claim_item(
         claimed_date=claim_data.date,
         status=ClaimStatus.PENDING
     )
+    apply_score(new_claim, item, current_settings().claim_score_weights)
 
     db.add(new_claim)
-
-    # Create timeline event
-    create_timeline_event(
-        db, item.id, "claim_submitted",
-        f"Claim submitted by {current_user.first_name} {current_user.last_name}",
-        current_user.id
-    )
-
-    # Notify the item reporter that someone submitted a claim
-    from helpers import notify_claim_submitted
-    notify_claim_submitted(db, item, current_user)
-
-    # Notify all admins about the new claim
-    admins = db.query(User).filter(User.role == UserRole.ADMIN).all()
-    for admin in admins:
-        from helpers import create_notification
-        create_notification(
-            db, admin.id, "new_claim",
-            "New Claim Submitted",
-            f"A claim has been submitted for '{item.title}' (Ref: {item.reference_number})",
-            item.id,
-            f"/admin/claims/{new_claim.id}"
-        )
-
+    db.flush()
+    enqueue(db, CLAIM_SUBMITTED, claim_id=new_claim.id, item_id=item.id, claimant_id=current_user.id)
     db.commit()
-    db.refresh(new_claim)
 
     return {"message": "Claim submitted successfully and is pending admin approval", "claimId": new_claim.id}
 
 
 @app.get("/api/my-claims")
+@deadline(5)
 def get_my_claims(
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get all claims made by the current user"""
-    claims = db.query(Claim).filter(
+    claims = db.query(Claim).options(joinedload(Claim.item)).filter(
         Claim.claimant_id == current_user.id
     ).order_by(Claim.created_at.desc()).all()
 
@@ -509,8 +621,97 @@ def get_my_claims(
     return result
 
 
+def _item_summary(row) -> dict:
+    return {
+        "id": row.id,
+        "title": row.title,
+        "category": row.category,
+        "status": row.status.value,
+        "verificationStatus": row.verification_status.value,
+        "date": row.date,
+        "imageUrl": row.image_url,
+        "referenceNumber": row.reference_number,
+        "createdAt": row.created_at,
+    }
+
+
+_SUMMARY_COLUMNS = (
+    Item.id, Item.title, Item.category, Item.status, Item.verification_status,
+    Item.date, Item.image_url, Item.reference_number, Item.created_at,
+)
+
+
+@app.get("/api/me/overview")
+@deadline(5)
+def get_my_overview(
+    request: Request,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_read_db)
+):
+    """The current user's reported items, claims, returned items and unread count"""
+    return result_cache.cached_json(
+        result_cache.overview_key(current_user.id),
+        [result_cache.user_tag(current_user.id), result_cache.ALL_ITEMS],
+        lambda: _my_overview(db, current_user.id),
+        bypass=wants_primary(request),
+    )
+
+
+def _my_overview(db: Session, user_id: int) -> dict:
+    reported = db.query(*_SUMMARY_COLUMNS).filter(
+        Item.reporter_id == user_id
+    ).order_by(Item.created_at.desc()).all()
+
+    by_status = {}
+    for row in reported:
+        by_status.setdefault(row.status.value, []).append(_item_summary(row))
+
+    claims = db.query(
+        Claim.id.label("claim_id"), Claim.status.label("claim_status"), Claim.rejection_reason,
+        Claim.created_at.label("claimed_at"), Claim.reviewed_at, *_SUMMARY_COLUMNS,
+    ).join(Claim.item).filter(
+        Claim.claimant_id == user_id
+    ).order_by(Claim.created_at.desc()).all()
+
+    returned = db.query(*_SUMMARY_COLUMNS).filter(
+        Item.claimed_by_id == user_id,
+        Item.status == ItemStatus.RETURNED
+    ).order_by(Item.updated_at.desc()).all()
+
+    unread = db.query(func.count(Notification.id)).filter(
+        Notification.user_id == user_id,
+        Notification.is_read == False
+    ).scalar()
+
+    return {
+        "reportedItems": {
+            "total": len(reported),
+            "counts": {status_value: len(rows) for status_value, rows in by_status.items()},
+            "byStatus": by_status,
+        },
+        "claims": [
+            {
+                "id": row.claim_id,
+                "status": row.claim_status.value,
+                "rejectionReason": row.rejection_reason,
+                "createdAt": row.claimed_at,
+                "reviewedAt": row.reviewed_at,
+                "item": _item_summary(row),
+            }
+            for row in claims
+        ],
+        "returnedItems": [_item_summary(row) for row in returned],
+        "unreadCount": unread,
+    }
+
+
 @app.get("/api/stats")
-def get_stats(db: Session = Depends(get_db)):
+@deadline(5)
+def get_stats(db: Session = Depends(get_read_db)):
+    return stale_reads.serve("stats", _stats, db)
+
+
+def _stats(db: Session) -> dict:
     total_lost = db.query(Item).filter(Item.status == ItemStatus.LOST).count()
     total_found = db.query(Item).filter(Item.status == ItemStatus.FOUND).count()
     total_returned = db.query(Item).filter(Item.status == ItemStatus.RETURNED).count()
@@ -527,9 +728,10 @@ def get_stats(db: Session = Depends(get_db)):
 # =================
 
 @app.get("/api/notifications")
+@deadline(5)
 def get_user_notifications(
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get all notifications for the current user"""
     notifications = get_unread_notifications(db, current_user.id)
@@ -557,7 +759,7 @@ def get_user_notifications(
 @app.get("/api/notifications/unread/count")
 def get_unread_count(
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get count of unread notifications"""
     count = db.query(Notification).filter(
@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Text, DateTime, Enum
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Text, DateTime, Enum, Float, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
@@ -89,18 +89,26 @@ class Item(Base):
     is_published = Column(Boolean, default=False)
 
     # Foreign Keys
-    reporter_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    claimed_by_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    reporter_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    claimed_by_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)
     verified_by_id = Column(Integer, ForeignKey("users.id"), nullable=True)
 
+    # Review queue lease (see review_queue.py)
+    lease_owner_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+
     # Timestamps
     created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)  # facet index sync
     verified_at = Column(DateTime, nullable=True)
     published_at = Column(DateTime, nullable=True)
     returned_at = Column(DateTime, nullable=True)
     archived_at = Column(DateTime, nullable=True)
 
+    # Optimistic locking (see versioning.py)
+    version = Column(Integer, nullable=False, server_default="1")
+    __mapper_args__ = {"version_id_col": version}
+
     # Relationships
     reporter = relationship("User", back_populates="reported_items", foreign_keys=[reporter_id])
     claimed_by = relationship("User", foreign_keys=[claimed_by_id])
@@ -124,16 +132,32 @@ class Claim(Base):
     claimed_location = Column(String, nullable=True)
     claimed_date = Column(String, nullable=True)
 
+    # Evidence match (see claim_scoring.py): 0-1 per component, 0-100 overall
+    match_score = Column(Float, nullable=True, index=True)
+    score_color = Column(Float, nullable=True)
+    score_condition = Column(Float, nullable=True)
+    score_location = Column(Float, nullable=True)
+    score_date = Column(Float, nullable=True)
+    score_details = Column(Float, nullable=True)
+
     # Foreign Keys
-    item_id = Column(Integer, ForeignKey("items.id"), nullable=False)
-    claimant_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    item_id = Column(Integer, ForeignKey("items.id"), nullable=False, index=True)
+    claimant_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     reviewed_by_id = Column(Integer, ForeignKey("users.id"), nullable=True)
 
+    # Review queue lease (see review_queue.py)
+    lease_owner_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+
     # Timestamps
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     reviewed_at = Column(DateTime, nullable=True)
 
+    # Optimistic locking (see versioning.py)
+    version = Column(Integer, nullable=False, server_default="1")
+    __mapper_args__ = {"version_id_col": version}
+
     # Relationships
     item = relationship("Item", back_populates="claims")
     claimant = relationship("User", back_populates="claims", foreign_keys=[claimant_id])
@@ -203,3 +227,53 @@ class AdminSettings(Base):
 
     # Relationships
     updated_by = relationship("User")
+
+
+class SettingsState(Base):
+    """Single row whose version is bumped on every settings change"""
+    __tablename__ = "settings_state"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class UserSearchGram(Base):
+    """Trigram index of user search fields, used where pg_trgm is unavailable"""
+    __tablename__ = "user_search_grams"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    gram = Column(String(3), nullable=False, index=True)
+
+
+class IdempotencyKey(Base):
+    """Result of a request sent with an Idempotency-Key header (status_code is NULL while in progress)"""
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (UniqueConstraint("user_id", "key", name="uq_idempotency_user_key"),)
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    key = Column(String(255), nullable=False)
+    route = Column(String, nullable=False)
+    fingerprint = Column(String(64), nullable=False)
+    status_code = Column(Integer, nullable=True)
+    response_body = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    completed_at = Column(DateTime, nullable=True)
+    committed_at = Column(DateTime, nullable=True)  # set in the route's transaction (see idempotency.py)
+
+
+class OutboxEvent(Base):
+    """Side effects of a state change, written in the same transaction and dispatched later"""
+    __tablename__ = "outbox_events"
+    __table_args__ = (Index("ix_outbox_events_pending", "processed_at", "available_at"),)
+
+    id = Column(Integer, primary_key=True)
+    event_type = Column(String, nullable=False)
+    payload = Column(Text, nullable=False)  # JSON
+    created_at = Column(DateTime, default=datetime.utcnow)
+    available_at = Column(DateTime, default=datetime.utcnow, nullable=False)  # pushed back on retry
+    attempts = Column(Integer, default=0, nullable=False)
+    last_error = Column(Text, nullable=True)
+    processed_at = Column(DateTime, nullable=True)
@@ -0,0 +1,163 @@
+"""
+Transactional outbox
+
+Routes call enqueue() instead of writing timeline rows, audit logs and
+notifications themselves. The event row commits (or rolls back) together
+with the state change, so a request only pays for the state change.
+
+A dispatcher thread in each worker drains pending events in batches and
+passes each payload to the handlers registered for its type. An event is
+claimed (processed_at set) and handled in one transaction, so database
+side effects happen exactly once even with several workers draining;
+anything a handler does outside the database is at-least-once. A failing
+event is retried with exponential backoff, up to OUTBOX_MAX_ATTEMPTS.
+"""
+import json
+import logging
+import os
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "2"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_RETRY_SECONDS = float(os.getenv("OUTBOX_RETRY_SECONDS", "2"))  # doubles per attempt
+OUTBOX_MAX_RETRY_SECONDS = 3600
+
+_handlers = defaultdict(list)
+_wake = threading.Event()
+_stop = threading.Event()
+_dispatcher: Optional[threading.Thread] = None
+
+
+def register_handler(event_type: str):
+    """
+    Register a handler(db, payload) for an event type
+
+    Handlers write through `db` without committing; the dispatcher commits
+    their changes together with marking the event processed.
+    """
+    def decorator(func: Callable[[Session, dict], None]):
+        _handlers[event_type].append(func)
+        return func
+    return decorator
+
+
+def enqueue(db: Session, event_type: str, **payload):
+    """Add an event to the caller's transaction (dispatched after it commits)"""
+    db.add(OutboxEvent(event_type=event_type, payload=json.dumps(payload)))
+    db.info["outbox_pending"] = True
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _wake_dispatcher(session):
+    if session.info.pop("outbox_pending", False):
+        _wake.set()
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _forget_pending(session):
+    session.info.pop("outbox_pending", None)
+
+
+def _dispatch(db: Session, event_id: int) -> bool:
+    """Handle one event in its own transaction; returns False if it failed"""
+    try:
+        claimed = db.execute(
+            update(OutboxEvent)
+            .where(OutboxEvent.id == event_id, OutboxEvent.processed_at.is_(None))
+            .values(processed_at=datetime.utcnow())
+        )
+        if claimed.rowcount == 0:
+            db.rollback()  # Another worker got it first
+            return True
+
+        outbox_event = db.get(OutboxEvent, event_id)
+        payload = json.loads(outbox_event.payload)
+        handlers = _handlers.get(outbox_event.event_type)
+        if not handlers:
+            logger.warning("No handler for outbox event %s (%s)", event_id, outbox_event.event_type)
+        for handler in handlers or ():
+            handler(db, payload)
+        db.commit()
+        return True
+    except Exception as e:
+        db.rollback()
+        attempts = db.execute(
+            select(OutboxEvent.attempts).where(OutboxEvent.id == event_id)
+        ).scalar() or 0
+        delay = min(OUTBOX_RETRY_SECONDS * 2 ** attempts, OUTBOX_MAX_RETRY_SECONDS)
+        level = logging.ERROR if attempts + 1 >= OUTBOX_MAX_ATTEMPTS else logging.WARNING
+        logger.log(level, "Outbox event %s failed (attempt %d): %s", event_id, attempts + 1, e, exc_info=True)
+        db.execute(
+            update(OutboxEvent).where(OutboxEvent.id == event_id).values(
+                attempts=OutboxEvent.attempts + 1,
+                last_error=str(e)[:2000],
+                available_at=datetime.utcnow() + timedelta(seconds=delay),
+            )
+        )
+        db.commit()
+        return False
+
+
+def drain_once(batch_size: int = OUTBOX_BATCH_SIZE) -> int:
+    """Dispatch up to batch_size due events; returns how many were picked up"""
+    db = SessionLocal()
+    try:
+        event_ids = db.execute(
+            select(OutboxEvent.id)
+            .where(
+                OutboxEvent.processed_at.is_(None),
+                OutboxEvent.available_at <= datetime.utcnow(),
+                OutboxEvent.attempts < OUTBOX_MAX_ATTEMPTS,
+            )
+            .order_by(OutboxEvent.id)
+            .limit(batch_size)
+        ).scalars().all()
+        db.rollback()
+
+        for event_id in event_ids:
+            _dispatch(db, event_id)
+        return len(event_ids)
+    finally:
+        db.close()
+
+
+def drain():
+    """Dispatch events until none are due"""
+    while drain_once():
+        pass
+
+
+def _run():
+    while not _stop.is_set():
+        _wake.clear()
+        try:
+            drain()
+        except Exception:
+            logger.exception("Outbox dispatch failed")
+        _wake.wait(OUTBOX_POLL_SECONDS)
+
+
+def start_dispatcher():
+    """Start draining the outbox in a background thread (once per process)"""
+    global _dispatcher
+    if _dispatcher is None or not _dispatcher.is_alive():
+        _stop.clear()
+        _dispatcher = threading.Thread(target=_run, name="outbox-dispatcher", daemon=True)
+        _dispatcher.start()
+
+
+def stop_dispatcher():
+    _stop.set()
+    _wake.set()
@@ -0,0 +1,164 @@
+"""
+Connection pool telemetry
+
+instrument(engine, name) counts what happens to an engine's pool:
+checkouts, checkout timeouts, new connections and closed ones (churn),
+invalidations, and pre-ping failures. A TimedQueuePool also feeds every
+checkout wait into a latency histogram. snapshot() adds the live gauges
+(in use, idle, overflow in use, capacity) and is served by
+/api/admin/pools and, in short form, /health/ready.
+"""
+import threading
+from bisect import bisect_left
+from typing import Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+# Upper bounds of the checkout wait buckets, in milliseconds
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class Histogram:
+    def __init__(self, bounds=WAIT_BUCKETS_MS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        ms = seconds * 1000
+        with self._lock:
+            self.counts[bisect_left(self.bounds, ms)] += 1
+            self.count += 1
+            self.total_ms += ms
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-th observation (None past the last bucket)"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+    def as_dict(self) -> dict:
+        labels = [f"le{bound}ms" for bound in self.bounds] + ["inf"]
+        return {
+            "count": self.count,
+            "avgMs": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "p50Ms": self.quantile(0.5),
+            "p95Ms": self.quantile(0.95),
+            "p99Ms": self.quantile(0.99),
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class PoolMetrics:
+    def __init__(self, name: str):
+        self.name = name
+        self.checkout_wait = Histogram()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.closes = 0
+        self.invalidations = 0
+        self.ping_failures = 0
+
+    def counters(self) -> dict:
+        return {
+            "checkouts": self.checkouts,
+            "checkoutTimeouts": self.timeouts,
+            "connectionsOpened": self.connects,
+            "connectionsClosed": self.closes,
+            "invalidations": self.invalidations,
+            "prePingFailures": self.ping_failures,
+        }
+
+
+def gauges(pool) -> dict:
+    """Current pool occupancy (QueuePool only; other pools have no fixed size)"""
+    if not isinstance(pool, QueuePool):
+        return {"pool": type(pool).__name__}
+    in_use = pool.checkedout()
+    capacity = pool.size() + max(pool._max_overflow, 0)
+    return {
+        "pool": type(pool).__name__,
+        "inUse": in_use,
+        "idle": pool.checkedin(),
+        "size": pool.size(),
+        "overflowInUse": max(pool.overflow(), 0),
+        "capacity": capacity,
+        "exhausted": pool._max_overflow >= 0 and in_use >= capacity,
+    }
+
+
+_engines: Dict[str, tuple] = {}
+
+
+def instrument(engine, name: str) -> PoolMetrics:
+    """Attach pool telemetry to engine under name (once per engine)"""
+    if name in _engines:
+        return _engines[name][1]
+    metrics = PoolMetrics(name)
+    _engines[name] = (engine, metrics)
+    # Read by TimedQueuePool._do_get, and carried over when the pool is recreated
+    engine.pool.metrics = metrics
+
+    @event.listens_for(engine, "checkout")
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        metrics.checkouts += 1
+
+    @event.listens_for(engine, "connect")
+    def _connect(dbapi_connection, connection_record):
+        metrics.connects += 1
+
+    @event.listens_for(engine, "close")
+    def _close(dbapi_connection, connection_record):
+        metrics.closes += 1
+
+    @event.listens_for(engine, "close_detached")
+    def _close_detached(dbapi_connection):
+        metrics.closes += 1
+
+    @event.listens_for(engine, "invalidate")
+    @event.listens_for(engine, "soft_invalidate")
+    def _invalidate(dbapi_connection, connection_record, exception):
+        metrics.invalidations += 1
+
+    # Pre-ping calls dialect.do_ping on checkout; a failure means a dead connection
+    dialect = engine.dialect
+    do_ping = dialect.do_ping
+
+    def counted_ping(dbapi_connection):
+        try:
+            alive = do_ping(dbapi_connection)
+        except Exception:
+            metrics.ping_failures += 1
+            raise
+        if not alive:
+            metrics.ping_failures += 1
+        return alive
+
+    dialect.do_ping = counted_ping
+    return metrics
+
+
+def snapshot() -> dict:
+    """Counters, checkout wait histogram and gauges for every instrumented pool"""
+    return {
+        name: {
+            **gauges(engine.pool),
+            **metrics.counters(),
+            "checkoutWait": metrics.checkout_wait.as_dict(),
+        }
+        for name, (engine, metrics) in _engines.items()
+    }
+
+
+def engines() -> Dict[str, object]:
+    return {name: engine for name, (engine, _) in _engines.items()}
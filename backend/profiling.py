@@ -0,0 +1,410 @@
+"""
+On-demand CPU and memory profiling
+
+CPU: an admin arms some routes (POST /api/admin/profiling/cpu). The arm is
+stored in the internal "profiling" setting, so every worker applies it when
+its settings snapshot reloads. Each armed route gets its endpoint wrapped.
+A request to it is profiled when it sends "X-Profile: <token>" (the token
+returned when arming), or every sample_every-th request. While the endpoint
+runs, a sampler thread records that thread's stack every
+PROFILE_INTERVAL_MS, and the samples are written to PROFILE_DIR as folded
+stacks ("frame;frame;frame count"), which flamegraph.pl and speedscope
+read. The response names the file in X-Profile-Id. Arms expire after
+their `minutes`.
+
+Memory: while the setting has memory on, tracemalloc traces allocations in
+every worker. A snapshot dumps this worker's traces to PROFILE_DIR and
+returns what grew since its previous snapshot; any two dumps can be
+compared later.
+
+Nothing is wrapped and tracemalloc is not running unless armed, so there
+is no overhead while profiling is off. PROFILE_DIR keeps at most
+PROFILE_MAX_FILES files, none older than PROFILE_MAX_AGE_HOURS.
+"""
+import asyncio
+import functools
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from fastapi.routing import APIRoute
+
+from settings_service import SettingsSnapshot, add_listener, current_settings
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./profiles")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "100"))
+PROFILE_MAX_AGE_HOURS = float(os.getenv("PROFILE_MAX_AGE_HOURS", "72"))
+PROFILE_MAX_CONCURRENT = int(os.getenv("PROFILE_MAX_CONCURRENT", "4"))
+TRACEMALLOC_FRAMES = int(os.getenv("TRACEMALLOC_FRAMES", "10"))
+
+PROFILE_HEADER = "X-Profile"
+_HEADER_NAME = PROFILE_HEADER.lower().encode()
+MAX_ARM_MINUTES = 240
+
+_FILE_NAME = re.compile(r"^[\w.-]+\.(folded|tracemalloc)$")
+
+
+def route_key(route: APIRoute) -> str:
+    return f"{','.join(sorted(route.methods))} {route.path}"
+
+
+# =================
+# FILES
+# =================
+
+def _path(name: str) -> str:
+    if not _FILE_NAME.match(name):
+        raise ValueError("Invalid profile file name")
+    return os.path.join(PROFILE_DIR, name)
+
+
+def list_files() -> List[dict]:
+    """Profile files in PROFILE_DIR, newest first"""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    files = []
+    for entry in os.scandir(PROFILE_DIR):
+        if entry.is_file() and _FILE_NAME.match(entry.name):
+            stat = entry.stat()
+            files.append({"name": entry.name, "size": stat.st_size, "modified": stat.st_mtime})
+    return sorted(files, key=lambda f: f["modified"], reverse=True)
+
+
+def file_path(name: str) -> Optional[str]:
+    path = _path(name)
+    return path if os.path.isfile(path) else None
+
+
+def _prune():
+    """Apply PROFILE_MAX_FILES and PROFILE_MAX_AGE_HOURS"""
+    cutoff = time.time() - PROFILE_MAX_AGE_HOURS * 3600
+    for position, f in enumerate(list_files()):
+        if position >= PROFILE_MAX_FILES or f["modified"] < cutoff:
+            try:
+                os.remove(os.path.join(PROFILE_DIR, f["name"]))
+            except OSError:
+                pass
+
+
+def _new_file(kind: str, label: str, suffix: str) -> str:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    label = re.sub(r"[^\w]+", "_", label).strip("_")[:60]
+    return f"{kind}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{label}{suffix}"
+
+
+# =================
+# CPU SAMPLING
+# =================
+
+class _Profile:
+    def __init__(self, route: str):
+        self.route = route
+        self.started = time.perf_counter()
+        self.threads = set()
+        self.stacks = Counter()
+        self.name = _new_file("cpu", route, ".folded")
+
+    def write(self):
+        duration_ms = (time.perf_counter() - self.started) * 1000
+        with open(_path(self.name), "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        _prune()
+        logger.info("Wrote profile %s (%s, %.0f ms, %d samples)",
+                    self.name, self.route, duration_ms, sum(self.stacks.values()))
+
+
+_active: List[_Profile] = []
+_active_lock = threading.Lock()
+_sampler: Optional[threading.Thread] = None
+_current: ContextVar[Optional[_Profile]] = ContextVar("profile", default=None)
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _folded(frame) -> str:
+    """Stack from the endpoint down to frame, root first"""
+    names = []
+    while frame is not None and frame.f_code not in _ENDPOINT_CODES:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def _sample():
+    global _sampler
+    interval = PROFILE_INTERVAL_MS / 1000
+    while True:
+        with _active_lock:
+            profiles = list(_active)
+            if not profiles:
+                _sampler = None
+                return
+        frames = sys._current_frames()
+        for profile in profiles:
+            for thread_id in list(profile.threads):
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    profile.stacks[_folded(frame)] += 1
+        del frames
+        time.sleep(interval)
+
+
+def _start(profile: _Profile) -> bool:
+    global _sampler
+    with _active_lock:
+        if len(_active) >= PROFILE_MAX_CONCURRENT:
+            return False
+        _active.append(profile)
+        if _sampler is None:
+            _sampler = threading.Thread(target=_sample, name="profile-sampler", daemon=True)
+            _sampler.start()
+    return True
+
+
+def _finish(profile: _Profile):
+    with _active_lock:
+        _active.remove(profile)
+    try:
+        profile.write()
+    except OSError:
+        logger.exception("Could not write profile %s", profile.name)
+
+
+def _run_endpoint(call, kwargs):
+    # Samples are cut at this frame, so stacks start at the endpoint
+    profile = _current.get()
+    if profile is None:
+        return call(**kwargs)
+    thread_id = threading.get_ident()
+    profile.threads.add(thread_id)
+    try:
+        return call(**kwargs)
+    finally:
+        profile.threads.discard(thread_id)
+
+
+async def _run_async_endpoint(call, kwargs):
+    # Async endpoints run on the event loop thread, so its samples can include other requests
+    profile = _current.get()
+    if profile is None:
+        return await call(**kwargs)
+    thread_id = threading.get_ident()
+    profile.threads.add(thread_id)
+    try:
+        return await call(**kwargs)
+    finally:
+        profile.threads.discard(thread_id)
+
+
+_ENDPOINT_CODES = {_run_endpoint.__code__, _run_async_endpoint.__code__}
+
+
+# =================
+# ARMING
+# =================
+
+class _Arm:
+    """Wrappers installed on one route while it is armed"""
+
+    def __init__(self, route: APIRoute):
+        self.route = route
+        self.key = route_key(route)
+        self.call = route.dependant.call
+        self.app = route.app
+        self.token = ""
+        self.sample_every = 0
+        self.requests = 0
+
+    def install(self):
+        call = self.call
+        if asyncio.iscoroutinefunction(call):
+            @functools.wraps(call)
+            async def endpoint(**kwargs):
+                return await _run_async_endpoint(call, kwargs)
+        else:
+            @functools.wraps(call)
+            def endpoint(**kwargs):
+                return _run_endpoint(call, kwargs)
+
+        self.route.dependant.call = endpoint
+        self.route.app = self.handle
+
+    def uninstall(self):
+        self.route.dependant.call = self.call
+        self.route.app = self.app
+
+    def _wanted(self, scope) -> bool:
+        if self.token:
+            for name, value in scope["headers"]:
+                if name == _HEADER_NAME and value.decode("latin-1") == self.token:
+                    return True
+        if self.sample_every:
+            self.requests += 1
+            return self.requests % self.sample_every == 0
+        return False
+
+    async def handle(self, scope, receive, send):
+        if not self._wanted(scope):
+            return await self.app(scope, receive, send)
+        profile = _Profile(self.key)
+        if not _start(profile):
+            return await self.app(scope, receive, send)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-profile-id", profile.name.encode())
+                ]
+            await send(message)
+
+        token = _current.set(profile)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            _current.reset(token)
+            _finish(profile)
+
+
+_app = None
+_armed: Dict[str, _Arm] = {}
+_expiry: Optional[threading.Timer] = None
+_apply_lock = threading.Lock()
+
+
+def routes(app) -> Dict[str, APIRoute]:
+    return {route_key(route): route for route in app.routes if isinstance(route, APIRoute)}
+
+
+def _apply(snapshot: SettingsSnapshot):
+    """Wrap the armed routes and start or stop tracemalloc to match the setting"""
+    global _expiry
+    if _app is None:
+        return
+    config = snapshot.profiling or {}
+    cpu = config.get("cpu") or {}
+    expires_at = cpu.get("expires_at", 0)
+    wanted = set(cpu.get("routes", [])) if expires_at > time.time() else set()
+
+    with _apply_lock:
+        available = routes(_app)
+        for key in list(_armed):
+            if key not in wanted:
+                _armed.pop(key).uninstall()
+        for key in wanted:
+            if key not in available:
+                continue
+            arm = _armed.get(key)
+            if arm is None:
+                arm = _armed[key] = _Arm(available[key])
+                arm.install()
+            arm.token = cpu.get("token", "")
+            arm.sample_every = int(cpu.get("sample_every", 0))
+
+        if _expiry is not None:
+            _expiry.cancel()
+            _expiry = None
+        if _armed:
+            _expiry = threading.Timer(expires_at - time.time(), lambda: _apply(current_settings()))
+            _expiry.daemon = True
+            _expiry.start()
+
+    if config.get("memory") and not tracemalloc.is_tracing():
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+        logger.info("tracemalloc started")
+    elif not config.get("memory") and tracemalloc.is_tracing():
+        tracemalloc.stop()
+        _snapshots.clear()
+        logger.info("tracemalloc stopped")
+
+
+def install(app):
+    """Follow the profiling setting for app's routes in this worker"""
+    global _app
+    _app = app
+    add_listener(_apply)
+    _apply(current_settings())
+
+
+def armed_routes() -> List[str]:
+    return sorted(_armed)
+
+
+# =================
+# MEMORY
+# =================
+
+_snapshots: List[str] = []  # this worker's dumps, oldest first
+
+
+def _top(current: tracemalloc.Snapshot, base: Optional[tracemalloc.Snapshot], key: str, limit: int) -> List[dict]:
+    filters = [
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ]
+    current = current.filter_traces(filters)
+    if base is None:
+        stats = current.statistics(key)
+        return [{
+            "where": str(stat.traceback[0]) if key == "lineno" else stat.traceback.format(),
+            "sizeKb": round(stat.size / 1024, 1),
+            "count": stat.count,
+        } for stat in stats[:limit]]
+    stats = current.compare_to(base.filter_traces(filters), key)
+    return [{
+        "where": str(stat.traceback[0]) if key == "lineno" else stat.traceback.format(),
+        "sizeKb": round(stat.size / 1024, 1),
+        "sizeDiffKb": round(stat.size_diff / 1024, 1),
+        "count": stat.count,
+        "countDiff": stat.count_diff,
+    } for stat in stats[:limit]]
+
+
+def memory_snapshot(key: str = "lineno", limit: int = 25) -> dict:
+    """Dump this worker's traces and return the growth since its previous dump"""
+    if not tracemalloc.is_tracing():
+        raise ValueError("Memory tracing is off")
+    snapshot = tracemalloc.take_snapshot()
+    name = _new_file("mem", "snapshot", ".tracemalloc")
+    snapshot.dump(_path(name))
+    _prune()
+
+    base = None
+    while _snapshots and base is None:
+        previous = file_path(_snapshots[-1])
+        if previous is None:
+            _snapshots.pop()  # Pruned
+        else:
+            base = tracemalloc.Snapshot.load(previous)
+    _snapshots.append(name)
+
+    current, peak = tracemalloc.get_traced_memory()
+    return {
+        "file": name,
+        "pid": os.getpid(),
+        "comparedTo": _snapshots[-2] if base is not None else None,
+        "tracedKb": round(current / 1024, 1),
+        "peakKb": round(peak / 1024, 1),
+        "top": _top(snapshot, base, key, limit),
+    }
+
+
+def memory_diff(base_name: str, current_name: str, key: str = "lineno", limit: int = 25) -> List[dict]:
+    """What grew between two dumps"""
+    base_path, current_path = file_path(base_name), file_path(current_name)
+    if base_path is None or current_path is None:
+        raise FileNotFoundError("Snapshot not found")
+    return _top(tracemalloc.Snapshot.load(current_path), tracemalloc.Snapshot.load(base_path), key, limit)
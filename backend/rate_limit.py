@@ -0,0 +1,261 @@
+"""
+Admission control for write endpoints
+
+Rate limits: token buckets keyed by user id and by client IP, with a policy
+per route (RATE_LIMIT_<ROUTE>_USER / RATE_LIMIT_<ROUTE>_IP, written as
+"<requests>/<seconds>"). A request must fit in both buckets; otherwise it
+gets 429 with Retry-After. Buckets live in memory per worker, or with
+RATE_LIMIT_BACKEND=sqlite in a local SQLite file (RATE_LIMIT_DB) shared by
+all workers on the host.
+
+Load shedding: LoadSheddingMiddleware answers 503 straight away while more
+than SHED_QUEUE_DEPTH requests are queued for a worker thread, or while
+connections wait more than SHED_POOL_WAIT_MS on average for the pool,
+instead of queueing more work behind them. Waits for the tuned SQLite
+writer do not count: writes queue there by design, and shedding on them
+would turn away reads during a burst of writes. The health probes are never
+shed: /health/ready reports the overload itself.
+"""
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from anyio import to_thread
+from fastapi import Depends, HTTPException, Request, status
+
+from auth import get_current_active_user
+from database import pool_wait_seconds
+from models import User
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMITS_ENABLED = os.getenv("RATE_LIMITS_ENABLED", "true").lower() == "true"
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # memory or sqlite
+RATE_LIMIT_DB = os.getenv("RATE_LIMIT_DB", "./rate_limits.db")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+SHED_QUEUE_DEPTH = int(os.getenv("SHED_QUEUE_DEPTH", "100"))
+SHED_POOL_WAIT_MS = float(os.getenv("SHED_POOL_WAIT_MS", "1000"))
+SHED_EXEMPT_PATHS = ("/health/live", "/health/ready")
+
+
+@dataclass(frozen=True)
+class Limit:
+    requests: int
+    seconds: float
+
+    @classmethod
+    def parse(cls, value: str) -> "Limit":
+        requests, _, seconds = value.partition("/")
+        return cls(int(requests), float(seconds or 1))
+
+    @property
+    def refill_rate(self) -> float:
+        return self.requests / self.seconds
+
+
+@dataclass(frozen=True)
+class RatePolicy:
+    per_user: Optional[Limit]
+    per_ip: Optional[Limit]
+
+
+def _policy(name: str, per_user: Optional[str], per_ip: Optional[str]) -> RatePolicy:
+    prefix = f"RATE_LIMIT_{name.upper()}"
+    per_user = os.getenv(f"{prefix}_USER", per_user)
+    per_ip = os.getenv(f"{prefix}_IP", per_ip)
+    return RatePolicy(
+        per_user=Limit.parse(per_user) if per_user else None,
+        per_ip=Limit.parse(per_ip) if per_ip else None,
+    )
+
+
+POLICIES = {
+    "create_item": _policy("create_item", "10/60", "30/60"),
+    "claim_item": _policy("claim_item", "10/60", "30/60"),
+    "register": _policy("register", None, "5/600"),
+}
+
+
+# =================
+# BUCKET BACKENDS
+# =================
+
+class MemoryBackend:
+    """Token buckets in a bounded in-process dict"""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, limit: Limit, now: float) -> Tuple[bool, float]:
+        """Take one token; returns (allowed, seconds until a token is available)"""
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (limit.requests, now))
+            tokens = min(limit.requests, tokens + (now - updated) * limit.refill_rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            # The least recently used bucket has refilled the longest
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (1 - tokens) / limit.refill_rate
+
+
+class SQLiteBackend:
+    """Token buckets in a local SQLite file shared by every worker on the host"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_buckets "
+                "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+        return conn
+
+    def take(self, key: str, limit: Limit, now: float) -> Tuple[bool, float]:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM rate_buckets WHERE key = ?", (key,)).fetchone()
+            tokens, updated = row if row else (limit.requests, now)
+            tokens = min(limit.requests, tokens + max(0.0, now - updated) * limit.refill_rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            conn.execute(
+                "INSERT INTO rate_buckets (key, tokens, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                (key, tokens, now)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return allowed, 0.0 if allowed else (1 - tokens) / limit.refill_rate
+
+
+def _create_backend():
+    if RATE_LIMIT_BACKEND == "sqlite":
+        return SQLiteBackend(RATE_LIMIT_DB)
+    return MemoryBackend()
+
+
+backend = _create_backend()
+
+
+# =================
+# RATE LIMITS
+# =================
+
+def _client_ip(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+
+def check_rate(route: str, user_id: Optional[int], ip: str):
+    """Take a token from each of the route's buckets, raising 429 if one is empty"""
+    if not RATE_LIMITS_ENABLED:
+        return
+    policy = POLICIES[route]
+    # Wall clock, since the SQLite backend compares times across processes
+    now = time.time()
+    retry_after = 0.0
+    for limit, key in (
+        (policy.per_user, f"{route}:user:{user_id}" if user_id is not None else None),
+        (policy.per_ip, f"{route}:ip:{ip}"),
+    ):
+        if limit is None or key is None:
+            continue
+        try:
+            allowed, wait = backend.take(key, limit, now)
+        except sqlite3.Error:
+            # Limiter trouble must not take the endpoint down with it
+            logger.exception("Rate limiter backend failed")
+            return
+        if not allowed:
+            retry_after = max(retry_after, wait)
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests, please try again later",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+
+
+def rate_limit(route: str):
+    """Dependency limiting an authenticated route per user and per IP"""
+    def dependency(request: Request, current_user: User = Depends(get_current_active_user)):
+        check_rate(route, current_user.id, _client_ip(request))
+    return dependency
+
+
+def rate_limit_anonymous(route: str):
+    """Dependency limiting a route that has no user yet (per IP only)"""
+    def dependency(request: Request):
+        check_rate(route, None, _client_ip(request))
+    return dependency
+
+
+# =================
+# LOAD SHEDDING
+# =================
+
+def overload_reason() -> Optional[str]:
+    """Why this worker should shed a new request right now, if it should"""
+    waiting = to_thread.current_default_thread_limiter().statistics().tasks_waiting
+    if waiting > SHED_QUEUE_DEPTH:
+        return f"{waiting} requests queued"
+    wait_ms = pool_wait_seconds() * 1000
+    if wait_ms > SHED_POOL_WAIT_MS:
+        return f"database pool wait {wait_ms:.0f} ms"
+    return None
+
+
+class LoadSheddingMiddleware:
+    """ASGI middleware answering 503 quickly while the worker is overloaded"""
+
+    def __init__(self, app):
+        self.app = app
+        self.shed = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "OPTIONS" or scope["path"] in SHED_EXEMPT_PATHS:
+            return await self.app(scope, receive, send)
+
+        reason = overload_reason()
+        if reason is None:
+            return await self.app(scope, receive, send)
+
+        self.shed += 1
+        if self.shed % 100 == 1:
+            logger.warning("Shedding load (%s), %d requests shed so far", reason, self.shed)
+        await send({
+            "type": "http.response.start",
+            "status": status.HTTP_503_SERVICE_UNAVAILABLE,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"retry-after", b"1"),
+            ],
+        })
+        await send({
+            "type": "http.response.body",
+            "body": b'{"detail":"Server is busy, please try again shortly"}',
+        })
@@ -0,0 +1,250 @@
+"""
+Read-replica routing
+
+DATABASE_REPLICA_URLS is a comma-separated list of read replicas. Routes
+that only read take `db: Session = Depends(get_read_db)`, which hands out a
+session on the next healthy replica (round-robin). Replicas are re-checked
+every REPLICA_CHECK_SECONDS, and one that fails a check, drops its
+connection or lags more than REPLICA_MAX_LAG_SECONDS is skipped until it
+passes again. With no healthy replica, reads go to the primary.
+
+Read-your-writes: when a primary session commits a flush, the user is
+pinned to the primary for READ_YOUR_WRITES_SECONDS, both in this process
+(keyed by their bearer token) and through a short-lived cookie that every
+worker honours. The API is called cross-origin, so the frontends send their
+requests with credentials; otherwise the browser drops the cookie.
+"""
+import itertools
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi import Request
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker
+
+from database import SessionLocal, TimedQueuePool, POOL_SIZE, MAX_OVERFLOW, DB_POOL_TIMEOUT
+from pool_metrics import instrument
+import deadlines
+
+logger = logging.getLogger(__name__)
+
+REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+REPLICA_CHECK_SECONDS = float(os.getenv("REPLICA_CHECK_SECONDS", "10"))
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+
+PIN_COOKIE = "lf_primary"
+
+# Zero lag when the replica has replayed everything it received
+_PG_LAG = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+class Replica:
+    def __init__(self, url: str):
+        if url.startswith("sqlite"):
+            self.engine = create_engine(url, connect_args={"check_same_thread": False})
+        else:
+            self.engine = create_engine(
+                url,
+                pool_pre_ping=True,
+                pool_size=POOL_SIZE,
+                max_overflow=MAX_OVERFLOW,
+                pool_timeout=DB_POOL_TIMEOUT,
+                poolclass=TimedQueuePool,
+                pool_recycle=3600,
+                connect_args={"connect_timeout": 3},
+            )
+        instrument(self.engine, f"replica {self.name}")
+        deadlines.install(self.engine)
+        self.sessions = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.healthy = True
+        self.checked_at = 0.0
+        self.lag = 0.0
+        self._check_lock = threading.Lock()
+
+        @event.listens_for(self.engine, "handle_error")
+        def _on_error(context):
+            if context.is_disconnect:
+                self.mark_down("connection lost")
+
+    @property
+    def name(self) -> str:
+        return self.engine.url.render_as_string(hide_password=True)
+
+    def mark_down(self, reason: str):
+        if self.healthy:
+            logger.warning("Read replica %s is unavailable: %s", self.name, reason)
+        self.healthy = False
+        self.checked_at = time.monotonic()
+
+    def check(self):
+        """Re-check the replica if the last check is older than REPLICA_CHECK_SECONDS"""
+        if time.monotonic() - self.checked_at < REPLICA_CHECK_SECONDS:
+            return
+        # One thread checks; the others use the previous result meanwhile
+        if not self._check_lock.acquire(blocking=False):
+            return
+        try:
+            with self.engine.connect() as conn:
+                if conn.dialect.name == "postgresql":
+                    self.lag = float(conn.execute(_PG_LAG).scalar() or 0)
+                else:
+                    conn.execute(text("SELECT 1"))
+                    self.lag = 0.0
+            if self.lag > REPLICA_MAX_LAG_SECONDS:
+                self.mark_down(f"{self.lag:.1f}s behind the primary")
+            else:
+                if not self.healthy:
+                    logger.info("Read replica %s is available again", self.name)
+                self.healthy = True
+                self.checked_at = time.monotonic()
+        except Exception as e:
+            self.mark_down(str(e).splitlines()[0])
+        finally:
+            self._check_lock.release()
+
+    def status(self):
+        return {"url": self.name, "healthy": self.healthy, "lagSeconds": round(self.lag, 2)}
+
+
+class ReplicaSet:
+    def __init__(self, urls):
+        self.replicas = [Replica(url) for url in urls]
+        self._next = itertools.count()
+
+    def choose(self) -> Optional[Replica]:
+        """Next healthy replica in round-robin order, or None"""
+        count = len(self.replicas)
+        start = next(self._next)
+        for offset in range(count):
+            replica = self.replicas[(start + offset) % count]
+            replica.check()
+            if replica.healthy:
+                return replica
+        return None
+
+    def dispose(self, close: bool = True):
+        for replica in self.replicas:
+            replica.engine.dispose(close=close)
+
+
+replica_set = ReplicaSet(REPLICA_URLS)
+
+
+# =================
+# READ-YOUR-WRITES
+# =================
+
+_pinned = {}
+_pinned_lock = threading.Lock()
+
+# Per-request flag the middleware turns into the pin cookie
+_request_wrote: ContextVar[Optional[dict]] = ContextVar("request_wrote", default=None)
+
+
+def pin_to_primary(key: str):
+    now = time.monotonic()
+    with _pinned_lock:
+        if len(_pinned) > 10000:
+            for stale in [k for k, until in _pinned.items() if until < now]:
+                del _pinned[stale]
+        _pinned[key] = now + READ_YOUR_WRITES_SECONDS
+
+
+def is_pinned(key: Optional[str]) -> bool:
+    if not key:
+        return False
+    with _pinned_lock:
+        until = _pinned.get(key)
+        if until is None:
+            return False
+        if until < time.monotonic():
+            del _pinned[key]
+            return False
+        return True
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _mark_write(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _pin_writer(session):
+    if not session.info.pop("wrote", False):
+        return
+    key = session.info.get("auth_token")
+    if key:
+        pin_to_primary(key)
+    flag = _request_wrote.get()
+    if flag is not None:
+        flag["wrote"] = True
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _forget_write(session):
+    session.info.pop("wrote", None)
+
+
+class ReadYourWritesMiddleware:
+    """ASGI middleware setting the pin cookie on responses to requests that wrote"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not replica_set.replicas:
+            return await self.app(scope, receive, send)
+
+        flag = {}
+        token = _request_wrote.set(flag)
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start" and flag.get("wrote"):
+                cookie = (
+                    f"{PIN_COOKIE}=1; Max-Age={int(READ_YOUR_WRITES_SECONDS) or 1}; "
+                    "Path=/; HttpOnly; SameSite=Lax"
+                )
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"set-cookie", cookie.encode("latin-1"))
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_cookie)
+        finally:
+            _request_wrote.reset(token)
+
+
+def _bearer_token(request: Request) -> Optional[str]:
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    return token if scheme.lower() == "bearer" and token else None
+
+
+def wants_primary(request: Request) -> bool:
+    """Whether the caller wrote recently and must see their own writes"""
+    return bool(request.cookies.get(PIN_COOKIE)) or is_pinned(_bearer_token(request))
+
+
+def read_session(primary: bool = False):
+    """A session on a healthy replica, or on the primary if there is none (or primary is set)"""
+    replica = None
+    if replica_set.replicas and not primary:
+        replica = replica_set.choose()
+    return replica.sessions() if replica else SessionLocal()
+
+
+# Dependency to get a read-only database session
+def get_read_db(request: Request):
+    db = read_session(primary=wants_primary(request))
+    try:
+        yield db
+    finally:
+        db.close()
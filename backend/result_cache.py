@@ -0,0 +1,408 @@
+"""
+Read-through cache for item payloads
+
+get_item, get_items and /api/me/overview store their serialized JSON here,
+keyed by item id, by the normalized browse filters or by user, so a repeat
+read is one lookup and no query or model building. Entries expire after
+RESULT_CACHE_TTL_SECONDS and the store is bounded (RESULT_CACHE_MAX_ENTRIES
+/ RESULT_CACHE_MAX_BYTES, least recently used first).
+
+Every entry carries tags, and writes invalidate tags rather than keys:
+  - item:<id>                  the detail payload of one item
+  - list:<facet>:<value>       listings filtered on that value
+  - list:all                   listings with no category/status/location filter
+  - user:<id>                  a user's overview
+  - items                      everything (for bulk item/claim writes of unknown rows)
+Mapper events collect the tags an Item, Claim or Notification change
+touches (for an item its id, its reporter and claimant, and for published
+items the facet values before and after the change) and they are
+invalidated when the session commits, so every write path is covered
+without the routes having to remember to. Bulk notification INSERTs are
+tagged from their rows; a bulk UPDATE of notifications must call touch()
+itself. A bulk statement that knows what it changes can say so with
+execution_options(cache_tags=...) (an empty tuple for columns no payload
+shows, such as review leases). A fill that raced with an invalidation of
+one of its own tags is dropped instead of stored; invalidations of other
+tags (another item, a notification for some user) do not affect it.
+
+The memory store is per worker: another worker's commits reach it only
+through the TTL. RESULT_CACHE_BACKEND=sqlite keeps entries in a local
+SQLite file (RESULT_CACHE_DB) shared by all workers on the host, so they
+share hits and invalidations.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Iterable, Optional
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import object_session
+
+from database import SessionLocal
+from models import Item, Claim, Notification
+
+logger = logging.getLogger(__name__)
+
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+RESULT_CACHE_BACKEND = os.getenv("RESULT_CACHE_BACKEND", "memory")  # memory or sqlite
+RESULT_CACHE_DB = os.getenv("RESULT_CACHE_DB", "./result_cache.db")
+RESULT_CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", "60"))
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "5000"))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+ALL_ITEMS = "items"
+LIST_FACETS = ("category", "status", "location")
+
+
+# =================
+# TAGS
+# =================
+
+def item_tag(item_id: int) -> str:
+    return f"item:{item_id}"
+
+
+def user_tag(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+def list_tags(filters: dict) -> list:
+    """Tags of a listing: one per facet it filters on, so any item it could contain shares one"""
+    tags = [f"list:{f}:{filters[f]}" for f in LIST_FACETS if filters.get(f) is not None]
+    return (tags or ["list:all"]) + [ALL_ITEMS]
+
+
+def list_key(filters: dict, skip: int, limit: int) -> str:
+    params = "&".join(
+        f"{name}={value.isoformat() if hasattr(value, 'isoformat') else value}"
+        for name, value in sorted(filters.items()) if value is not None
+    )
+    return f"items?{params}&skip={skip}&limit={limit}"
+
+
+def item_key(item_id: int) -> str:
+    return f"item/{item_id}"
+
+
+def overview_key(user_id: int) -> str:
+    return f"overview/{user_id}"
+
+
+# =================
+# STORES
+# =================
+
+class MemoryStore:
+    """Bounded LRU of serialized payloads in this process"""
+
+    def __init__(self, max_entries: int = RESULT_CACHE_MAX_ENTRIES, max_bytes: int = RESULT_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (expires, body, tags)
+        self._by_tag = {}
+        self._bytes = 0
+        self._generation = 0
+        self._invalidated_at = {}  # tag -> generation of its last invalidation
+        self._lock = threading.Lock()
+
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, body: bytes, tags: Iterable[str], ttl: float, generation: int):
+        with self._lock:
+            tags = tuple(tags)
+            if any(self._invalidated_at.get(tag, 0) > generation for tag in tags):
+                return  # Invalidated while the payload was being built
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + ttl, body, tags)
+            self._bytes += len(body)
+            for tag in tags:
+                self._by_tag.setdefault(tag, set()).add(key)
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._drop(next(iter(self._entries)))
+
+    def invalidate(self, tags: Iterable[str]):
+        with self._lock:
+            self._generation += 1
+            for tag in tags:
+                self._invalidated_at[tag] = self._generation
+                for key in self._by_tag.pop(tag, ()):
+                    self._drop(key)
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= len(entry[1])
+        for tag in entry[2]:
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[tag]
+
+
+class SQLiteStore:
+    """Payloads in a local SQLite file shared by every worker on the host"""
+
+    def __init__(self, path: str, max_entries: int = RESULT_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._sets = 0
+        conn = self._connect()
+        conn.executescript(
+            "CREATE TABLE IF NOT EXISTS cache_entries "
+            "(key TEXT PRIMARY KEY, body BLOB NOT NULL, expires REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS cache_tags "
+            "(tag TEXT NOT NULL, key TEXT NOT NULL, PRIMARY KEY (tag, key)) WITHOUT ROWID;"
+            "CREATE TABLE IF NOT EXISTS cache_generation (id INTEGER PRIMARY KEY CHECK (id = 1), value INTEGER NOT NULL);"
+            "INSERT OR IGNORE INTO cache_generation (id, value) VALUES (1, 0);"
+            "CREATE TABLE IF NOT EXISTS cache_tag_generations "
+            "(tag TEXT PRIMARY KEY, generation INTEGER NOT NULL) WITHOUT ROWID;"
+        )
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+        return conn
+
+    def generation(self) -> int:
+        return self._connect().execute("SELECT value FROM cache_generation WHERE id = 1").fetchone()[0]
+
+    def get(self, key: str) -> Optional[bytes]:
+        row = self._connect().execute(
+            "SELECT body FROM cache_entries WHERE key = ? AND expires > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, body: bytes, tags: Iterable[str], ttl: float, generation: int):
+        tags = list(tags)
+        marks = ",".join("?" * len(tags))
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            invalidated_at = conn.execute(
+                f"SELECT MAX(generation) FROM cache_tag_generations WHERE tag IN ({marks})", tags
+            ).fetchone()[0]
+            if invalidated_at is not None and invalidated_at > generation:
+                conn.execute("ROLLBACK")
+                return
+            conn.execute("DELETE FROM cache_tags WHERE key = ?", (key,))
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (key, body, expires) VALUES (?, ?, ?)",
+                (key, body, time.time() + ttl)
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO cache_tags (tag, key) VALUES (?, ?)", [(tag, key) for tag in tags]
+            )
+            self._sets += 1
+            if self._sets % 100 == 0:
+                self._trim(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _trim(self, conn):
+        """Drop expired entries, then the ones closest to expiring beyond max_entries"""
+        conn.execute("DELETE FROM cache_entries WHERE expires <= ?", (time.time(),))
+        conn.execute(
+            "DELETE FROM cache_entries WHERE key IN ("
+            "SELECT key FROM cache_entries ORDER BY expires DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+        conn.execute("DELETE FROM cache_tags WHERE key NOT IN (SELECT key FROM cache_entries)")
+
+    def invalidate(self, tags: Iterable[str]):
+        tags = list(tags)
+        marks = ",".join("?" * len(tags))
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                f"DELETE FROM cache_entries WHERE key IN (SELECT key FROM cache_tags WHERE tag IN ({marks}))", tags
+            )
+            conn.execute(f"DELETE FROM cache_tags WHERE tag IN ({marks})", tags)
+            conn.execute("UPDATE cache_generation SET value = value + 1 WHERE id = 1")
+            conn.executemany(
+                "INSERT OR REPLACE INTO cache_tag_generations (tag, generation) "
+                "SELECT ?, value FROM cache_generation WHERE id = 1", [(tag,) for tag in tags]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+def _create_store():
+    if RESULT_CACHE_BACKEND == "sqlite":
+        return SQLiteStore(RESULT_CACHE_DB)
+    return MemoryStore()
+
+
+store = _create_store()
+
+
+# =================
+# READ-THROUGH
+# =================
+
+def render(content: Any) -> bytes:
+    # Same bytes FastAPI's JSONResponse would send
+    return json.dumps(
+        jsonable_encoder(content), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def cached_json(key: str, tags: Iterable[str], build: Callable[[], Any], bypass: bool = False):
+    """
+    Serve the cached payload for key, or build(), store and return it
+
+    Exceptions from build() (404s included) are raised and not cached.
+    With bypass the payload is built fresh and not stored.
+    """
+    if not RESULT_CACHE_ENABLED or bypass:
+        return build()
+
+    try:
+        body = store.get(key)
+        generation = store.generation()
+    except sqlite3.Error:
+        logger.exception("Result cache lookup failed")
+        return build()
+    if body is not None:
+        return Response(content=body, media_type="application/json", headers={"X-Cache": "HIT"})
+
+    body = render(build())
+    try:
+        store.set(key, body, tags, RESULT_CACHE_TTL_SECONDS, generation)
+    except sqlite3.Error:
+        logger.exception("Result cache store failed")
+    return Response(content=body, media_type="application/json", headers={"X-Cache": "MISS"})
+
+
+def invalidate(tags: Iterable[str]):
+    tags = set(tags)
+    if not tags:
+        return
+    try:
+        store.invalidate(tags)
+    except sqlite3.Error:
+        logger.exception("Result cache invalidation failed")
+
+
+# =================
+# INVALIDATION
+# =================
+
+def _facet_value(value):
+    return value.value if hasattr(value, "value") else value
+
+
+def _values(target, attrs) -> tuple:
+    """(before, after) values of attrs for a pending change"""
+    state = inspect(target)
+    before, after = {}, {}
+    for attr in attrs:
+        history = state.attrs[attr].history
+        after[attr] = getattr(target, attr)
+        before[attr] = history.deleted[0] if history.deleted else after[attr]
+    return before, after
+
+
+def _item_tags(target: Item) -> set:
+    """Tags whose entries may show this item, before or after the pending change"""
+    tags = {item_tag(target.id)}
+    published = False
+    for values in _values(target, LIST_FACETS + ("is_published", "reporter_id", "claimed_by_id")):
+        tags.update(user_tag(values[u]) for u in ("reporter_id", "claimed_by_id") if values[u] is not None)
+        if values["is_published"]:
+            published = True
+            tags.update(f"list:{f}:{_facet_value(values[f])}" for f in LIST_FACETS)
+    if published:
+        tags.add("list:all")
+    return tags
+
+
+def _owner_tags(column: str):
+    def tags(target) -> set:
+        return {user_tag(values[column]) for values in _values(target, (column,)) if values[column] is not None}
+    return tags
+
+
+_TAGGERS = {
+    Item: _item_tags,
+    Claim: _owner_tags("claimant_id"),
+    Notification: _owner_tags("user_id"),
+}
+_ROW_OWNERS = ("reporter_id", "claimed_by_id", "claimant_id", "user_id")
+
+
+def touch(session, tags: Iterable[str]):
+    """Invalidate tags when the session commits"""
+    if session is not None:
+        session.info.setdefault("cache_tags", set()).update(tags)
+
+
+def _written(mapper, connection, target):
+    touch(object_session(target), _TAGGERS[mapper.class_](target))
+
+
+for _model in _TAGGERS:
+    for _name in ("after_insert", "after_update", "after_delete"):
+        event.listen(_model, _name, _written)
+
+
+@event.listens_for(SessionLocal, "do_orm_execute")
+def _bulk_write(orm_execute_state):
+    classes = {m.class_ for m in orm_execute_state.all_mappers}
+    if not classes & set(_TAGGERS):
+        return
+    tags = orm_execute_state.execution_options.get("cache_tags")
+    if tags is not None:
+        touch(orm_execute_state.session, tags)
+    elif orm_execute_state.is_insert and Notification in classes:
+        # Bulk INSERT rows name their owners
+        params = orm_execute_state.parameters or ()
+        rows = params if isinstance(params, (list, tuple)) else [params]
+        touch(orm_execute_state.session, {
+            user_tag(row[column]) for row in rows for column in _ROW_OWNERS if row.get(column) is not None
+        })
+    elif classes & {Item, Claim} and (
+        orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete
+    ):
+        # Rows changed by a bulk statement are not known here
+        touch(orm_execute_state.session, {ALL_ITEMS})
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _invalidate_committed(session):
+    invalidate(session.info.pop("cache_tags", ()))
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _forget_tags(session):
+    session.info.pop("cache_tags", None)
@@ -0,0 +1,185 @@
+"""
+Leased review queue for pending items and claims
+
+Admins working the queue ask for the next task instead of picking from the
+same list. lease() hands each admin the highest-priority pending item or
+claim that nobody else holds, and marks it with lease_owner_id /
+lease_expires_at for REVIEW_LEASE_SECONDS. Two admins asking at once get
+different tasks:
+
+- PostgreSQL: SELECT ... FOR UPDATE SKIP LOCKED picks the candidate, so
+  concurrent callers skip each other's row instead of waiting on it.
+- SQLite: one UPDATE ... WHERE id = (best free candidate) RETURNING id.
+  The single writer makes the pick and the lease atomic.
+
+An admin holds one task per queue. Asking again returns the same task with
+the lease renewed. Leases that are not renewed expire, and the task goes
+back to the queue. Priority: urgent items first, then claims waiting longer
+than REVIEW_OVERDUE_HOURS, then (claims) the higher match score, then the
+oldest.
+
+verify_item / verify_claim and the batch endpoints refuse tasks leased by
+another admin, and clear the lease once the task is decided.
+"""
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import case, func, or_, select, update
+from sqlalchemy.orm import Session
+
+from models import Claim, ClaimStatus, Item, VerificationStatus
+
+REVIEW_LEASE_SECONDS = int(os.getenv("REVIEW_LEASE_SECONDS", "600"))
+REVIEW_OVERDUE_HOURS = float(os.getenv("REVIEW_OVERDUE_HOURS", "48"))
+
+QUEUES = {"items": Item, "claims": Claim}
+
+# Leases change nothing the public payloads show (see result_cache.py)
+_LEASE_WRITE = {"synchronize_session": False, "cache_tags": ()}
+
+
+def _pending(model):
+    if model is Item:
+        return Item.verification_status == VerificationStatus.PENDING
+    return Claim.status == ClaimStatus.PENDING
+
+
+def _free(model, admin_id: int, now: datetime):
+    """Not leased, lease expired, or already leased by admin_id"""
+    return or_(
+        model.lease_expires_at.is_(None),
+        model.lease_expires_at <= now,
+        model.lease_owner_id == admin_id,
+    )
+
+
+def _candidates(model, now: datetime):
+    """Pending task ids, highest priority first"""
+    overdue = now - timedelta(hours=REVIEW_OVERDUE_HOURS)
+    if model is Item:
+        return select(Item.id).where(_pending(Item)).order_by(
+            func.coalesce(Item.is_urgent, False).desc(),
+            Item.created_at.asc(),
+            Item.id.asc(),
+        )
+    return select(Claim.id).join(Item, Claim.item_id == Item.id).where(_pending(Claim)).order_by(
+        func.coalesce(Item.is_urgent, False).desc(),
+        case((Claim.created_at < overdue, 1), else_=0).desc(),
+        Claim.match_score.desc().nulls_last(),
+        Claim.created_at.asc(),
+        Claim.id.asc(),
+    )
+
+
+def _model(kind: str):
+    model = QUEUES.get(kind)
+    if model is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Unknown queue")
+    return model
+
+
+def _lease_values(admin_id: int, now: datetime, model) -> dict:
+    # Keep updated_at: a lease is not an edit (and must not trigger a facet sync)
+    return dict(
+        lease_owner_id=admin_id,
+        lease_expires_at=now + timedelta(seconds=REVIEW_LEASE_SECONDS),
+        updated_at=model.updated_at,
+    )
+
+
+def lease(db: Session, kind: str, admin_id: int) -> Optional[tuple]:
+    """Lease the next task of a queue to admin_id; returns (task_id, expires_at) or None when empty"""
+    model = _model(kind)
+    now = datetime.utcnow()
+    values = _lease_values(admin_id, now, model)
+
+    # One task per admin: asking again renews and returns it
+    held = db.execute(
+        update(model)
+        .where(model.lease_owner_id == admin_id, model.lease_expires_at > now, _pending(model))
+        .values(**values)
+        .returning(model.id)
+        .execution_options(**_LEASE_WRITE)
+    ).scalars().first()
+    if held is not None:
+        db.commit()
+        return held, values["lease_expires_at"]
+
+    candidate = _candidates(model, now).where(_free(model, admin_id, now)).limit(1).correlate(None)
+    if db.get_bind().dialect.name == "postgresql":
+        task_id = db.execute(candidate.with_for_update(skip_locked=True, of=model)).scalar()
+        if task_id is not None:
+            db.execute(
+                update(model).where(model.id == task_id).values(**values).execution_options(**_LEASE_WRITE)
+            )
+    else:
+        task_id = db.execute(
+            update(model)
+            .where(model.id == candidate.scalar_subquery(), _free(model, admin_id, now))
+            .values(**values)
+            .returning(model.id)
+            .execution_options(**_LEASE_WRITE)
+        ).scalar()
+    db.commit()
+    if task_id is None:
+        return None
+    return task_id, values["lease_expires_at"]
+
+
+def renew(db: Session, kind: str, task_id: int, admin_id: int) -> datetime:
+    """Extend admin_id's lease on a task; 409 if it expired and was taken, or the task was decided"""
+    model = _model(kind)
+    now = datetime.utcnow()
+    values = _lease_values(admin_id, now, model)
+    renewed = db.execute(
+        update(model)
+        .where(model.id == task_id, _pending(model), _free(model, admin_id, now))
+        .values(**values)
+        .execution_options(**_LEASE_WRITE)
+    ).rowcount
+    db.commit()
+    if not renewed:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Task is no longer yours to review")
+    return values["lease_expires_at"]
+
+
+def release(db: Session, kind: str, task_id: int, admin_id: int) -> bool:
+    """Give a task back to the queue"""
+    model = _model(kind)
+    released = db.execute(
+        update(model)
+        .where(model.id == task_id, model.lease_owner_id == admin_id)
+        .values(lease_owner_id=None, lease_expires_at=None, updated_at=model.updated_at)
+        .execution_options(**_LEASE_WRITE)
+    ).rowcount
+    db.commit()
+    return bool(released)
+
+
+def leased_by_other(row, admin_id: int, now: Optional[datetime] = None) -> bool:
+    """Whether an item/claim (or a row with its lease columns) is leased to another admin"""
+    now = now or datetime.utcnow()
+    return (
+        row.lease_owner_id is not None and row.lease_owner_id != admin_id
+        and row.lease_expires_at is not None and row.lease_expires_at > now
+    )
+
+
+def check_lease(task, admin_id: int):
+    """Refuse to decide a task another admin is reviewing, and end the lease otherwise"""
+    if leased_by_other(task, admin_id):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Another admin is reviewing this, try the next task"
+        )
+    task.lease_owner_id = None
+    task.lease_expires_at = None
+
+
+def lease_info(row, now: datetime) -> Optional[dict]:
+    """Active lease of a queue row, for the pending lists"""
+    if row.lease_owner_id is None or row.lease_expires_at is None or row.lease_expires_at <= now:
+        return None
+    return {"adminId": row.lease_owner_id, "expiresAt": row.lease_expires_at}
@@ -0,0 +1,98 @@
+"""
+Production server: gunicorn master with N uvicorn worker processes
+
+    python serve.py --workers 4 --port 8000
+
+The app is imported once in the master (preload) and forked into the
+workers. Pool sizes come from database.pool_limits() using the same
+WEB_CONCURRENCY / THREADPOOL_SIZE / DB_MAX_CONNECTIONS values, so this
+script exports them before the app is imported.
+
+Restarts drain gracefully: on SIGTERM (or SIGHUP, which replaces the
+workers) each worker stops accepting connections and finishes its
+in-flight requests for up to --graceful-timeout seconds. Workers are also
+recycled after --max-requests (+ jitter) so slow leaks cannot build up.
+"""
+import argparse
+import multiprocessing
+import os
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the Lost and Found API with multiple workers")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv(
+        "WEB_CONCURRENCY", str(min(multiprocessing.cpu_count() * 2 + 1, 8))
+    )))
+    parser.add_argument("--threads", type=int, default=int(os.getenv("THREADPOOL_SIZE", "40")),
+                        help="threadpool size for sync routes, per worker")
+    parser.add_argument("--max-connections", type=int, default=int(os.getenv("DB_MAX_CONNECTIONS", "100")),
+                        help="database connection budget shared by all workers")
+    parser.add_argument("--graceful-timeout", type=int, default=30)
+    parser.add_argument("--timeout", type=int, default=60)
+    parser.add_argument("--max-requests", type=int, default=10000)
+    parser.add_argument("--max-requests-jitter", type=int, default=1000)
+    return parser.parse_args()
+
+
+def post_fork(server, worker):
+    # Never share pooled connections inherited from the master
+    from database import engine, read_engine
+    from replicas import replica_set
+    engine.dispose(close=False)
+    read_engine.dispose(close=False)
+    replica_set.dispose(close=False)
+
+
+def worker_exit(server, worker):
+    from database import engine, read_engine
+    from replicas import replica_set
+    engine.dispose()
+    read_engine.dispose()
+    replica_set.dispose()
+
+
+def main():
+    args = parse_args()
+
+    # database.py reads these at import time to size its pool
+    os.environ["WEB_CONCURRENCY"] = str(args.workers)
+    os.environ["THREADPOOL_SIZE"] = str(args.threads)
+    os.environ["DB_MAX_CONNECTIONS"] = str(args.max_connections)
+
+    from gunicorn.app.base import BaseApplication
+    from database import POOL_SIZE, MAX_OVERFLOW
+
+    class Server(BaseApplication):
+        def load_config(self):
+            options = {
+                "bind": f"{args.host}:{args.port}",
+                "workers": args.workers,
+                "worker_class": "uvicorn.workers.UvicornWorker",
+                "preload_app": True,
+                "graceful_timeout": args.graceful_timeout,
+                "timeout": args.timeout,
+                "keepalive": 5,
+                "max_requests": args.max_requests,
+                "max_requests_jitter": args.max_requests_jitter,
+                "post_fork": post_fork,
+                "worker_exit": worker_exit,
+            }
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from main import app
+            return app
+
+    print(
+        f"Starting {args.workers} worker(s) x {args.threads} threads, "
+        f"DB pool {POOL_SIZE} + {MAX_OVERFLOW} overflow per worker "
+        f"(budget {args.max_connections})"
+    )
+    Server().run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""
+Typed, cached admin settings
+
+All settings are loaded once into an immutable SettingsSnapshot. Reading
+current_settings() is a plain attribute read (no lock, no query).
+update_setting() bumps a version number in the same transaction as the
+change; every worker polls that version in the background and reloads its
+snapshot when it moves, so all processes converge within SETTINGS_POLL_SECONDS.
+"""
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from email_validator import validate_email, EmailNotValidError
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import AdminSettings, SettingsState
+from claim_scoring import DEFAULT_WEIGHTS, WEIGHTS_SETTING_KEY, validate_weights
+
+logger = logging.getLogger(__name__)
+
+SETTINGS_POLL_SECONDS = float(os.getenv("SETTINGS_POLL_SECONDS", "5"))
+
+BLUR_LEVELS = ("low", "medium", "high")
+
+
+@dataclass(frozen=True)
+class SettingsSnapshot:
+    version: int = 0
+    hold_period_days: int = 7
+    blur_level: str = "medium"
+    admin_email: str = "admin@school.edu"
+    claim_score_weights: Dict[str, float] = field(default_factory=lambda: dict(DEFAULT_WEIGHTS))
+    profiling: Dict[str, object] = field(default_factory=dict)
+
+
+@dataclass(frozen=True)
+class SettingSpec:
+    attribute: str
+    parse: Callable[[str], object]
+    default: str
+    description: str
+    internal: bool = False  # Set through its own admin endpoints, not the settings page
+
+
+def _parse_hold_days(value: str) -> int:
+    try:
+        days = int(value)
+    except ValueError:
+        raise ValueError("hold_period_days must be a whole number of days")
+    if not 1 <= days <= 365:
+        raise ValueError("hold_period_days must be between 1 and 365")
+    return days
+
+
+def _parse_blur_level(value: str) -> str:
+    if value not in BLUR_LEVELS:
+        raise ValueError(f"blur_level must be one of: {', '.join(BLUR_LEVELS)}")
+    return value
+
+
+def _parse_email(value: str) -> str:
+    try:
+        return validate_email(value, check_deliverability=False).normalized
+    except EmailNotValidError as e:
+        raise ValueError(f"admin_email is not valid: {e}")
+
+
+def _parse_weights(value: str) -> Dict[str, float]:
+    return validate_weights(json.loads(value))
+
+
+def _parse_profiling(value: str) -> Dict[str, object]:
+    config = json.loads(value)
+    if not isinstance(config, dict):
+        raise ValueError("profiling must be a JSON object")
+    return config
+
+
+SETTING_SPECS = {
+    "hold_period_days": SettingSpec(
+        "hold_period_days", _parse_hold_days, "7", "Default hold period in days for items"
+    ),
+    "blur_level": SettingSpec(
+        "blur_level", _parse_blur_level, "medium", "Blur level for published found items (low/medium/high)"
+    ),
+    "admin_email": SettingSpec(
+        "admin_email", _parse_email, "admin@school.edu", "Admin contact email for notifications"
+    ),
+    WEIGHTS_SETTING_KEY: SettingSpec(
+        "claim_score_weights", _parse_weights, json.dumps(DEFAULT_WEIGHTS), "Weights for claim evidence match scores"
+    ),
+    "profiling": SettingSpec(
+        "profiling", _parse_profiling, "{}", "Routes armed for CPU profiling and whether memory tracing is on",
+        internal=True
+    ),
+}
+
+
+_snapshot: Optional[SettingsSnapshot] = None
+_load_lock = threading.Lock()
+_watcher: Optional[threading.Thread] = None
+_stop = threading.Event()
+_listeners: List[Callable[[SettingsSnapshot], None]] = []
+
+
+def parse_setting(key: str, value: str):
+    """Validate a raw setting value, raising ValueError if it is unknown or invalid"""
+    spec = SETTING_SPECS.get(key)
+    if spec is None:
+        raise ValueError(f"Unknown setting: {key}")
+    try:
+        return spec.parse(value)
+    except (TypeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Invalid value for {key}: {e}")
+
+
+def _read_version(db: Session) -> int:
+    return db.execute(select(SettingsState.version).where(SettingsState.id == 1)).scalar() or 0
+
+
+def load_snapshot(db: Session) -> SettingsSnapshot:
+    """Build a snapshot from the database, using defaults for missing or invalid rows"""
+    version = _read_version(db)
+    values = {}
+    for setting in db.query(AdminSettings).all():
+        spec = SETTING_SPECS.get(setting.setting_key)
+        if spec is None:
+            continue
+        try:
+            values[spec.attribute] = spec.parse(setting.setting_value)
+        except ValueError as e:
+            logger.warning("Ignoring invalid setting %s: %s", setting.setting_key, e)
+    return SettingsSnapshot(version=version, **values)
+
+
+def _set_snapshot(snapshot: SettingsSnapshot):
+    global _snapshot
+    _snapshot = snapshot
+    for listener in _listeners:
+        try:
+            listener(snapshot)
+        except Exception:
+            logger.exception("Settings listener failed")
+
+
+def add_listener(listener: Callable[[SettingsSnapshot], None]):
+    """Call listener(snapshot) whenever this worker loads a new snapshot"""
+    _listeners.append(listener)
+
+
+def reload(db: Optional[Session] = None) -> SettingsSnapshot:
+    """Reload the snapshot from the database"""
+    own_session = db is None
+    db = db or SessionLocal()
+    try:
+        _set_snapshot(load_snapshot(db))
+    finally:
+        if own_session:
+            db.close()
+    return _snapshot
+
+
+def current_settings() -> SettingsSnapshot:
+    """The current settings snapshot (loaded on first use)"""
+    snapshot = _snapshot
+    if snapshot is not None:
+        return snapshot
+    with _load_lock:
+        if _snapshot is None:
+            try:
+                reload()
+            except Exception:
+                # Version -1 never matches, so the watcher retries on its next poll
+                logger.exception("Could not load admin settings, using defaults")
+                _set_snapshot(SettingsSnapshot(version=-1))
+        return _snapshot
+
+
+def update_setting(db: Session, key: str, value: str, admin_id: int) -> AdminSettings:
+    """
+    Validate and store a setting and bump the settings version
+
+    Does not commit; call reload() after committing to refresh this worker
+    straight away (other workers pick it up on their next poll).
+    """
+    parse_setting(key, value)
+
+    setting = db.query(AdminSettings).filter(AdminSettings.setting_key == key).first()
+    if not setting:
+        setting = AdminSettings(
+            setting_key=key,
+            description=SETTING_SPECS[key].description
+        )
+        db.add(setting)
+    setting.setting_value = value
+    setting.updated_by_id = admin_id
+
+    bumped = db.execute(
+        update(SettingsState).where(SettingsState.id == 1).values(
+            version=SettingsState.version + 1, updated_at=datetime.utcnow()
+        )
+    )
+    if bumped.rowcount == 0:
+        db.add(SettingsState(id=1, version=1))
+
+    db.flush()
+    return setting
+
+
+def ensure_defaults(db: Session):
+    """Insert a row for every known setting that is missing"""
+    existing = {key for (key,) in db.query(AdminSettings.setting_key).all()}
+    for key, spec in SETTING_SPECS.items():
+        if key not in existing:
+            db.add(AdminSettings(setting_key=key, setting_value=spec.default, description=spec.description))
+    if db.get(SettingsState, 1) is None:
+        db.add(SettingsState(id=1, version=0))
+    db.commit()
+
+
+def _watch():
+    while not _stop.wait(SETTINGS_POLL_SECONDS):
+        try:
+            db = SessionLocal()
+            try:
+                if _snapshot is None or _read_version(db) != _snapshot.version:
+                    reload(db)
+            finally:
+                db.close()
+        except Exception:
+            logger.exception("Settings version check failed")
+
+
+def start_watcher():
+    """Load the snapshot and start polling for version changes (once per process)"""
+    global _watcher
+    current_settings()
+    if _watcher is None or not _watcher.is_alive():
+        _stop.clear()
+        _watcher = threading.Thread(target=_watch, name="settings-watcher", daemon=True)
+        _watcher.start()
+
+
+def stop_watcher():
+    _stop.set()
@@ -0,0 +1,113 @@
+"""
+Production SQLite mode
+
+- WAL journaling with synchronous=NORMAL, busy_timeout, mmap and a larger
+  page cache on every connection.
+- Two pools: a read pool of query_only connections, and a writer pool with
+  exactly one connection per process that opens its transactions with
+  BEGIN IMMEDIATE. Writers in this process queue for that connection (the
+  serialized writer path). Writers in other processes wait on busy_timeout
+  instead of failing with "database is locked" halfway through a transaction.
+- RoutingSession sends plain SELECTs to the read pool. A session switches to
+  the writer for the rest of its transaction once it flushes, executes an
+  INSERT/UPDATE/DELETE or selects FOR UPDATE, so it always reads its own
+  writes.
+"""
+import os
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.elements import TextClause
+
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", str(64 * 1024)))
+
+
+def is_file_database(url: str) -> bool:
+    """WAL and separate pools only make sense for an on-disk database"""
+    return url.startswith("sqlite") and ":memory:" not in url and "mode=memory" not in url \
+        and url.rstrip("/") != "sqlite:"
+
+
+def _apply_pragmas(dbapi_connection, read_only: bool):
+    # Let SQLAlchemy's "begin" event issue BEGIN instead of the sqlite3 module
+    dbapi_connection.isolation_level = None
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    if read_only:
+        cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+
+def create_sqlite_engines(url: str, read_pool_size: int, read_max_overflow: int, pool_timeout: float, **kw):
+    """Create (write_engine, read_engine) for a tuned on-disk SQLite database"""
+    write_engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=pool_timeout,
+        **kw
+    )
+    read_engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+        pool_size=read_pool_size,
+        max_overflow=read_max_overflow,
+        pool_timeout=pool_timeout,
+        **kw
+    )
+
+    @event.listens_for(write_engine, "connect")
+    def _writer_connect(dbapi_connection, connection_record):
+        _apply_pragmas(dbapi_connection, read_only=False)
+
+    @event.listens_for(write_engine, "begin")
+    def _writer_begin(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    @event.listens_for(read_engine, "connect")
+    def _reader_connect(dbapi_connection, connection_record):
+        _apply_pragmas(dbapi_connection, read_only=True)
+
+    @event.listens_for(read_engine, "begin")
+    def _reader_begin(conn):
+        conn.exec_driver_sql("BEGIN")
+
+    return write_engine, read_engine
+
+
+def _is_write(clause) -> bool:
+    if clause is None:
+        return False
+    if isinstance(clause, (UpdateBase, TextClause)):
+        return True
+    return getattr(clause, "_for_update_arg", None) is not None
+
+
+class RoutingSession(Session):
+    """Session that reads from the read pool until its transaction writes"""
+
+    def __init__(self, write_engine, read_engine, **kw):
+        super().__init__(**kw)
+        self.write_engine = write_engine
+        self.read_engine = read_engine
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self.info.get("writing") or self._flushing or _is_write(clause):
+            self.info["writing"] = True
+            return self.write_engine
+        return self.read_engine
+
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def _back_to_readers(session, transaction):
+    if transaction.parent is None:
+        session.info.pop("writing", None)
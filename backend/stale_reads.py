@@ -0,0 +1,236 @@
+"""
+Serve-stale fallback for public reads
+
+/api/items, /api/items/{id} and /api/stats keep the last good payload they
+served, per response key. When building a fresh payload fails because the
+database is unreachable, out of connections or past the route's deadline,
+the last good copy is served instead. It carries `Warning: 110 - "Response
+is Stale"`, `Age` and `X-Cache: STALE`, and a background refresh is queued.
+For a lost-and-found board, data a few minutes old beats an error page.
+
+A circuit breaker guards the database. After STALE_BREAKER_FAILURES failures
+in a row, or builds slower than STALE_SLOW_SECONDS, it opens. While open,
+these routes do not query at all: they serve the result cache, then the last
+good copy, then a quick 503. After STALE_BREAKER_OPEN_SECONDS a single
+request or background refresh probes the database. Success closes the
+breaker; failure keeps it open.
+
+Copies are kept in memory per worker for up to STALE_MAX_AGE_SECONDS,
+bounded by STALE_MAX_ENTRIES / STALE_MAX_BYTES (least recently used first).
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Optional
+
+from fastapi import HTTPException, status
+from fastapi.responses import Response
+from sqlalchemy.exc import InterfaceError, OperationalError, TimeoutError as PoolTimeoutError
+
+import deadlines
+import result_cache
+from deadlines import DeadlineExceeded
+from replicas import read_session
+
+logger = logging.getLogger(__name__)
+
+STALE_READS_ENABLED = os.getenv("STALE_READS_ENABLED", "true").lower() == "true"
+STALE_MAX_AGE_SECONDS = float(os.getenv("STALE_MAX_AGE_SECONDS", str(6 * 3600)))
+STALE_MAX_ENTRIES = int(os.getenv("STALE_MAX_ENTRIES", "2000"))
+STALE_MAX_BYTES = int(os.getenv("STALE_MAX_BYTES", str(32 * 1024 * 1024)))
+STALE_SLOW_SECONDS = float(os.getenv("STALE_SLOW_SECONDS", "2"))
+STALE_REFRESH_SECONDS = float(os.getenv("STALE_REFRESH_SECONDS", "5"))
+STALE_BREAKER_FAILURES = int(os.getenv("STALE_BREAKER_FAILURES", "5"))
+STALE_BREAKER_OPEN_SECONDS = float(os.getenv("STALE_BREAKER_OPEN_SECONDS", "10"))
+
+# What a struggling database looks like from here; anything else is a bug and is raised
+DATABASE_FAILURES = (OperationalError, InterfaceError, PoolTimeoutError, DeadlineExceeded)
+
+
+class DatabaseUnavailable(HTTPException):
+    def __init__(self, retry_after: int):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="The database is unavailable, please try again shortly",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+class _BreakerOpen(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """Closed, open for open_seconds after `failures` failures in a row, then one probe at a time"""
+
+    def __init__(self, failures: int = STALE_BREAKER_FAILURES, open_seconds: float = STALE_BREAKER_OPEN_SECONDS):
+        self.threshold = failures
+        self.open_seconds = open_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a database call may go ahead (after the open period, only the probe)"""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.probing or time.monotonic() - self.opened_at < self.open_seconds:
+                return False
+            self.state = "half-open"
+            self.probing = True
+            return True
+
+    def record(self, ok: bool):
+        with self._lock:
+            if ok:
+                if self.state != "closed":
+                    logger.info("Database reads recovered, closing the circuit breaker")
+                self.state = "closed"
+                self.failures = 0
+                self.probing = False
+                return
+            self.failures += 1
+            if self.probing or self.failures >= self.threshold:
+                if self.state == "closed":
+                    logger.warning("Database reads failing (%d in a row), opening the circuit breaker", self.failures)
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self.probing = False
+
+    def retry_after(self) -> int:
+        left = self.open_seconds - (time.monotonic() - self.opened_at)
+        return max(1, int(left + 0.999))
+
+
+class LastGood:
+    """Bounded LRU of the last payload served per key, with when it was built"""
+
+    def __init__(self, max_entries: int = STALE_MAX_ENTRIES, max_bytes: int = STALE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (built_at, body)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[tuple]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry[0] > STALE_MAX_AGE_SECONDS:
+                self._bytes -= len(self._entries.pop(key)[1])
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, body: bytes, built_at: Optional[float] = None):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[1])
+            self._entries[key] = (built_at or time.time(), body)
+            self._bytes += len(body)
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._bytes -= len(self._entries.popitem(last=False)[1][1])
+
+
+breaker = CircuitBreaker()
+last_good = LastGood()
+
+_refresher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="stale-refresh")
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def _guarded(build: Callable[[Any], Any], db):
+    """Run build(db) if the breaker allows it, recording how the database did"""
+    if not breaker.allow():
+        raise _BreakerOpen()
+    start = time.monotonic()
+    ok = False
+    try:
+        result = build(db)
+        ok = time.monotonic() - start < STALE_SLOW_SECONDS
+        return result
+    except DATABASE_FAILURES:
+        raise
+    except Exception:
+        # The database answered (a 404, say)
+        ok = True
+        raise
+    finally:
+        breaker.record(ok)
+
+
+def _refresh(key: str, build: Callable[[Any], Any]):
+    try:
+        with deadlines.bounded(STALE_REFRESH_SECONDS), read_session() as db:
+            last_good.set(key, result_cache.render(_guarded(build, db)))
+    except _BreakerOpen:
+        pass
+    except Exception as e:
+        logger.debug("Background refresh of %s failed: %s", key, e)
+    finally:
+        with _refreshing_lock:
+            _refreshing.discard(key)
+
+
+def _refresh_later(key: str, build: Callable[[Any], Any]):
+    with _refreshing_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+    _refresher.submit(_refresh, key, build)
+
+
+def serve(key: str, build: Callable[[Any], Any], db, tags: Optional[Iterable[str]] = None, bypass: bool = False):
+    """
+    Serve build(db) as JSON, falling back to the last good payload for key
+
+    With tags the payload also goes through the result cache (see
+    result_cache.cached_json). build must take the session, so the
+    background refresh can run it on its own.
+    """
+    if not STALE_READS_ENABLED:
+        if tags is None:
+            return build(db)
+        return result_cache.cached_json(key, tags, lambda: build(db), bypass=bypass)
+
+    try:
+        if tags is None:
+            result = _guarded(build, db)
+        else:
+            result = result_cache.cached_json(key, tags, lambda: _guarded(build, db), bypass=bypass)
+    except (_BreakerOpen,) + DATABASE_FAILURES as e:
+        copy = last_good.get(key)
+        _refresh_later(key, build)
+        if copy is None:
+            if isinstance(e, HTTPException):
+                raise
+            if not isinstance(e, _BreakerOpen):
+                logger.warning("No stale copy of %s to serve: %s", key, str(e).splitlines()[0])
+            raise DatabaseUnavailable(breaker.retry_after() if breaker.state != "closed" else 1) from e
+        built_at, body = copy
+        return Response(content=body, media_type="application/json", headers={
+            "Warning": '110 - "Response is Stale"',
+            "Age": str(max(0, int(time.time() - built_at))),
+            "X-Cache": "STALE",
+        })
+
+    if isinstance(result, Response):
+        if result.headers.get("X-Cache") != "HIT":
+            last_good.set(key, result.body)
+        return result
+    body = result_cache.render(result)
+    last_good.set(key, body)
+    return Response(content=body, media_type="application/json")
+
+
+def breaker_state() -> dict:
+    return {"breaker": breaker.state, "consecutiveFailures": breaker.failures}
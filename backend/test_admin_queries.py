@@ -0,0 +1,118 @@
+"""
+Query budgets for the admin queues
+
+Each queue must issue the same number of statements whatever the page
+size, so a lazy load per row shows up as a failure here. Uses its own
+in-memory engine, so the statements counted are only the route's, and
+calls the route functions directly.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database import Base
+from models import (
+    User, Item, Claim, Notification, AuditLog, ItemTimeline,
+    UserRole, ClaimStatus, VerificationStatus,
+)
+import admin_routes
+
+ROWS = 40
+
+
+@pytest.fixture
+def db(make_user):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine, autoflush=False)()
+
+    admin = make_user(1, UserRole.ADMIN, "Ada", "Admin")
+    session.add(admin)
+    session.flush()
+    start = datetime(2024, 1, 1)
+    for i in range(ROWS):
+        # A different reporter and claimant per row, so lazy loads could not hit the identity map
+        reporter = make_user(2 * i, first_name="Rep", last_name=str(i))
+        claimant = make_user(2 * i + 1, first_name="Cla", last_name=str(i))
+        session.add_all([reporter, claimant])
+        session.flush()
+        item = Item(title=f"Item {i}", description="Black wallet", category="Wallets", location="Library",
+                    date=start, reference_number=f"LF-{i}", reporter_id=reporter.id,
+                    verification_status=VerificationStatus.PENDING, created_at=start + timedelta(minutes=i))
+        session.add(item)
+        session.flush()
+        session.add_all([
+            Claim(item_id=item.id, claimant_id=claimant.id, verification_details="Mine",
+                  status=ClaimStatus.PENDING, match_score=i, created_at=start + timedelta(minutes=i)),
+            Notification(user_id=reporter.id, type="item_approved", title="Approved", message="m"),
+            AuditLog(admin_id=admin.id, action="approve_item", entity_type="item", entity_id=item.id, details="d"),
+            ItemTimeline(item_id=item.id, action="reported", description="d", performed_by_id=reporter.id),
+        ])
+    session.commit()
+    admin_id = admin.id
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    session.statements = statements
+    session.admin = session.get(User, admin_id)
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def count_statements(db, route, **params):
+    """Statements issued by a route call, starting from an empty identity map"""
+    admin_id = db.admin.id
+    db.expunge_all()
+    admin = db.get(User, admin_id)
+    db.statements.clear()
+    result = route(current_admin=admin, db=db, **params)
+    return len(db.statements), result
+
+
+@pytest.mark.parametrize("route, params", [
+    (admin_routes.get_pending_items, {}),
+    (admin_routes.get_pending_claims, {"sort": "newest"}),
+    (admin_routes.get_pending_claims, {"sort": "score"}),
+    (admin_routes.get_all_notifications, {"user_id": None}),
+    (admin_routes.get_audit_logs, {"action": None}),
+])
+def test_queue_statements_do_not_grow_with_page_size(db, route, params):
+    small, small_page = count_statements(db, route, skip=0, limit=2, **params)
+    large, large_page = count_statements(db, route, skip=0, limit=ROWS, **params)
+
+    assert len(small_page) == 2
+    assert len(large_page) == ROWS
+    assert small == large == 1
+
+
+def test_full_item_details_statements_do_not_grow_with_timeline(db):
+    item_id = db.query(Item.id).first()[0]
+    db.add_all([
+        ItemTimeline(item_id=item_id, action="note", description="d", performed_by_id=db.admin.id)
+        for _ in range(20)
+    ])
+    db.commit()
+
+    statements, details = count_statements(db, admin_routes.get_full_item_details, item_id=item_id)
+
+    assert len(details["timeline"]) == 21
+    assert statements == 2
+
+
+def test_queue_payloads(db):
+    _, items = count_statements(db, admin_routes.get_pending_items, skip=0, limit=1)
+    assert items[0]["reporter"]["name"] == f"Rep {ROWS - 1}"
+
+    _, claims = count_statements(db, admin_routes.get_pending_claims, skip=0, limit=1, sort="score")
+    assert claims[0]["item"]["title"] == f"Item {ROWS - 1}"
+    assert claims[0]["claimant"]["email"] == f"s{2 * ROWS - 1}@school.edu"
+
+    _, logs = count_statements(db, admin_routes.get_audit_logs, skip=0, limit=1, action="approve_item")
+    assert logs[0]["admin"]["name"] == "Ada Admin"
+
+    _, notifications = count_statements(db, admin_routes.get_all_notifications, skip=0, limit=1, user_id=None)
+    assert notifications[0]["user"]["name"].startswith("Rep ")
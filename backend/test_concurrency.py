@@ -0,0 +1,207 @@
+"""
+Optimistic locking on items and claims
+
+Parallel admin actions on one item must not overwrite each other: of the
+writers that read the same version, one wins and the rest get a conflict,
+and every action that was answered as done is in the final state. Runs
+against a SQLite file under tmp_path, since threads need their own
+connections, and calls the route functions directly.
+"""
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm.exc import StaleDataError
+
+from database import Base
+from models import User, Item, Claim, OutboxEvent, UserRole, ItemStatus, ClaimStatus, VerificationStatus
+from item_events import ITEM_VERIFIED
+from claim_scoring import DEFAULT_WEIGHTS, rescore_claims
+import admin_routes
+
+ADMINS = 8
+
+
+@pytest.fixture
+def sessions(tmp_path, make_user):
+    engine = create_engine(f"sqlite:///{tmp_path / 'concurrency.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    make_session = sessionmaker(bind=engine, autoflush=False)
+
+    db = make_session()
+    admins = [make_user(i, UserRole.ADMIN, "Admin", str(i)) for i in range(ADMINS)]
+    reporter = make_user(1, first_name="Rep", last_name="Orter")
+    db.add_all(admins + [reporter])
+    db.flush()
+    item = Item(title="Black wallet", description="Leather", category="Wallets", location="Library",
+                date=datetime(2024, 1, 1), reference_number="LF-1", reporter_id=reporter.id)
+    db.add(item)
+    db.flush()
+    db.add(Claim(item_id=item.id, claimant_id=reporter.id, verification_details="Mine"))
+    db.commit()
+    make_session.admin_ids = [admin.id for admin in admins]
+    make_session.item_id = item.id
+    db.close()
+
+    yield make_session
+    engine.dispose()
+
+
+def verify(make_session, admin_id, item_id, action, version=None, before_flush=None):
+    """Run verify_item in its own session; returns the new version, or None on a conflict"""
+    db = make_session()
+    if before_flush is not None:
+        event.listen(db, "before_flush", lambda *args: before_flush())
+    try:
+        result = admin_routes.verify_item(
+            item_id=item_id,
+            action_data=admin_routes.ItemVerificationAction(action=action, rejection_reason="Duplicate",
+                                                            version=version),
+            if_match=None,
+            current_admin=db.get(User, admin_id),
+            db=db,
+        )
+        return result["item"]["version"]
+    except StaleDataError:
+        db.rollback()
+        return None
+    except HTTPException as e:
+        assert e.status_code == 409
+        return None
+    finally:
+        db.close()
+
+
+def verified_events(db):
+    return [json.loads(e.payload) for e in db.query(OutboxEvent).filter(OutboxEvent.event_type == ITEM_VERIFIED).order_by(OutboxEvent.id)]
+
+
+def test_parallel_actions_on_one_version_have_one_winner(sessions):
+    # Every admin has read the item before anyone writes
+    read_by_all = threading.Barrier(ADMINS, timeout=10)
+    actions = ["approve", "reject", "request_more_info"]
+
+    with ThreadPoolExecutor(ADMINS) as pool:
+        outcomes = list(pool.map(
+            lambda i: (actions[i % len(actions)], verify(
+                sessions, sessions.admin_ids[i], sessions.item_id, actions[i % len(actions)],
+                before_flush=read_by_all.wait,
+            )),
+            range(ADMINS),
+        ))
+
+    won = [(action, version) for action, version in outcomes if version is not None]
+    assert len(won) == 1
+    action, version = won[0]
+
+    db = sessions()
+    item = db.get(Item, sessions.item_id)
+    assert item.version == version == 2
+    assert item.verification_status == {
+        "approve": VerificationStatus.APPROVED,
+        "reject": VerificationStatus.REJECTED,
+        "request_more_info": VerificationStatus.MORE_INFO_REQUESTED,
+    }[action]
+    assert [e["action"] for e in verified_events(db)] == [action]
+    db.close()
+
+
+def test_retried_actions_are_all_applied_in_order(sessions):
+    # Each admin re-reads and retries after a conflict; none of the answered actions may be lost
+    done = []
+    done_lock = threading.Lock()
+
+    def work(i):
+        while True:
+            db = sessions()
+            version = db.get(Item, sessions.item_id).version
+            db.close()
+            action = "request_more_info" if i % 2 else "reject"
+            new_version = verify(sessions, sessions.admin_ids[i], sessions.item_id, action, version=version)
+            if new_version is not None:
+                with done_lock:
+                    done.append((new_version, sessions.admin_ids[i], action))
+                return
+
+    with ThreadPoolExecutor(ADMINS) as pool:
+        list(pool.map(work, range(ADMINS)))
+
+    db = sessions()
+    item = db.get(Item, sessions.item_id)
+    events = verified_events(db)
+    db.close()
+
+    assert sorted(version for version, _, _ in done) == list(range(2, ADMINS + 2))
+    assert item.version == ADMINS + 1
+    # The outbox holds every answered action, in the order the versions were given out
+    assert [(e["admin_id"], e["action"]) for e in events] == [(admin, action) for _, admin, action in sorted(done)]
+    last = max(done)[2]
+    assert item.verification_status == (
+        VerificationStatus.REJECTED if last == "reject" else VerificationStatus.MORE_INFO_REQUESTED
+    )
+
+
+def test_stale_version_is_refused(sessions):
+    assert verify(sessions, sessions.admin_ids[0], sessions.item_id, "request_more_info", version=1) == 2
+    assert verify(sessions, sessions.admin_ids[1], sessions.item_id, "approve", version=1) is None
+
+    db = sessions()
+    assert db.get(Item, sessions.item_id).verification_status == VerificationStatus.MORE_INFO_REQUESTED
+    db.close()
+
+
+def test_set_based_updates_bump_the_version(sessions):
+    db = sessions()
+    admin = db.get(User, sessions.admin_ids[0])
+    admin_routes.verify_items_batch(
+        action_data=admin_routes.BatchItemVerificationAction(item_ids=[sessions.item_id], action="approve"),
+        current_admin=admin, db=db,
+    )
+    db.close()
+
+    # A decision taken on the version before the batch is refused
+    assert verify(sessions, sessions.admin_ids[1], sessions.item_id, "reject", version=1) is None
+
+    db = sessions()
+    item = db.get(Item, sessions.item_id)
+    assert (item.version, item.verification_status, item.status) == (2, VerificationStatus.APPROVED, ItemStatus.FOUND)
+    db.close()
+
+
+def test_claim_decision_on_stale_version_is_refused(sessions):
+    db = sessions()
+    claim_id = db.query(Claim.id).scalar()
+    admin = db.get(User, sessions.admin_ids[0])
+    with pytest.raises(HTTPException) as conflict:
+        admin_routes.verify_claim(
+            claim_id=claim_id,
+            action_data=admin_routes.ClaimVerificationAction(action="deny", version=7),
+            if_match=None, current_admin=admin, db=db,
+        )
+    assert conflict.value.status_code == 409
+
+    result = admin_routes.verify_claim(
+        claim_id=claim_id,
+        action_data=admin_routes.ClaimVerificationAction(action="deny"),
+        if_match='"1"', current_admin=admin, db=db,
+    )
+    assert result["version"] == 2
+    assert db.get(Claim, claim_id).status == ClaimStatus.REJECTED
+    db.close()
+
+
+def test_rescoring_keeps_the_version(sessions):
+    db = sessions()
+    assert db.query(Claim.score_color).scalar() is None  # components still to backfill
+
+    rescore_claims(db, DEFAULT_WEIGHTS)
+    db.commit()
+    claim = db.query(Claim).one()
+    assert claim.score_color is not None and claim.match_score is not None
+    assert claim.version == 1
+    db.close()
@@ -0,0 +1,102 @@
+"""
+Admin CSV / NDJSON exports
+
+Reads the streamed bodies of the item, claim and audit log exports and
+checks the filters. stream_export opens its own SessionLocal, so the
+rows go in through the shared db fixture (conftest.py).
+"""
+import csv
+import io
+import json
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from models import Item, Claim, AuditLog, ItemStatus, ClaimStatus, VerificationStatus
+import admin_routes
+import exports
+
+
+@pytest.fixture
+def exported(db, users):
+    admin, reporter = users.admin, users.reporter
+    lost = Item(title="Black wallet", description="Leather", category="Wallets", location="Library",
+                date=datetime(2024, 1, 1), reference_number="LF-1", reporter_id=reporter.id,
+                status=ItemStatus.LOST)
+    found = Item(title="Blue umbrella", description="Folding, with a \"Go, team\" print", category="Other",
+                 location="Gym", date=datetime(2024, 1, 2), reference_number="LF-2", reporter_id=reporter.id,
+                 status=ItemStatus.FOUND, verification_status=VerificationStatus.APPROVED,
+                 verified_by_id=admin.id)
+    db.add_all([lost, found])
+    db.flush()
+    db.add_all([
+        Claim(item_id=found.id, claimant_id=reporter.id, verification_details="Mine", claimed_color="blue"),
+        Claim(item_id=found.id, claimant_id=admin.id, verification_details="Also mine",
+              status=ClaimStatus.REJECTED, rejection_reason="Wrong colour", reviewed_by_id=admin.id),
+        AuditLog(admin_id=admin.id, action="approve_item", entity_type="item", entity_id=found.id,
+                 details="Approved, published"),
+    ])
+    db.commit()
+    return users
+
+
+def read_csv(stmt):
+    return list(csv.DictReader(io.StringIO("".join(exports.stream_export(stmt, "csv")))))
+
+
+def read_ndjson(stmt):
+    return [json.loads(line) for line in "".join(exports.stream_export(stmt, "ndjson")).splitlines()]
+
+
+def test_item_csv_export(exported):
+    rows = read_csv(exports.item_export_query())
+    assert [row["referenceNumber"] for row in rows] == ["LF-1", "LF-2"]
+    assert rows[1]["status"] == "found"
+    assert rows[1]["verificationStatus"] == "approved"
+    assert rows[1]["reporterName"] == "Rep Orter"
+    assert rows[1]["verifiedBy"] == "Ada Admin"
+    assert rows[0]["verifiedBy"] == ""
+
+    found = read_csv(exports.item_export_query(status=exports.parse_filter(ItemStatus, "found", "status")))
+    assert [row["referenceNumber"] for row in found] == ["LF-2"]
+
+
+def test_claim_ndjson_export(exported):
+    rows = read_ndjson(exports.claim_export_query())
+    assert [(row["itemReferenceNumber"], row["status"]) for row in rows] == [("LF-2", "pending"), ("LF-2", "rejected")]
+    assert rows[0]["claimedColor"] == "blue" and rows[0]["reviewedBy"] is None
+    assert rows[1]["reviewedBy"] == "Ada Admin"
+
+    rejected = read_ndjson(exports.claim_export_query(status=ClaimStatus.REJECTED))
+    assert [row["rejectionReason"] for row in rejected] == ["Wrong colour"]
+
+
+@pytest.mark.parametrize("fmt", ["csv", "ndjson"])
+def test_audit_log_export(exported, fmt):
+    stmt = exports.audit_log_export_query(action="approve_item")
+    rows = read_csv(stmt) if fmt == "csv" else read_ndjson(stmt)
+    assert [(row["action"], row["adminName"], row["details"]) for row in rows] == [
+        ("approve_item", "Ada Admin", "Approved, published")
+    ]
+
+
+def test_export_response_is_a_download(db, exported):
+    response = admin_routes.export_items(
+        format="ndjson", status="FOUND", verification_status=None, start_date=None, end_date=None,
+        current_admin=exported.admin, db=db,
+    )
+    assert response.media_type == "application/x-ndjson"
+    assert response.headers["content-disposition"].startswith('attachment; filename="items-')
+
+
+@pytest.mark.parametrize("route, params", [
+    (admin_routes.export_items, {"status": "bogus", "verification_status": None}),
+    (admin_routes.export_items, {"status": None, "verification_status": "bogus"}),
+    (admin_routes.export_claims, {"status": "bogus"}),
+    (admin_routes.export_items, {"status": None, "verification_status": None, "format": "xlsx"}),
+])
+def test_invalid_filters_are_refused_before_streaming(db, exported, route, params):
+    with pytest.raises(HTTPException) as refused:
+        route(**{"format": "csv", **params}, start_date=None, end_date=None, current_admin=exported.admin, db=db)
+    assert refused.value.status_code == 400
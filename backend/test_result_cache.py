@@ -0,0 +1,180 @@
+"""
+Result cache invalidation
+
+Fills the cache through the public read routes, runs each write path and
+checks which detail, listing and overview entries were dropped, calling
+the route functions directly on the shared db fixture (conftest.py).
+"""
+import json
+from datetime import datetime
+
+import pytest
+from starlette.requests import Request
+
+from models import Item, Claim, ItemStatus, VerificationStatus
+from facet_index import index as facet_index
+import admin_routes
+import main
+import result_cache
+
+
+def request():
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": []})
+
+
+@pytest.fixture(autouse=True)
+def seeded(db, users, monkeypatch):
+    monkeypatch.setattr(result_cache, "store", result_cache.MemoryStore())
+    facet_index.loaded = False
+
+    def item(ref, category, status, published=True):
+        return Item(title=ref, description="d", category=category, location="Library", date=datetime(2024, 1, 1),
+                    reference_number=ref, reporter_id=users.reporter.id, status=status, is_published=published,
+                    verification_status=VerificationStatus.APPROVED if published else VerificationStatus.PENDING)
+
+    items = {
+        "wallet": item("LF-1", "Wallets", ItemStatus.FOUND),
+        "phone": item("LF-2", "Electronics", ItemStatus.FOUND),
+        "keys": item("LF-3", "Keys", ItemStatus.LOST),
+        "pending": item("LF-4", "Wallets", ItemStatus.PENDING_VERIFICATION, published=False),
+    }
+    db.add_all(items.values())
+    db.commit()
+    db.ids = {name: row.id for name, row in items.items()}
+    db.admin, db.reporter, db.claimant = users.admin, users.reporter, users.claimant
+
+
+def fill(db) -> dict:
+    """Cache every item detail, a few listings and the users' overviews; returns name -> key"""
+    keys = {}
+    for name, item_id in db.ids.items():
+        main.get_item(item_id=item_id, request=request(), db=db)
+        keys[name] = result_cache.item_key(item_id)
+    for name, filters in {
+        "all": {},
+        "wallets": {"category": "Wallets"},
+        "electronics": {"category": "Electronics"},
+        "found": {"status": "found"},
+        "lost": {"status": "lost"},
+    }.items():
+        filters = main._browse_filters(filters.get("status"), filters.get("category"), None, None, None)
+        main.get_items(request=request(), **filters, skip=0, limit=20, db=db)
+        keys[name] = result_cache.list_key(filters, 0, 20)
+    for name, user in (("reporter overview", db.reporter), ("claimant overview", db.claimant)):
+        main.get_my_overview(request=request(), current_user=user, db=db)
+        keys[name] = result_cache.overview_key(user.id)
+    assert all(result_cache.store.get(key) is not None for key in keys.values())
+    return keys
+
+
+def dropped(keys: dict) -> set:
+    return {name for name, key in keys.items() if result_cache.store.get(key) is None}
+
+
+def test_repeat_reads_are_hits(db):
+    fill(db)
+    response = main.get_item(item_id=db.ids["wallet"], request=request(), db=db)
+    assert response.headers["X-Cache"] == "HIT"
+
+
+def test_create_drops_only_the_reporters_overview(db):
+    keys = fill(db)
+    main.create_item(
+        item_data=main.ItemCreate(title="Umbrella", description="d", category="Wallets", location="Gym",
+                                  date=datetime(2024, 2, 1), status="found"),
+        idempotency_key=None, current_user=db.reporter, db=db,
+    )
+    # New reports wait for verification, so no public listing changes
+    assert dropped(keys) == {"reporter overview"}
+
+
+def test_verify_drops_the_item_and_the_listings_it_joins(db):
+    keys = fill(db)
+    admin_routes.verify_item(
+        item_id=db.ids["pending"], action_data=admin_routes.ItemVerificationAction(action="approve"),
+        if_match=None, current_admin=db.admin, db=db,
+    )
+    assert dropped(keys) == {"pending", "all", "wallets", "found", "reporter overview"}
+
+    listing = main.get_items(request=request(), category="Wallets", skip=0, limit=20, db=db)
+    assert listing.headers["X-Cache"] == "MISS"
+    assert db.ids["pending"] in [row["id"] for row in json.loads(listing.body)]
+
+
+def test_batch_verify_drops_everything(db):
+    keys = fill(db)
+    admin_routes.verify_items_batch(
+        action_data=admin_routes.BatchItemVerificationAction(item_ids=[db.ids["pending"]], action="approve"),
+        current_admin=db.admin, db=db,
+    )
+    # A bulk UPDATE does not say which rows it changed
+    assert dropped(keys) == set(keys)
+
+
+def test_claim_drops_only_the_claimants_overview(db):
+    keys = fill(db)
+    main.claim_item(
+        item_id=db.ids["wallet"],
+        claim_data=main.ClaimCreate(itemId=db.ids["wallet"], verificationDetails="Mine"),
+        idempotency_key=None, current_user=db.claimant, db=db,
+    )
+    assert dropped(keys) == {"claimant overview"}
+
+
+def test_mark_found_drops_the_item_and_both_status_listings(db):
+    keys = fill(db)
+    main.mark_item_found(item_id=db.ids["keys"], if_match=None, current_user=db.reporter, db=db)
+    assert dropped(keys) == {"keys", "all", "lost", "found", "reporter overview"}
+
+
+def test_hold_drops_the_item_and_its_listings(db):
+    db.add(Claim(item_id=db.ids["wallet"], claimant_id=db.claimant.id, verification_details="Mine"))
+    db.commit()
+    claim_id = db.query(Claim.id).scalar()
+    keys = fill(db)
+
+    admin_routes.verify_claim(
+        claim_id=claim_id, action_data=admin_routes.ClaimVerificationAction(action="hold", hold_days=3),
+        if_match=None, current_admin=db.admin, db=db,
+    )
+    assert dropped(keys) == {"wallet", "all", "wallets", "found", "reporter overview", "claimant overview"}
+
+
+def test_rolled_back_writes_drop_nothing(db):
+    keys = fill(db)
+    db.get(Item, db.ids["wallet"]).title = "Red wallet"
+    db.flush()
+    db.rollback()
+    assert dropped(keys) == set()
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_fill_racing_an_invalidation_is_dropped(db, monkeypatch, tmp_path, backend):
+    if backend == "sqlite":
+        monkeypatch.setattr(result_cache, "store", result_cache.SQLiteStore(str(tmp_path / "cache.db")))
+
+    def build():
+        # A write commits while the payload is being built from the old rows
+        result_cache.invalidate([result_cache.item_tag(1)])
+        return {"id": 1, "title": "before the write"}
+
+    response = result_cache.cached_json("item/1", [result_cache.item_tag(1)], build)
+    assert response.headers["X-Cache"] == "MISS"
+    assert result_cache.store.get("item/1") is None
+
+    result_cache.cached_json("item/1", [result_cache.item_tag(1)], lambda: {"id": 1})
+    assert result_cache.store.get("item/1") is not None
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_fill_survives_unrelated_invalidations(db, monkeypatch, tmp_path, backend):
+    if backend == "sqlite":
+        monkeypatch.setattr(result_cache, "store", result_cache.SQLiteStore(str(tmp_path / "cache.db")))
+
+    def build():
+        # Commits elsewhere (another item, a notification) while the payload is built
+        result_cache.invalidate([result_cache.item_tag(2), result_cache.user_tag(7)])
+        return {"id": 1}
+
+    result_cache.cached_json("item/1", [result_cache.item_tag(1), result_cache.user_tag(3)], build)
+    assert result_cache.store.get("item/1") is not None
@@ -0,0 +1,235 @@
+"""
+Indexed, typo-tolerant user search for the admin console
+
+PostgreSQL uses pg_trgm GIN indexes and similarity operators. Other
+databases (SQLite) use the user_search_grams table, a trigram -> user
+index kept in sync by mapper events. Terms that look like an email or a
+student number first try a prefix match on the existing B-tree indexes.
+
+The indexes are built by ensure_search_index() from init_db.py, never on
+the request path: the app's database role may not be allowed to create
+them. Until they exist, searches fall back to a plain substring match.
+"""
+import math
+import re
+import threading
+
+from sqlalchemy import event, func, inspect, select, literal, and_, or_, text
+from sqlalchemy.orm import Session
+
+from models import User, UserSearchGram
+
+SEARCH_FIELDS = ("email", "first_name", "last_name", "student_number")
+
+# Share of the term's trigrams a user must contain to match (SQLite)
+MIN_GRAM_MATCH = 0.4
+
+_STUDENT_NUMBER = re.compile(r"^[A-Za-z]*\d[\w-]*$")
+
+_index_lock = threading.Lock()
+_index_ready = set()
+_index_found = set()
+
+
+def trigrams(value: str) -> set:
+    """pg_trgm-style trigrams: each word padded with two leading spaces and one trailing"""
+    grams = set()
+    for word in re.split(r"[^a-z0-9]+", (value or "").lower()):
+        if not word:
+            continue
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _user_grams(user) -> set:
+    return trigrams(" ".join(filter(None, (getattr(user, f) for f in SEARCH_FIELDS))))
+
+
+def _is_postgres(bind) -> bool:
+    return bind.dialect.name == "postgresql"
+
+
+# =================
+# INDEX MAINTENANCE
+# =================
+
+def ensure_search_index(engine):
+    """Create the search indexes (idempotent) and backfill the gram table"""
+    with _index_lock:
+        if engine.url in _index_ready:
+            return
+
+        with engine.begin() as conn:
+            if _is_postgres(conn):
+                conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                for name, expr in (
+                    ("email", "lower(email)"),
+                    ("name", "lower(first_name || ' ' || last_name)"),
+                    ("student_number", "lower(student_number)"),
+                ):
+                    conn.execute(text(
+                        f"CREATE INDEX IF NOT EXISTS ix_users_{name}_trgm "
+                        f"ON users USING gin (({expr}) gin_trgm_ops)"
+                    ))
+            else:
+                UserSearchGram.__table__.create(conn, checkfirst=True)
+                indexed = conn.execute(select(func.count(func.distinct(UserSearchGram.user_id)))).scalar()
+                total = conn.execute(select(func.count(User.id))).scalar()
+                if indexed != total:
+                    conn.execute(UserSearchGram.__table__.delete())
+                    users = conn.execute(select(User.id, *(getattr(User, f) for f in SEARCH_FIELDS))).all()
+                    rows = [{"user_id": u.id, "gram": g} for u in users for g in _user_grams(u)]
+                    if rows:
+                        conn.execute(UserSearchGram.__table__.insert(), rows)
+
+        _index_ready.add(engine.url)
+
+
+def _reindex_user(connection, user):
+    if _is_postgres(connection):
+        return
+    table = UserSearchGram.__table__
+    connection.execute(table.delete().where(table.c.user_id == user.id))
+    rows = [{"user_id": user.id, "gram": g} for g in _user_grams(user)]
+    if rows:
+        connection.execute(table.insert(), rows)
+
+
+@event.listens_for(User, "after_insert")
+def _index_new_user(mapper, connection, target):
+    _reindex_user(connection, target)
+
+
+@event.listens_for(User, "after_update")
+def _index_updated_user(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[f].history.has_changes() for f in SEARCH_FIELDS):
+        _reindex_user(connection, target)
+
+
+@event.listens_for(User, "after_delete")
+def _unindex_user(mapper, connection, target):
+    if not _is_postgres(connection):
+        table = UserSearchGram.__table__
+        connection.execute(table.delete().where(table.c.user_id == target.id))
+
+
+def search_index_exists(db: Session) -> bool:
+    """Whether ensure_search_index has been run on this database (only reads, never creates)"""
+    bind = db.get_bind()
+    if bind.url in _index_found:
+        return True
+    if _is_postgres(bind):
+        found = db.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first() is not None
+    else:
+        # A gram table create_all made on a database that already had users is still empty
+        found = inspect(bind).has_table(UserSearchGram.__tablename__) and (
+            db.execute(select(UserSearchGram.user_id).limit(1)).first() is not None
+            or db.execute(select(User.id).limit(1)).first() is None
+        )
+    if found:
+        _index_found.add(bind.url)
+    return found
+
+
+# =================
+# SEARCH
+# =================
+
+def _prefix_match(db: Session, term: str):
+    """Exact/prefix match on email or student number using the B-tree indexes"""
+    if "@" in term:
+        column = User.email
+    elif _STUDENT_NUMBER.match(term):
+        column = User.student_number
+    else:
+        return None
+
+    # A range instead of LIKE 'term%' so the plain index is usable everywhere
+    ranked = select(
+        User.id.label("user_id"),
+        literal(1.0).label("rank")
+    ).where(
+        or_(
+            and_(column >= term, column < term + "\uffff"),
+            and_(column >= term.lower(), column < term.lower() + "\uffff"),
+        )
+    )
+    if db.execute(ranked.limit(1)).first() is None:
+        return None
+    return ranked.subquery()
+
+
+def _postgres_match(term: str):
+    term = term.lower()
+    email = func.lower(User.email)
+    name = func.lower(User.first_name + " " + User.last_name)
+    # Same expressions as the trigram indexes, or PostgreSQL scans users (a NULL just fails <%)
+    student_number = func.lower(User.student_number)
+
+    rank = func.greatest(
+        func.word_similarity(term, email),
+        func.word_similarity(term, name),
+        func.word_similarity(term, student_number),
+    )
+    return select(
+        User.id.label("user_id"),
+        rank.label("rank")
+    ).where(
+        or_(
+            literal(term).op("<%")(email),
+            literal(term).op("<%")(name),
+            literal(term).op("<%")(student_number),
+        )
+    ).subquery()
+
+
+def _substring_match(term: str):
+    """Unranked ILIKE match, for databases whose search indexes were never built"""
+    pattern = f"%{term}%"
+    return select(
+        User.id.label("user_id"),
+        literal(1.0).label("rank")
+    ).where(
+        or_(*(getattr(User, f).ilike(pattern) for f in SEARCH_FIELDS))
+    ).subquery()
+
+
+def _gram_match(term: str):
+    grams = trigrams(term)
+    if not grams:
+        return None
+    hits = func.count(func.distinct(UserSearchGram.gram))
+    return select(
+        UserSearchGram.user_id.label("user_id"),
+        (hits * 1.0 / len(grams)).label("rank")
+    ).where(
+        UserSearchGram.gram.in_(grams)
+    ).group_by(
+        UserSearchGram.user_id
+    ).having(
+        hits >= max(1, math.ceil(len(grams) * MIN_GRAM_MATCH))
+    ).subquery()
+
+
+def search_users(db: Session, term: str):
+    """
+    Subquery of (user_id, rank) for users matching a search term
+
+    Higher rank is a better match. Returns None when the term has nothing
+    searchable in it.
+    """
+    term = term.strip()
+    if not term:
+        return None
+
+    prefix = _prefix_match(db, term)
+    if prefix is not None:
+        return prefix
+
+    if not search_index_exists(db):
+        return _substring_match(term)
+    if _is_postgres(db.get_bind()):
+        return _postgres_match(term)
+    return _gram_match(term)
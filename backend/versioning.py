@@ -0,0 +1,58 @@
+"""
+Optimistic concurrency for items and claims
+
+Item.version and Claim.version are SQLAlchemy version counters. Every ORM
+update runs as UPDATE ... WHERE id = :id AND version = :read and bumps the
+version. A write based on a stale read therefore matches no row and raises
+StaleDataError instead of overwriting; main.py answers that with 409.
+Set-based UPDATEs bypass the counter. Those that change what a reviewer
+decided on add bumped(Model) to their values. Lease updates and the
+weighted match score recompute do not, so holding a task or reweighting
+does not invalidate it.
+
+Clients can also say which version they decided on, with If-Match: "<version>"
+or `version` in the body. expect_version() answers 409 when the row has
+changed since. It also marks the row as written, so a decision that changes
+no column (asking for more info twice, say) still takes the next version
+and two such decisions cannot both succeed on one read.
+"""
+from datetime import datetime
+from typing import Optional
+
+from fastapi import HTTPException, Request, status
+from fastapi.responses import JSONResponse
+
+CONFLICT_DETAIL = "This was changed by someone else in the meantime, reload it and try again"
+
+
+def parse_if_match(value: Optional[str]) -> Optional[int]:
+    """The version in an If-Match header ("3", W/"3" or 3); None for a missing header or *"""
+    if value is None or value.strip() == "*":
+        return None
+    tag = value.split(",")[0].strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    try:
+        return int(tag.strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="If-Match must be a version")
+
+
+def expect_version(row, if_match: Optional[str] = None, version: Optional[int] = None):
+    """409 if the client decided on another version of row than the one loaded; the flush then writes row"""
+    expected = parse_if_match(if_match)
+    if expected is None:
+        expected = version
+    if expected is not None and expected != row.version:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=CONFLICT_DETAIL)
+    row.updated_at = datetime.utcnow()
+
+
+def bumped(model) -> dict:
+    """Values that move a set-based UPDATE's rows to their next version"""
+    return {"version": model.version + 1}
+
+
+async def stale_data_response(request: Request, exc: Exception):
+    """Exception handler: the row changed between our read and our write"""
+    return JSONResponse(status_code=status.HTTP_409_CONFLICT, content={"detail": CONFLICT_DETAIL})
@@ -32,6 +32,7 @@ export const AuthProvider = ({ children }) => {
       formData.append("password", password);
 
       const response = await fetch(`${API_BASE_URL}/api/auth/login`, {
+        credentials: "include",
         method: "POST",
         headers: {
           "Content-Type": "application/x-www-form-urlencoded",
@@ -57,6 +58,7 @@ export const AuthProvider = ({ children }) => {
   const register = async (userData) => {
     try {
       const response = await fetch(`${API_BASE_URL}/api/auth/register`, {
+        credentials: "include",
         method: "POST",
         headers: {
           "Content-Type": "application/json",
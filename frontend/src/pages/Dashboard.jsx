@@ -21,7 +21,7 @@ const Dashboard = () => {
         setLoading(true);
 
         // Fetch stats
-        const statsResponse = await fetch(`${API_BASE_URL}/api/stats`);
+        const statsResponse = await fetch(`${API_BASE_URL}/api/stats`, { credentials: "include" });
         if (statsResponse.ok) {
           const statsData = await statsResponse.json();
           setStats(statsData);
@@ -29,7 +29,8 @@ const Dashboard = () => {
 
         // Fetch recent items (limit to 6)
         const itemsResponse = await fetch(
-          `${API_BASE_URL}/api/items?limit=6`
+          `${API_BASE_URL}/api/items?limit=6`,
+          { credentials: "include" }
         );
         if (itemsResponse.ok) {
           const itemsData = await itemsResponse.json();
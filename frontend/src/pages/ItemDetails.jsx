@@ -8,6 +8,8 @@ const ItemDetails = () => {
   const [item, setItem] = useState(null);
   const [showClaimModal, setShowClaimModal] = useState(false);
   const [claimDetails, setClaimDetails] = useState('');
+  // Reused if a claim is retried after a network error, so the server records it only once
+  const [claimIdempotencyKey, setClaimIdempotencyKey] = useState(() => crypto.randomUUID());
   const [claimForm, setClaimForm] = useState({
     color: '',
     condition: '',
@@ -18,7 +20,7 @@ const ItemDetails = () => {
   useEffect(() => {
     const fetchItem = async () => {
       try {
-        const response = await fetch(`${API_BASE_URL}/api/items/${id}`);
+        const response = await fetch(`${API_BASE_URL}/api/items/${id}`, { credentials: 'include' });
         if (response.ok) {
           const data = await response.json();
           // Transform API data to match component structure
@@ -41,7 +43,8 @@ const ItemDetails = () => {
             },
             urgent: data.isUrgent,
             reward: data.reward,
-            referenceNumber: data.referenceNumber
+            referenceNumber: data.referenceNumber,
+            version: data.version
           });
         } else {
           console.error('Failed to fetch item');
@@ -66,9 +69,11 @@ const ItemDetails = () => {
       }
 
       const response = await fetch(`${API_BASE_URL}/api/items/${id}/mark-found`, {
+        credentials: 'include',
         method: 'POST',
         headers: {
-          'Authorization': `Bearer ${token}`
+          'Authorization': `Bearer ${token}`,
+          ...(item.version ? { 'If-Match': `"${item.version}"` } : {})
         }
       });
 
@@ -107,10 +112,12 @@ const ItemDetails = () => {
       }
 
       const response = await fetch(`${API_BASE_URL}/api/items/${id}/claim`, {
+        credentials: 'include',
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
-          'Authorization': `Bearer ${token}`
+          'Authorization': `Bearer ${token}`,
+          'Idempotency-Key': claimIdempotencyKey
         },
         body: JSON.stringify({
           itemId: parseInt(id),
@@ -128,6 +135,7 @@ const ItemDetails = () => {
         setShowClaimModal(false);
         navigate('/dashboard');
       } else {
+        setClaimIdempotencyKey(crypto.randomUUID());
         const error = await response.json();
         alert(`Error: ${error.detail || 'Failed to submit claim'}`);
       }
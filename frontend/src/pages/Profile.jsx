@@ -1,5 +1,6 @@
-import { useState } from 'react';
+import { useState, useEffect } from 'react';
 import { useAuth } from '../context/AuthContext';
+import { API_BASE_URL } from '../config/api';
 
 const Profile = () => {
   const { user } = useAuth();
@@ -28,11 +29,40 @@ const Profile = () => {
     setIsEditing(false);
   };
 
-  const userStats = {
-    itemsReported: 12,
-    itemsClaimed: 5,
-    itemsReturned: 8,
-  };
+  const [userStats, setUserStats] = useState({
+    itemsReported: 0,
+    itemsClaimed: 0,
+    itemsReturned: 0,
+  });
+
+  // Reported items, claims and returned items in one request
+  useEffect(() => {
+    const fetchOverview = async () => {
+      const token = localStorage.getItem('token');
+      if (!token) return;
+
+      try {
+        const response = await fetch(`${API_BASE_URL}/api/me/overview`, {
+          credentials: 'include',
+          headers: {
+            'Authorization': `Bearer ${token}`
+          }
+        });
+        if (response.ok) {
+          const overview = await response.json();
+          setUserStats({
+            itemsReported: overview.reportedItems.total,
+            itemsClaimed: overview.claims.length,
+            itemsReturned: overview.returnedItems.length,
+          });
+        }
+      } catch (error) {
+        console.error('Error fetching overview:', error);
+      }
+    };
+
+    fetchOverview();
+  }, []);
 
   return (
     <div className="p-6 max-w-4xl mx-auto">
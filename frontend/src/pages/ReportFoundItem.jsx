@@ -17,6 +17,8 @@ const ReportFoundItem = () => {
   const [image, setImage] = useState(null);
   const [imagePreview, setImagePreview] = useState(null);
   const [loading, setLoading] = useState(false);
+  // Reused if a submit is retried after a network error, so the server creates it only once
+  const [idempotencyKey, setIdempotencyKey] = useState(() => crypto.randomUUID());
 
   const handleChange = (e) => {
     const { name, value, type, checked } = e.target;
@@ -65,10 +67,12 @@ const ReportFoundItem = () => {
       };
 
       const response = await fetch(`${API_BASE_URL}/api/items`, {
+        credentials: 'include',
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
-          'Authorization': `Bearer ${token}`
+          'Authorization': `Bearer ${token}`,
+          'Idempotency-Key': idempotencyKey
         },
         body: JSON.stringify(itemData)
       });
@@ -78,6 +82,7 @@ const ReportFoundItem = () => {
         alert(`Found item reported successfully! Reference Number: ${data.referenceNumber}\n\nPlease remember to submit the physical item to the Security Office.`);
         navigate('/dashboard');
       } else {
+        setIdempotencyKey(crypto.randomUUID());
         const error = await response.json();
         alert(`Error: ${error.detail || 'Failed to report item'}`);
       }
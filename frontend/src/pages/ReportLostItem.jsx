@@ -19,6 +19,8 @@ const ReportLostItem = () => {
   const [image, setImage] = useState(null);
   const [imagePreview, setImagePreview] = useState(null);
   const [loading, setLoading] = useState(false);
+  // Reused if a submit is retried after a network error, so the server creates it only once
+  const [idempotencyKey, setIdempotencyKey] = useState(() => crypto.randomUUID());
 
   const handleChange = (e) => {
     const { name, value, type, checked } = e.target;
@@ -68,10 +70,12 @@ const ReportLostItem = () => {
       };
 
       const response = await fetch(`${API_BASE_URL}/api/items`, {
+        credentials: 'include',
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
-          'Authorization': `Bearer ${token}`
+          'Authorization': `Bearer ${token}`,
+          'Idempotency-Key': idempotencyKey
         },
         body: JSON.stringify(itemData)
       });
@@ -81,6 +85,7 @@ const ReportLostItem = () => {
         alert(`Lost item reported successfully! Reference Number: ${data.referenceNumber}`);
         navigate('/dashboard');
       } else {
+        setIdempotencyKey(crypto.randomUUID());
         const error = await response.json();
         alert(`Error: ${error.detail || 'Failed to report item'}`);
       }
@@ -2,6 +2,8 @@ import { useState, useEffect } from "react";
 import ItemCard from "../components/ItemCard";
 import { API_BASE_URL } from "../config/api";
 
+const PAGE_SIZE = 60;
+
 const SearchItems = () => {
   const [searchTerm, setSearchTerm] = useState("");
   const [filters, setFilters] = useState({
@@ -13,17 +15,38 @@ const SearchItems = () => {
 
   const [items, setItems] = useState([]);
   const [filteredItems, setFilteredItems] = useState([]);
+  const [facets, setFacets] = useState({ total: 0, category: [], status: [], location: [] });
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
+
+  // Filters are applied by the server, so options, counts and results cover every item
+  const filterParams = () => {
+    const params = new URLSearchParams();
+    if (filters.category !== "all") params.set("category", filters.category);
+    if (filters.status !== "all") params.set("status", filters.status);
+    if (filters.location !== "all") params.set("location", filters.location);
+    if (filters.dateRange !== "all") {
+      const from = new Date();
+      if (filters.dateRange === "week") from.setDate(from.getDate() - 7);
+      if (filters.dateRange === "month") from.setMonth(from.getMonth() - 1);
+      params.set("date_from", from.toISOString().slice(0, 10));
+    }
+    return params;
+  };
 
-  // Fetch items from database
+  // Fetch items and facet counts whenever the filters change
   useEffect(() => {
     const fetchItems = async () => {
       try {
         setLoading(true);
-        const response = await fetch(`${API_BASE_URL}/api/items`);
-        if (response.ok) {
-          const data = await response.json();
-          setItems(data);
+        const params = filterParams();
+        const [itemsResponse, facetsResponse] = await Promise.all([
+          fetch(`${API_BASE_URL}/api/items?${params}&limit=${PAGE_SIZE}`, { credentials: "include" }),
+          fetch(`${API_BASE_URL}/api/items/facets?${params}`, { credentials: "include" }),
+        ]);
+        if (itemsResponse.ok && facetsResponse.ok) {
+          setItems(await itemsResponse.json());
+          setFacets(await facetsResponse.json());
         } else {
           console.error("Failed to fetch items");
         }
@@ -35,12 +58,30 @@ const SearchItems = () => {
     };
 
     fetchItems();
-  }, []);
+  }, [filters]);
+
+  const loadMore = async () => {
+    try {
+      setLoadingMore(true);
+      const response = await fetch(
+        `${API_BASE_URL}/api/items?${filterParams()}&skip=${items.length}&limit=${PAGE_SIZE}`,
+        { credentials: "include" }
+      );
+      if (response.ok) {
+        const data = await response.json();
+        setItems([...items, ...data]);
+      }
+    } catch (error) {
+      console.error("Error fetching items:", error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
 
   useEffect(() => {
     let filtered = items;
 
-    // Search filter
+    // Search filter (over the items loaded so far)
     if (searchTerm) {
       filtered = filtered.filter(
         (item) =>
@@ -49,43 +90,26 @@ const SearchItems = () => {
       );
     }
 
-    // Category filter
-    if (filters.category !== "all") {
-      filtered = filtered.filter((item) => item.category === filters.category);
-    }
-
-    // Status filter
-    if (filters.status !== "all") {
-      filtered = filtered.filter((item) => item.status === filters.status);
-    }
-
-    // Location filter
-    if (filters.location !== "all") {
-      filtered = filtered.filter((item) => item.location === filters.location);
-    }
-
     setFilteredItems(filtered);
-  }, [searchTerm, filters, items]);
+  }, [searchTerm, items]);
 
-  const categories = [
-    { value: "all", label: "All Categories" },
-    { value: "electronics", label: "Electronics" },
-    { value: "books", label: "Books" },
-    { value: "bags", label: "Bags" },
-    { value: "wallets", label: "Wallets" },
-    { value: "documents", label: "Documents" },
-    { value: "others", label: "Others" },
+  const facetOptions = (facet, allLabel, label = (value) => value) => [
+    { value: "all", label: allLabel },
+    ...facets[facet].map(({ value, count }) => ({
+      value,
+      label: `${label(value)} (${count})`,
+    })),
   ];
 
-  const locations = [
-    { value: "all", label: "All Locations" },
-    { value: "Library", label: "Library" },
-    { value: "Cafeteria", label: "Cafeteria" },
-    { value: "Canteen", label: "Canteen" },
-    { value: "Gymnasium", label: "Gymnasium" },
-    { value: "Parking Lot", label: "Parking Lot" },
-    { value: "Room 204", label: "Classrooms" },
-  ];
+  const statusLabel = (value) =>
+    value
+      .split("_")
+      .map((word) => word.charAt(0).toUpperCase() + word.slice(1))
+      .join(" ");
+
+  const categories = facetOptions("category", "All Categories");
+  const statuses = facetOptions("status", "All Status", statusLabel);
+  const locations = facetOptions("location", "All Locations");
 
   return (
     <div className="p-6 space-y-6">
@@ -151,10 +175,11 @@ const SearchItems = () => {
                 setFilters({ ...filters, status: e.target.value })
               }
             >
-              <option value="all">All Status</option>
-              <option value="lost">Lost</option>
-              <option value="found">Found</option>
-              <option value="claimed">Claimed</option>
+              {statuses.map((st) => (
+                <option key={st.value} value={st.value}>
+                  {st.label}
+                </option>
+              ))}
             </select>
           </div>
 
@@ -208,7 +233,7 @@ const SearchItems = () => {
                 onClick={() => setFilters({ ...filters, category: "all" })}
                 className="inline-flex items-center gap-1 px-3 py-1 bg-blue-100 text-blue-700 rounded-full text-sm"
               >
-                {categories.find((c) => c.value === filters.category)?.label}
+                {filters.category}
                 <svg
                   className="w-4 h-4"
                   fill="none"
@@ -229,11 +254,7 @@ const SearchItems = () => {
                 onClick={() => setFilters({ ...filters, status: "all" })}
                 className="inline-flex items-center gap-1 px-3 py-1 bg-blue-100 text-blue-700 rounded-full text-sm"
               >
-                {filters.status === "lost"
-                  ? "Lost"
-                  : filters.status === "found"
-                  ? "Found"
-                  : "Claimed"}
+                {statusLabel(filters.status)}
                 <svg
                   className="w-4 h-4"
                   fill="none"
@@ -259,8 +280,10 @@ const SearchItems = () => {
           <div className="mb-4">
             <p className="text-gray-600">
               Showing{" "}
-              <span className="font-semibold">{filteredItems.length}</span>{" "}
-              {filteredItems.length === 1 ? "item" : "items"}
+              <span className="font-semibold">
+                {searchTerm ? filteredItems.length : facets.total}
+              </span>{" "}
+              {(searchTerm ? filteredItems.length : facets.total) === 1 ? "item" : "items"}
             </p>
           </div>
         )}
@@ -281,6 +304,17 @@ const SearchItems = () => {
                 }}
               />
             ))}
+            {items.length < facets.total && (
+              <div className="col-span-full flex justify-center">
+                <button
+                  onClick={loadMore}
+                  disabled={loadingMore}
+                  className="btn-secondary"
+                >
+                  {loadingMore ? "Loading..." : "Load more"}
+                </button>
+              </div>
+            )}
           </div>
         ) : (
           <div className="text-center py-12">